@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Time `memory.py --cmd start` against a repo, optionally side by side with
+the memory.py from an older git revision (e.g. before a change).
+
+  scripts/memory-startup-bench.py --repo-root . --baseline HEAD~1
+"""
+import argparse
+import importlib.util
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+SCRIPT = Path(__file__).resolve().parent / "memory.py"
+# A baseline copy runs from a temp dir but still imports its sibling modules from here
+ENV = {**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [str(SCRIPT.parent), os.environ.get("PYTHONPATH")]))}
+
+
+def time_git_state(script: Path, repo_root: Path, runs: int):
+    """Median in-process cost of collect_repo_state, without interpreter startup"""
+    spec = importlib.util.spec_from_file_location(f"memory_{abs(hash(str(script)))}", script)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        module.collect_repo_state(repo_root)
+        samples.append((time.perf_counter() - start) * 1000)
+    return round(statistics.median(samples), 1)
+
+
+def time_runs(script: Path, repo_root: Path, runs: int):
+    cmd = [sys.executable, str(script), "--cmd", "start", "--repo-root", str(repo_root), "--dry-run"]
+    # One untimed run warms the page cache and git's index stat cache
+    subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, env=ENV)
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, env=ENV)
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        "script": str(script),
+        "runs": runs,
+        "median_ms": round(statistics.median(samples), 1),
+        "p90_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.9))], 1),
+        "min_ms": round(samples[0], 1),
+        "git_state_ms": time_git_state(script, repo_root, runs),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Startup latency of memory.py start")
+    parser.add_argument("--repo-root", default=".")
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--baseline", help="git revision whose scripts/memory.py to compare against")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    repo_root = Path(args.repo_root).resolve()
+    report = {"repo_root": str(repo_root), "current": time_runs(SCRIPT, repo_root, args.runs)}
+
+    if args.baseline:
+        source = subprocess.run(
+            ["git", "show", f"{args.baseline}:scripts/memory.py"],
+            cwd=SCRIPT.parent, capture_output=True, text=True,
+        )
+        if source.returncode != 0:
+            print(f"[MEMORY] error: {source.stderr.strip()}", file=sys.stderr)
+            return 2
+        with tempfile.TemporaryDirectory() as tmp:
+            baseline = Path(tmp) / "memory.py"
+            baseline.write_text(source.stdout, encoding="utf-8")
+            report["baseline"] = time_runs(baseline, repo_root, args.runs)
+            report["baseline"]["script"] = f"{args.baseline}:scripts/memory.py"
+        report["speedup"] = round(report["baseline"]["median_ms"] / report["current"]["median_ms"], 2)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + "\n", encoding="utf-8")
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Benchmark allowlist summarisation in memory.py on a synthetic repo.
+
+Builds a throwaway tree with hundreds of allowlisted files (mostly small
+docs, a few multi-megabyte logs) and times summarize_allowlisted_files cold
+with one worker, cold with the thread pool, and warm from the file cache,
+next to the old read-everything approach.
+
+  scripts/memory-summarize-bench.py --files 400
+"""
+import argparse
+import importlib.util
+import json
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+SCRIPT = Path(__file__).resolve().parent / "memory.py"
+sys.path.insert(0, str(SCRIPT.parent))
+
+
+def load_memory():
+    spec = importlib.util.spec_from_file_location("memory", SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def build_repo(root: Path, files: int, large: int, seed: int):
+    rng = random.Random(seed)
+    words = ["deploy", "cluster", "node", "memory", "agent", "pi", "tunnel", "dns", "mesh", "vault"]
+    for i in range(files):
+        path = root / "docs" / f"d{i // 50:02d}" / f"note-{i:04d}.md"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        size = 4 * 1024 * 1024 if i < large else rng.randint(500, 40_000)
+        lines = []
+        total = 0
+        while total < size:
+            line = " ".join(rng.choice(words) for _ in range(rng.randint(3, 14)))
+            if rng.random() < 0.03:
+                line = f"{rng.choice(['TODO', 'FIXME'])}: {line}"
+            lines.append(line)
+            total += len(line) + 1
+        path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    return {"globs": ["docs/*/*.md"], "max_files": files}
+
+
+def legacy_summarize(repo_root: Path, cfg: dict, memory):
+    """The pre-streaming approach: read whole files, decode, split every line"""
+    summaries = []
+    for p in sorted(repo_root.glob(cfg["globs"][0])):
+        txt = p.read_bytes()[: memory.SUMMARY_MAX_BYTES].decode("utf-8", errors="replace")
+        lines = [line.strip() for line in txt.splitlines() if line.strip()]
+        summaries.append({
+            "path": str(p.relative_to(repo_root)),
+            "todo_markers": sum(1 for line in lines if "TODO" in line or "FIXME" in line),
+            "head": lines[:12],
+        })
+    return summaries
+
+
+def timed(func, rounds):
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        result = func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return round(statistics.median(samples), 1), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark memory.py allowlist summarisation")
+    parser.add_argument("--files", type=int, default=400, help="allowlisted files in the synthetic repo")
+    parser.add_argument("--large", type=int, default=5, help="how many of them are 4 MiB logs")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    memory = load_memory()
+    root = Path(tempfile.mkdtemp(prefix="memory-bench-"))
+    try:
+        cfg = build_repo(root, args.files, args.large, args.seed)
+        legacy_ms, legacy = timed(lambda: legacy_summarize(root, cfg, memory), args.rounds)
+        serial_ms, serial = timed(lambda: memory.summarize_allowlisted_files(root, cfg, {}, workers=1), args.rounds)
+        parallel_ms, _ = timed(
+            lambda: memory.summarize_allowlisted_files(root, cfg, {}, workers=args.workers), args.rounds
+        )
+        cache = {}
+        memory.summarize_allowlisted_files(root, cfg, cache, workers=args.workers)
+        warm_ms, _ = timed(
+            lambda: memory.summarize_allowlisted_files(root, cfg, cache, workers=args.workers), args.rounds
+        )
+
+        by_path = {item["path"]: item for item in legacy}
+        report = {
+            "files": len(serial),
+            "large_files": args.large,
+            "workers": args.workers,
+            "legacy_read_all_ms": legacy_ms,
+            "streaming_serial_ms": serial_ms,
+            "streaming_parallel_ms": parallel_ms,
+            "warm_cache_ms": warm_ms,
+            "summaries_match_legacy": all(by_path.get(item["path"]) == item for item in serial),
+        }
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + "\n", encoding="utf-8")
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
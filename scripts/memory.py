@@ -1,5 +1,6 @@
 #!/usr/bin/env python3
 import argparse
+import hashlib
 import json
 import os
 import subprocess
@@ -8,20 +9,14 @@ import uuid
 from datetime import datetime, timezone
 from pathlib import Path
 
-
-def run(cmd, cwd=None):
-    try:
-        out = subprocess.check_output(cmd, cwd=cwd, stderr=subprocess.STDOUT, text=True)
-        return out.strip()
-    except subprocess.CalledProcessError as exc:
-        return (exc.output or "").strip()
-
-
-def is_git_repo(repo_root: Path) -> bool:
-    if (repo_root / ".git").exists():
-        return True
-    result = run(["git", "rev-parse", "--is-inside-work-tree"], cwd=repo_root)
-    return result.lower() == "true"
+RECENT_COMMITS = 5
+# Allowlisted files: how many, how much of each, and how many read at once
+MAX_ALLOWLISTED_FILES = 500
+SUMMARY_MAX_BYTES = 80_000
+SUMMARY_HEAD_LINES = 12
+SUMMARY_WORKERS = 8
+SUMMARY_CHUNK = 16 * 1024
+TODO_MARKERS = (b"TODO", b"FIXME")
 
 
 def load_config(repo_root: Path):
@@ -34,40 +29,153 @@ def load_config(repo_root: Path):
     return {}
 
 
-def safe_read_text(path: Path, max_bytes=80_000):
-    try:
-        data = path.read_bytes()
-        data = data[:max_bytes]
-        return data.decode("utf-8", errors="replace")
-    except Exception:
-        return ""
+def parse_status_v2(status: str):
+    """
+    Split `git status --porcelain=v2 --branch` output into the branch name
+    and v1-style "XY path" lines, so the payload looks the same as before.
+    """
+    branch = ""
+    lines = []
+    for line in status.splitlines():
+        if line.startswith("# branch.head "):
+            branch = line[len("# branch.head "):]
+            if branch == "(detached)":
+                branch = "HEAD"
+        elif line.startswith("1 "):
+            fields = line.split(" ", 8)
+            lines.append(f"{fields[1].replace('.', ' ')} {fields[8]}")
+        elif line.startswith("2 "):
+            fields = line.split(" ", 9)
+            path, _, orig = fields[9].partition("\t")
+            lines.append(f"{fields[1].replace('.', ' ')} {orig} -> {path}")
+        elif line.startswith("u "):
+            fields = line.split(" ", 10)
+            lines.append(f"{fields[1]} {fields[10]}")
+        elif line.startswith("? "):
+            lines.append(f"?? {line[2:]}")
+    return branch, lines
 
 
 def collect_repo_state(repo_root: Path):
+    """
+    Two git processes, started together: one status (branch and changes)
+    and one log (last and recent commits). A failing status means there is
+    no work tree here.
+    """
     state = {"repo_root": str(repo_root)}
-    if not is_git_repo(repo_root):
+    cmds = [
+        ["git", "status", "--porcelain=v2", "--branch"],
+        ["git", "log", f"-{RECENT_COMMITS}", "--pretty=format:%h%x00%s%x00%ci"],
+    ]
+    try:
+        procs = [
+            subprocess.Popen(cmd, cwd=repo_root, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+            for cmd in cmds
+        ]
+    except OSError:
+        state["git"] = {"is_repo": False}
+        return state
+    status, log = (proc.communicate()[0] for proc in procs)
+    if procs[0].returncode != 0:
         state["git"] = {"is_repo": False}
         return state
 
-    branch = run(["git", "rev-parse", "--abbrev-ref", "HEAD"], cwd=repo_root)
-    status = run(["git", "status", "--porcelain"], cwd=repo_root)
-    last_commit = run(["git", "log", "-1", "--pretty=format:%h|%s|%ci"], cwd=repo_root)
-    recent = run(["git", "log", "-5", "--pretty=format:%h %s"], cwd=repo_root)
-    status_lines = [line for line in status.splitlines() if line.strip()]
+    branch, status_lines = parse_status_v2(status)
+    # An unborn branch has no log yet
+    commits = [line.split("\0") for line in log.splitlines()] if procs[1].returncode == 0 else []
+    commits = [fields for fields in commits if len(fields) == 3]
 
     state["git"] = {
         "is_repo": True,
         "branch": branch,
-        "dirty": bool(status.strip()),
+        "dirty": bool(status_lines),
         "changed_files": len(status_lines),
         "porcelain": status_lines[:200],
-        "last_commit": last_commit,
-        "recent_commits": recent.splitlines(),
+        "last_commit": "|".join(commits[0]) if commits else "",
+        "recent_commits": [f"{sha} {subject}" for sha, subject, _ in commits],
     }
     return state
 
 
-def summarize_allowlisted_files(repo_root: Path, cfg: dict):
+def summarize_file(path: Path, max_bytes=SUMMARY_MAX_BYTES):
+    """
+    One streaming pass over the first `max_bytes` of a file, in chunks:
+    content hash, the first non-empty lines, and the TODO/FIXME line count.
+    Larger files are never read past that point.
+    """
+    digest = hashlib.sha256()
+    head = []
+    todo = 0
+    carry = b""
+    remaining = max_bytes
+    try:
+        with path.open("rb") as handle:
+            while remaining > 0:
+                chunk = handle.read(min(SUMMARY_CHUNK, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                digest.update(chunk)
+                data = carry + chunk
+                cut = data.rfind(b"\n") + 1
+                block, carry = data[:cut], data[cut:]
+                todo += _count_todo_lines(block)
+                if len(head) < SUMMARY_HEAD_LINES:
+                    _take_head(block, head)
+    except OSError:
+        pass
+    if carry:
+        todo += _count_todo_lines(carry)
+        if len(head) < SUMMARY_HEAD_LINES:
+            _take_head(carry, head)
+    return {"sha256": digest.hexdigest(), "todo_markers": todo, "head": head}
+
+
+def _count_todo_lines(block: bytes):
+    """Lines mentioning TODO/FIXME, found with bytes.find and skipping to the next line per hit"""
+    count = 0
+    pos = 0
+    hits = {marker: block.find(marker) for marker in TODO_MARKERS}
+    while True:
+        for marker, hit in hits.items():
+            if 0 <= hit < pos:
+                hits[marker] = block.find(marker, pos)
+        found = [hit for hit in hits.values() if hit >= 0]
+        if not found:
+            return count
+        count += 1
+        pos = block.find(b"\n", min(found)) + 1
+        if pos == 0:
+            return count
+
+
+def _take_head(block: bytes, head: list):
+    for raw in block.split(b"\n"):
+        line = raw.decode("utf-8", errors="replace").strip()
+        if line:
+            head.append(line)
+            if len(head) == SUMMARY_HEAD_LINES:
+                return
+
+
+def _refresh_summary(path: Path, entry):
+    """Stat a file and re-summarise it unless the cached entry still holds"""
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    if entry and entry.get("mtime_ns") == st.st_mtime_ns and entry.get("size") == st.st_size:
+        return entry
+    fresh = summarize_file(path)
+    if entry and entry.get("sha256") == fresh["sha256"]:
+        entry = dict(entry)
+    else:
+        entry = {**fresh, "changed": True}
+    entry.update(mtime_ns=st.st_mtime_ns, size=st.st_size)
+    return entry
+
+
+def summarize_allowlisted_files(repo_root: Path, cfg: dict, cache=None, workers=None):
     """
     Only reads files explicitly allowlisted in .codex/memory.config.json
     Example:
@@ -75,17 +183,24 @@ def summarize_allowlisted_files(repo_root: Path, cfg: dict):
       "files": ["AGENTS.md", "README.md", "docs/plan.md"],
       "globs": ["packages/*/README.md"]
     }
+
+    `cache` maps relative path -> {mtime_ns, size, sha256, todo_markers, head}
+    from the previous run and is updated in place. Files whose mtime and size
+    are unchanged are not opened; files that were touched but hash the same
+    reuse their old summary. The rest are streamed by a small thread pool.
+    Up to "max_files" (default 500) files are summarised.
     """
+    root = str(repo_root.resolve())
     files = []
     for rel in cfg.get("files", []):
         p = (repo_root / rel).resolve()
-        if p.exists() and p.is_file() and str(p).startswith(str(repo_root.resolve())):
+        if p.is_file() and str(p).startswith(root):
             files.append(p)
 
     for pattern in cfg.get("globs", []):
         for p in repo_root.glob(pattern):
             p = p.resolve()
-            if p.exists() and p.is_file() and str(p).startswith(str(repo_root.resolve())):
+            if p.is_file() and str(p).startswith(root):
                 files.append(p)
 
     uniq = []
@@ -94,28 +209,92 @@ def summarize_allowlisted_files(repo_root: Path, cfg: dict):
         if p not in seen:
             uniq.append(p)
             seen.add(p)
-    uniq = uniq[:25]
+    uniq = uniq[: int(cfg.get("max_files", MAX_ALLOWLISTED_FILES))]
+
+    if cache is None:
+        cache = {}
+    rels = [str(p.relative_to(repo_root)) for p in uniq]
+    workers = workers or int(cfg.get("summary_workers", SUMMARY_WORKERS))
+    if workers > 1 and len(uniq) > 1:
+        from concurrent.futures import ThreadPoolExecutor
+
+        with ThreadPoolExecutor(max_workers=min(workers, len(uniq))) as pool:
+            entries = list(pool.map(_refresh_summary, uniq, [cache.get(rel) for rel in rels]))
+    else:
+        entries = [_refresh_summary(p, cache.get(rel)) for p, rel in zip(uniq, rels)]
 
     summaries = []
-    for p in uniq:
-        txt = safe_read_text(p)
-        lines = [line.strip() for line in txt.splitlines() if line.strip()]
-        head = lines[:12]
-        todo = sum(1 for line in lines if "TODO" in line or "FIXME" in line)
+    live = set(rels)
+    for rel, entry in zip(rels, entries):
+        if entry is None:
+            continue
+        cache[rel] = entry
         summaries.append({
-            "path": str(p.relative_to(repo_root)),
-            "todo_markers": todo,
-            "head": head,
+            "path": rel,
+            "todo_markers": entry["todo_markers"],
+            "head": entry["head"],
         })
+
+    for rel in list(cache):
+        if rel not in live:
+            del cache[rel]
     return summaries
 
 
-def write_outputs(mem_dir: Path, payload: dict):
+def _digest(payload: dict):
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def open_ledger(mem_dir: Path, keyframe_interval=None):
+    """The segmented ledger, importing a flat ledger.jsonl left by older versions"""
+    # Imported here: paths that never touch the ledger skip sqlite3 at startup
+    from memory_ledger import Ledger
+
+    ledger = Ledger(mem_dir / "ledger")
+    flat = mem_dir / "ledger.jsonl"
+    if flat.exists() and ledger.last()[0] == 0:
+        ledger.import_jsonl(flat, keyframe_interval)
+        flat.rename(mem_dir / "ledger.jsonl.imported")
+    return ledger
+
+
+def load_memory_state(mem_dir: Path):
+    state_path = mem_dir / "memory.state.json"
+    if state_path.exists():
+        try:
+            return json.loads(state_path.read_text(encoding="utf-8"))
+        except Exception:
+            return {}
+    return {}
+
+
+def write_outputs(mem_dir: Path, payload: dict, state=None, keyframe_interval=None):
     mem_dir.mkdir(parents=True, exist_ok=True)
+    if state is None:
+        state = {}
+
+    # session.json is the previous checkpoint; it only serves as the delta
+    # base if it is exactly what the ledger last recorded
+    session_path = mem_dir / "session.json"
+    previous = None
+    if session_path.exists():
+        try:
+            previous = json.loads(session_path.read_text(encoding="utf-8"))
+        except Exception:
+            previous = None
+    if previous is not None and state.get("last_digest") != _digest(previous):
+        previous = None
 
-    (mem_dir / "session.json").write_text(
+    ledger = open_ledger(mem_dir, keyframe_interval)
+    try:
+        ledger.append(payload, previous, keyframe_interval)
+    finally:
+        ledger.close()
+
+    session_path.write_text(
         json.dumps(payload, indent=2), encoding="utf-8"
     )
+    state["last_digest"] = _digest(payload)
 
     git = payload.get("git", {})
     lines = []
@@ -144,43 +323,60 @@ def write_outputs(mem_dir: Path, payload: dict):
             lines.append("")
     (mem_dir / "brief.md").write_text("\n".join(lines).strip() + "\n", encoding="utf-8")
 
-    ledger = mem_dir / "ledger.jsonl"
-    with ledger.open("a", encoding="utf-8") as handle:
-        handle.write(json.dumps(payload, ensure_ascii=False) + "\n")
-
+    (mem_dir / "memory.state.json").write_text(json.dumps(state), encoding="utf-8")
     return mem_dir
 
 
+def query_ledger(mem_dir: Path, args, keyframe_interval=None):
+    if not (mem_dir / "ledger").exists() and not (mem_dir / "ledger.jsonl").exists():
+        print("[MEMORY] no ledger yet", file=sys.stderr)
+        return 1
+    ledger = open_ledger(mem_dir, keyframe_interval)
+    try:
+        rows = ledger.query(
+            session_id=args.session,
+            branch=args.branch,
+            since=args.since,
+            until=args.until,
+            seq=args.seq,
+            limit=args.limit or None,
+        )
+        for row in rows:
+            if args.full:
+                print(json.dumps({"ledger_seq": row["seq"], **ledger.snapshot(row["seq"])}, ensure_ascii=False))
+            else:
+                note = f"  {row['note']}" if row["note"] else ""
+                print(f"#{row['seq']:<7} {row['timestamp']}  {row['branch'] or '-'}  {row['cmd']}{note}")
+    finally:
+        ledger.close()
+    return 0
+
+
 def main():
     parser = argparse.ArgumentParser()
-    parser.add_argument("--cmd", required=True, choices=["start", "checkpoint"])
+    parser.add_argument("--cmd", required=True, choices=["start", "checkpoint", "query", "compact"])
     parser.add_argument("--repo-root", required=True)
     parser.add_argument("--note", default="")
     parser.add_argument("--memory-dir")
     parser.add_argument("--dry-run", action="store_true")
+    query = parser.add_argument_group("query / compact")
+    query.add_argument("--seq", type=int, help="a single checkpoint by ledger sequence number")
+    query.add_argument("--session", help="checkpoints of one session_id")
+    query.add_argument("--branch", help="checkpoints taken on one branch")
+    query.add_argument("--since", help="timestamps >= this ISO prefix (e.g. 2026-10-01)")
+    query.add_argument("--until", help="timestamps < this ISO prefix; for compact, segments older than it")
+    query.add_argument("--limit", type=int, default=20, help="newest N matches (0 for all)")
+    query.add_argument("--full", action="store_true", help="print full checkpoints as JSON lines")
     args = parser.parse_args()
 
     repo_root = Path(args.repo_root).resolve()
     enabled_flag = repo_root / ".codex" / "memory.enabled"
     if not enabled_flag.exists():
-        if args.cmd == "start":
+        if args.cmd in ("start", "query"):
             print("[MEMORY] disabled (create .codex/memory.enabled to enable)")
         return 0
     cfg = load_config(repo_root)
 
-    session_id = os.environ.get("CODEX_SESSION_ID") or str(uuid.uuid4())
-    timestamp = datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
-
-    payload = collect_repo_state(repo_root)
-    payload["timestamp"] = timestamp
-    payload["cmd"] = args.cmd
-    payload["note"] = args.note.strip()
-    payload["session_id"] = session_id
-    if os.environ.get("CODEX_HOME"):
-        payload["codex_home"] = os.environ.get("CODEX_HOME")
-
-    payload["file_summaries"] = summarize_allowlisted_files(repo_root, cfg)
-    payload["todo_total"] = sum(item["todo_markers"] for item in payload["file_summaries"])
     env_dir = os.environ.get("CODEX_MEMORY_DIR") or os.environ.get("MEMORY_DIR")
     memory_dir = Path(args.memory_dir or env_dir or ".codex/memory")
     if not memory_dir.is_absolute():
@@ -194,7 +390,40 @@ def main():
     if not inside_repo:
         print("[MEMORY] error: memory dir must be inside the repo root", file=sys.stderr)
         return 2
+    # None means memory_ledger's default, so the ledger module loads only when used
+    keyframe_interval = int(cfg["ledger_keyframe_interval"]) if "ledger_keyframe_interval" in cfg else None
+
+    if args.cmd == "query":
+        return query_ledger(memory_dir, args, keyframe_interval)
+    if args.cmd == "compact":
+        ledger = open_ledger(memory_dir, keyframe_interval)
+        try:
+            result = ledger.compact(before=args.until)
+            print(
+                f"[MEMORY] compacted segments={result['segments']} kept={result['kept']} "
+                f"dropped={result['dropped']}"
+            )
+        finally:
+            ledger.close()
+        return 0
+
+    session_id = os.environ.get("CODEX_SESSION_ID") or str(uuid.uuid4())
+    timestamp = datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+
+    payload = collect_repo_state(repo_root)
+    payload["timestamp"] = timestamp
+    payload["cmd"] = args.cmd
+    payload["note"] = args.note.strip()
+    payload["session_id"] = session_id
+    if os.environ.get("CODEX_HOME"):
+        payload["codex_home"] = os.environ.get("CODEX_HOME")
     payload["memory_dir"] = str(memory_dir)
+
+    state = load_memory_state(memory_dir)
+    file_cache = state.setdefault("files", {})
+    payload["file_summaries"] = summarize_allowlisted_files(repo_root, cfg, file_cache)
+    payload["todo_total"] = sum(item["todo_markers"] for item in payload["file_summaries"])
+    resummarized = sum(1 for entry in file_cache.values() if entry.pop("changed", False))
     dry_run = args.dry_run or str(os.environ.get("MEMORY_DRY_RUN", "")).lower() in {
         "1",
         "true",
@@ -203,7 +432,7 @@ def main():
     payload["dry_run"] = bool(dry_run)
 
     if not dry_run:
-        mem_dir = write_outputs(memory_dir, payload)
+        mem_dir = write_outputs(memory_dir, payload, state, keyframe_interval)
     else:
         mem_dir = memory_dir
 
@@ -225,7 +454,9 @@ def main():
         print(f"[MEMORY] repo={repo_root.name} (not a git repo)")
 
     if payload["file_summaries"]:
-        print(f"[MEMORY] allowlisted_files={len(payload['file_summaries'])}")
+        print(
+            f"[MEMORY] allowlisted_files={len(payload['file_summaries'])} resummarized={resummarized}"
+        )
 
     print(f"[MEMORY] brief written: {mem_dir / 'brief.md'}")
     if dry_run:
@@ -20,6 +20,11 @@ fi
 PY="${PYTHON:-python3}"
 SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
 
+# query/compact take memory.py flags (e.g. memory.sh query --branch main)
+if [[ "${CMD}" == "query" || "${CMD}" == "compact" ]]; then
+  exec "$PY" "$SCRIPT_DIR/memory.py" --cmd "$CMD" --repo-root "$REPO_ROOT" "${@:2}"
+fi
+
 exec "$PY" "$SCRIPT_DIR/memory.py" \
   --cmd "$CMD" \
   --repo-root "$REPO_ROOT" \
@@ -0,0 +1,473 @@
+#!/usr/bin/env python3
+"""
+Segmented, indexed checkpoint ledger for memory.py.
+
+Entries are appended to numbered JSONL segment files under
+<memory dir>/ledger/. Each entry is either a keyframe (the full payload) or
+a delta against the previous checkpoint. A sidecar SQLite index records
+every entry's segment, byte offset and length, plus its session_id,
+timestamp, branch and note. Lookups and range queries then read only the
+lines they need, so their cost does not grow with the ledger.
+"""
+import copy
+import json
+import os
+import re
+import sqlite3
+from pathlib import Path
+
+# Every Nth ledger entry is a full snapshot; the ones between are deltas
+LEDGER_KEYFRAME_INTERVAL = 20
+# A segment is closed at the first keyframe after this many entries
+SEGMENT_ENTRIES = 10_000
+
+# seg-000001.jsonl, seg-000001.c2.jsonl (compacted, generation 2) and the
+# .tmp a compaction writes before its index commit
+SEGMENT_FILE = re.compile(r"seg-(\d+)(?:\.c(\d+))?\.jsonl(\.tmp)?$")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS segments (
+    id INTEGER PRIMARY KEY,
+    file TEXT NOT NULL,
+    compacted INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS entries (
+    seq INTEGER PRIMARY KEY,
+    segment INTEGER NOT NULL,
+    offset INTEGER NOT NULL,
+    length INTEGER NOT NULL,
+    keyframe_seq INTEGER NOT NULL,
+    session_id TEXT,
+    timestamp TEXT,
+    branch TEXT,
+    cmd TEXT,
+    note TEXT
+);
+CREATE INDEX IF NOT EXISTS entries_session ON entries (session_id, seq);
+CREATE INDEX IF NOT EXISTS entries_timestamp ON entries (timestamp);
+CREATE INDEX IF NOT EXISTS entries_branch ON entries (branch, seq);
+CREATE INDEX IF NOT EXISTS entries_segment ON entries (segment, seq);
+"""
+
+
+def _normalize(payload: dict):
+    """Key file summaries by path so snapshots diff file by file"""
+    state = dict(payload)
+    state["file_summaries"] = {item["path"]: item for item in payload.get("file_summaries", [])}
+    return state
+
+
+def _denormalize(state: dict):
+    payload = dict(state)
+    payload["file_summaries"] = list(state.get("file_summaries", {}).values())
+    return payload
+
+
+def diff_state(old: dict, new: dict, path=()):
+    """
+    Nested-dict diff as (sets, unsets): [[key path, value], ...] and
+    [key path, ...]. Lists and scalars are replaced whole; a dict whose key
+    order could not be rebuilt by appending is replaced whole too.
+    """
+    sets, unsets = [], []
+    kept = [key for key in old if key in new]
+    if list(new)[: len(kept)] != kept:
+        return [[list(path), new]], []
+    for key, value in new.items():
+        keys = list(path) + [key]
+        if key not in old:
+            sets.append([keys, value])
+        elif isinstance(value, dict) and isinstance(old[key], dict):
+            child_sets, child_unsets = diff_state(old[key], value, tuple(keys))
+            sets += child_sets
+            unsets += child_unsets
+        elif old[key] != value:
+            sets.append([keys, value])
+    for key in old:
+        if key not in new:
+            unsets.append(list(path) + [key])
+    return sets, unsets
+
+
+def apply_delta(state: dict, sets, unsets):
+    state = copy.deepcopy(state)
+    for keys in unsets:
+        node = state
+        for key in keys[:-1]:
+            node = node.setdefault(key, {})
+        node.pop(keys[-1], None)
+    for keys, value in sets:
+        if not keys:
+            state = copy.deepcopy(value)
+            continue
+        node = state
+        for key in keys[:-1]:
+            node = node.setdefault(key, {})
+        node[keys[-1]] = value
+    return state
+
+
+def replay(entries):
+    """
+    Yield (seq, full snapshot) for a run of parsed entries, rebuilding each
+    delta from the preceding keyframe. Entries written before deltas
+    existed are full snapshots and count as keyframes.
+    """
+    state = None
+    for entry in entries:
+        if entry.get("ledger_type") == "delta":
+            if state is None:
+                continue
+            state = apply_delta(state, entry["set"], entry["unset"])
+        else:
+            state = _normalize({k: v for k, v in entry.items() if k not in ("ledger_type", "ledger_seq")})
+        yield entry.get("ledger_seq"), _denormalize(state)
+
+
+def _read_jsonl(path: Path):
+    with path.open(encoding="utf-8") as handle:
+        for line in handle:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+
+def _index_fields(entry: dict):
+    """(session_id, timestamp, branch, cmd, note) as stored in the index"""
+    if entry.get("ledger_type") == "delta":
+        branch = entry.get("branch")
+    else:
+        branch = (entry.get("git") or {}).get("branch")
+    return entry.get("session_id"), entry.get("timestamp"), branch, entry.get("cmd"), entry.get("note")
+
+
+class Ledger:
+    """
+    Append, look up and compact checkpoints.
+
+    Each segment starts with a keyframe, so rebuilding any entry reads at
+    most one keyframe interval of a single segment. A crash between the
+    segment write and the index commit is repaired on open: complete lines
+    past the indexed end of the active segment are indexed, and a torn
+    trailing line is cut off.
+    """
+
+    def __init__(self, directory: Path, segment_entries=SEGMENT_ENTRIES):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.segment_entries = segment_entries
+        self.db = sqlite3.connect(str(self.directory / "index.sqlite"), isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+        self._sweep()
+        self._recover()
+
+    def close(self):
+        self.db.close()
+
+    # --- writing -----------------------------------------------------------
+
+    def _segment_path(self, segment: int):
+        row = self.db.execute("SELECT file FROM segments WHERE id = ?", (segment,)).fetchone()
+        return self.directory / row[0]
+
+    def _active_segment(self):
+        row = self.db.execute("SELECT max(id) FROM segments").fetchone()
+        return row[0]
+
+    def _new_segment(self):
+        segment = (self._active_segment() or 0) + 1
+        self.db.execute(
+            "INSERT INTO segments (id, file) VALUES (?, ?)", (segment, f"seg-{segment:06d}.jsonl")
+        )
+        return segment
+
+    def last(self):
+        """(seq, keyframe_seq) of the newest entry, or (0, 0)"""
+        row = self.db.execute("SELECT seq, keyframe_seq FROM entries ORDER BY seq DESC LIMIT 1").fetchone()
+        return row or (0, 0)
+
+    def append(self, payload: dict, previous=None, keyframe_interval=None):
+        """
+        Append one checkpoint and return the entry written. `previous` is
+        the payload of the checkpoint before it; without it (or every
+        `keyframe_interval` entries, default LEDGER_KEYFRAME_INTERVAL) a
+        full keyframe is written.
+        """
+        keyframe_interval = keyframe_interval or LEDGER_KEYFRAME_INTERVAL
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            last_seq, last_keyframe = self.last()
+            seq = last_seq + 1
+            if previous is None or seq - last_keyframe >= keyframe_interval:
+                entry = {"ledger_type": "keyframe", "ledger_seq": seq, **payload}
+            else:
+                sets, unsets = diff_state(_normalize(previous), _normalize(payload))
+                entry = {
+                    "ledger_type": "delta",
+                    "ledger_seq": seq,
+                    "timestamp": payload.get("timestamp"),
+                    "session_id": payload.get("session_id"),
+                    "cmd": payload.get("cmd"),
+                    "branch": (payload.get("git") or {}).get("branch"),
+                    "set": sets,
+                    "unset": unsets,
+                }
+            keyframe = entry["ledger_type"] == "keyframe"
+
+            segment = self._active_segment()
+            if segment is None:
+                segment = self._new_segment()
+            elif keyframe:
+                count = self.db.execute(
+                    "SELECT count(*) FROM entries WHERE segment = ?", (segment,)
+                ).fetchone()[0]
+                if count >= self.segment_entries:
+                    segment = self._new_segment()
+            if not keyframe and self.db.execute(
+                "SELECT 1 FROM entries WHERE segment = ? LIMIT 1", (segment,)
+            ).fetchone() is None:
+                # A fresh or recovered segment must open with a keyframe
+                entry = {"ledger_type": "keyframe", "ledger_seq": seq, **payload}
+                keyframe = True
+
+            line = (json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8")
+            with self._segment_path(segment).open("ab") as handle:
+                offset = handle.tell()
+                handle.write(line)
+            self._insert(seq, segment, offset, len(line), seq if keyframe else last_keyframe, entry, payload)
+            self.db.execute("COMMIT")
+        except BaseException:
+            self.db.execute("ROLLBACK")
+            raise
+        return entry
+
+    def _insert(self, seq, segment, offset, length, keyframe_seq, entry, payload=None):
+        session_id, timestamp, branch, cmd, note = _index_fields(entry)
+        if payload is not None:
+            note = payload.get("note")
+        self.db.execute(
+            "INSERT INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (seq, segment, offset, length, keyframe_seq, session_id, timestamp, branch, cmd, note or ""),
+        )
+
+    def _sweep(self):
+        """
+        Finish or clean up after a crashed append or compaction.
+
+        Runs under the index write lock, so no other process is between
+        creating a segment file and committing its row. A compaction's
+        .tmp output whose row committed is renamed into place; leftovers
+        are deleted only when no row refers to them and their generation
+        is not newer than the committed one (a newer .tmp may still be
+        written by a compaction that has not committed yet).
+        """
+        known = {row[0] for row in self.db.execute("SELECT file FROM segments")}
+        if all(path.name in known for path in self.directory.glob("seg-*")):
+            return
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            committed = {}
+            for segment, filename, generation in self.db.execute("SELECT id, file, compacted FROM segments"):
+                committed[segment] = generation
+                path = self.directory / filename
+                staged = path.with_name(filename + ".tmp")
+                if not path.exists() and staged.exists():
+                    os.replace(staged, path)
+            known = {row[0] for row in self.db.execute("SELECT file FROM segments")}
+            for path in self.directory.glob("seg-*"):
+                match = SEGMENT_FILE.match(path.name)
+                if not match or path.name in known:
+                    continue
+                segment, generation = int(match.group(1)), int(match.group(2) or 0)
+                if segment not in committed or generation <= committed[segment]:
+                    path.unlink(missing_ok=True)
+            self.db.execute("COMMIT")
+        except BaseException:
+            self.db.execute("ROLLBACK")
+            raise
+
+    def _recover(self):
+        segment = self._active_segment()
+        if segment is None:
+            return
+        path = self._segment_path(segment)
+        size = path.stat().st_size if path.exists() else 0
+        row = self.db.execute(
+            "SELECT max(offset + length) FROM entries WHERE segment = ?", (segment,)
+        ).fetchone()
+        indexed_end = row[0] or 0
+        if size == indexed_end:
+            return
+
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            if size < indexed_end:
+                # The segment lost lines the index knows about; forget them
+                self.db.execute(
+                    "DELETE FROM entries WHERE segment = ? AND offset + length > ?", (segment, size)
+                )
+            else:
+                with path.open("rb") as handle:
+                    handle.seek(indexed_end)
+                    tail = handle.read()
+                offset = indexed_end
+                for raw in tail.splitlines(keepends=True):
+                    try:
+                        if not raw.endswith(b"\n"):
+                            raise ValueError("torn line")
+                        entry = json.loads(raw)
+                    except ValueError:
+                        with path.open("r+b") as handle:
+                            handle.truncate(offset)
+                        break
+                    last_seq, last_keyframe = self.last()
+                    seq = entry.get("ledger_seq") or last_seq + 1
+                    keyframe = entry.get("ledger_type") != "delta"
+                    self._insert(seq, segment, offset, len(raw), seq if keyframe else last_keyframe, entry)
+                    offset += len(raw)
+            self.db.execute("COMMIT")
+        except BaseException:
+            self.db.execute("ROLLBACK")
+            raise
+
+    def import_jsonl(self, path: Path, keyframe_interval=None):
+        """Load a flat ledger.jsonl from before segments existed"""
+        previous = None
+        count = 0
+        for _, snapshot in replay(_read_jsonl(path)):
+            self.append(snapshot, previous, keyframe_interval)
+            previous = snapshot
+            count += 1
+        return count
+
+    # --- reading -----------------------------------------------------------
+
+    def query(self, session_id=None, branch=None, since=None, until=None, cmd=None, seq=None,
+              limit=None, newest_first=True):
+        """Index rows (as dicts) matching every given filter"""
+        clauses, params = [], []
+        for column, value in (("session_id", session_id), ("branch", branch), ("cmd", cmd), ("seq", seq)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if since is not None:
+            clauses.append("timestamp >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("timestamp < ?")
+            params.append(until)
+        sql = "SELECT seq, timestamp, session_id, branch, cmd, note FROM entries"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY seq DESC" if newest_first else " ORDER BY seq"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        columns = ("seq", "timestamp", "session_id", "branch", "cmd", "note")
+        return [dict(zip(columns, row)) for row in self.db.execute(sql, params)]
+
+    def snapshot(self, seq: int):
+        """The full payload of checkpoint `seq`, or None"""
+        row = self.db.execute(
+            "SELECT segment, offset, length, keyframe_seq FROM entries WHERE seq = ?", (seq,)
+        ).fetchone()
+        if row is None:
+            return None
+        segment, offset, length, keyframe_seq = row
+        start = self.db.execute("SELECT offset FROM entries WHERE seq = ?", (keyframe_seq,)).fetchone()[0]
+        with self._segment_path(segment).open("rb") as handle:
+            handle.seek(start)
+            chunk = handle.read(offset + length - start)
+        entries = [json.loads(line) for line in chunk.splitlines()]
+        result = None
+        for _, snapshot in replay(entries):
+            result = snapshot
+        return result
+
+    def _segment_snapshots(self, segment: int):
+        return replay(_read_jsonl(self._segment_path(segment)))
+
+    def stats(self):
+        entries, segments = self.db.execute(
+            "SELECT count(*), count(DISTINCT segment) FROM entries"
+        ).fetchone()
+        size = sum(p.stat().st_size for p in self.directory.glob("seg-*.jsonl"))
+        return {"entries": entries, "segments": segments, "bytes": size}
+
+    # --- compaction --------------------------------------------------------
+
+    def compact(self, before=None):
+        """
+        Merge closed segments (all but the active one, optionally only those
+        whose newest entry is older than `before`) into one segment. That
+        segment keeps every checkpoint with a note plus the last checkpoint
+        of each session, all as keyframes.
+        """
+        active = self._active_segment()
+        sql = "SELECT segment, max(timestamp) FROM entries WHERE segment != ? GROUP BY segment ORDER BY segment"
+        segments = [
+            segment for segment, newest in self.db.execute(sql, (active,))
+            if before is None or (newest or "") < before
+        ]
+        if not segments:
+            return {"segments": 0, "kept": 0, "dropped": 0}
+
+        keep = set()
+        last_per_session = {}
+        placeholders = ",".join("?" * len(segments))
+        for seq, session_id, note in self.db.execute(
+            f"SELECT seq, session_id, note FROM entries WHERE segment IN ({placeholders}) ORDER BY seq",
+            segments,
+        ):
+            if note:
+                keep.add(seq)
+            last_per_session[session_id] = seq
+        keep.update(last_per_session.values())
+
+        target = segments[0]
+        generation = self.db.execute("SELECT compacted FROM segments WHERE id = ?", (target,)).fetchone()[0] + 1
+        filename = f"seg-{target:06d}.c{generation}.jsonl"
+        staged = self.directory / (filename + ".tmp")
+        rows = []
+        dropped = 0
+        with staged.open("wb") as out:
+            for segment in segments:
+                for seq, snapshot in self._segment_snapshots(segment):
+                    if seq not in keep:
+                        dropped += 1
+                        continue
+                    entry = {"ledger_type": "keyframe", "ledger_seq": seq, **snapshot}
+                    line = (json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8")
+                    rows.append((seq, out.tell(), len(line), entry))
+                    out.write(line)
+            out.flush()
+            os.fsync(out.fileno())
+
+        old_files = [self._segment_path(segment) for segment in segments]
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            self.db.execute(f"DELETE FROM entries WHERE segment IN ({placeholders})", segments)
+            self.db.execute(f"DELETE FROM segments WHERE id IN ({placeholders})", segments)
+            self.db.execute(
+                "INSERT INTO segments (id, file, compacted) VALUES (?, ?, ?)", (target, filename, generation)
+            )
+            for seq, offset, length, entry in rows:
+                self._insert(seq, target, offset, length, seq, entry)
+            self.db.execute("COMMIT")
+        except BaseException:
+            self.db.execute("ROLLBACK")
+            staged.unlink()
+            raise
+        # Renamed only once the index points at it; a crash in between is
+        # rolled forward by _sweep, which another process may have done first
+        try:
+            os.replace(staged, self.directory / filename)
+        except FileNotFoundError:
+            pass
+        for path in old_files:
+            path.unlink(missing_ok=True)
+        self.db.execute("VACUUM")
+        return {"segments": len(segments), "kept": len(rows), "dropped": dropped}
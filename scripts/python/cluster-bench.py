@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+BlackRoad Cluster Benchmark
+Spins up local workers and measures the coordinator against standard workloads
+"""
+
+import contextlib
+import importlib.util
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+import requests
+
+from latency_stats import percentile
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+BASE_PORT = 18880
+STRAGGLER_ENV = 'BLACKROAD_BENCH_STRAGGLER_DELAY'
+
+
+def load_script(name, filename):
+    """Import a sibling script whose filename is not a valid module name"""
+    spec = importlib.util.spec_from_file_location(name, SCRIPT_DIR / filename)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+coordinator = load_script('cluster_coordinator', 'cluster-coordinator.py')
+
+
+class LocalWorkers:
+    """Context manager running N cluster-worker processes on localhost"""
+
+    def __init__(self, count, base_port=BASE_PORT, stragglers=0, straggler_delay=0.0):
+        self.count = count
+        self.base_port = base_port
+        self.stragglers = stragglers
+        self.straggler_delay = straggler_delay
+        self.procs = []
+        self.nodes = []
+
+    def __enter__(self):
+        worker = SCRIPT_DIR / 'cluster-worker.py'
+        for i in range(self.count):
+            port = self.base_port + i
+            env = dict(os.environ)
+            # The first `stragglers` workers emulate a throttled Pi (see workload_straggler)
+            if i < self.stragglers:
+                env[STRAGGLER_ENV] = str(self.straggler_delay)
+            proc = subprocess.Popen(
+                [sys.executable, str(worker), '--host', '127.0.0.1', '--port', str(port)],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                env=env,
+            )
+            self.procs.append(proc)
+            self.nodes.append({'name': f'local{i}', 'host': '127.0.0.1', 'port': port, 'power': 1, 'arch': platform.machine()})
+
+        deadline = time.time() + 15
+        for node in self.nodes:
+            url = f"http://{node['host']}:{node['port']}/status"
+            while True:
+                try:
+                    requests.get(url, timeout=1)
+                    break
+                except requests.RequestException:
+                    if time.time() > deadline:
+                        self.__exit__(None, None, None)
+                        raise RuntimeError(f"worker on port {node['port']} did not start")
+                    time.sleep(0.1)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        for proc in self.procs:
+            proc.terminate()
+        for proc in self.procs:
+            try:
+                proc.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+        return False
+
+
+class RecordingCluster(coordinator.BlackRoadCluster):
+    """Cluster that keeps one result per task for later aggregation
+
+    distribute_parallel batches record the copy that won; losing backup copies
+    may still be running and are never counted.
+    """
+
+    def __init__(self, nodes, speculate=False, **kwargs):
+        self.records = []
+        self.speculate = speculate
+        # Held by id (and kept alive so ids are not reused) to tell batch copies apart
+        self.batch_tasks = {}
+        super().__init__(nodes=nodes, **kwargs)
+
+    def execute_task(self, node, task):
+        result = super().execute_task(node, task)
+        batched = id(task) in self.batch_tasks or task.get('task_id', '').endswith(coordinator.BACKUP_SUFFIX)
+        if not batched:
+            self.records.append(result)
+        return result
+
+    def distribute_parallel(self, tasks, speculate=None):
+        self.batch_tasks.update((id(task), task) for task in tasks)
+        results = super().distribute_parallel(tasks, self.speculate if speculate is None else speculate)
+        self.records.extend(results)
+        return results
+
+
+# Standard workloads: each takes a cluster and a task count and runs to completion
+
+def workload_empty(cluster, n):
+    cluster.distribute_parallel([{'type': 'python', 'code': 'pass'} for _ in range(n)])
+
+
+def workload_matmul(cluster, n, size=200):
+    code = f"""
+a = np.random.rand({size}, {size})
+b = np.random.rand({size}, {size})
+c = np.dot(a, b)
+print(c.shape)
+"""
+    cluster.distribute_parallel([{'type': 'numpy', 'code': code} for _ in range(n)])
+
+
+def workload_mapreduce(cluster, n, span=10000):
+    chunks = [list(range(i * span, (i + 1) * span)) for i in range(n)]
+    map_code = "result = sum(data); print(result)"
+    reduce_code = "total = sum(int(r.strip()) for r in results if r.strip()); print(total)"
+    cluster.map_reduce(chunks, map_code, reduce_code)
+
+
+def workload_large_payload(cluster, n, payload_bytes=96 * 1024):
+    # Code travels as a single python3 -c argument, which Linux caps at 128 KiB
+    code = f"data = {'x' * payload_bytes!r}\nprint(data)"
+    cluster.distribute_parallel([{'type': 'python', 'code': code} for _ in range(n)])
+
+
+def workload_straggler(cluster, n):
+    # Sleeps only on workers started with a straggler delay
+    code = f"import os, time; time.sleep(float(os.environ.get('{STRAGGLER_ENV}', 0)))"
+    cluster.distribute_parallel([{'type': 'python', 'code': code} for _ in range(n)])
+
+
+def workload_pipeline(cluster, n):
+    # n independent fetch -> transform chains feeding one aggregate task
+    dag = {}
+    for i in range(n):
+        dag[f'fetch_{i}'] = {'type': 'python', 'code': f"print({i})"}
+        dag[f'transform_{i}'] = {'type': 'python', 'depends_on': [f'fetch_{i}'],
+                                 'code': f"print(int(inputs['fetch_{i}']) * 2)"}
+    dag['aggregate'] = {'type': 'python', 'depends_on': [f'transform_{i}' for i in range(n)],
+                        'code': "print(sum(int(v) for v in inputs.values()))"}
+    cluster.run_dag(dag)
+
+
+WORKLOADS = {
+    'empty': workload_empty,
+    'matmul': workload_matmul,
+    'mapreduce': workload_mapreduce,
+    'large_payload': workload_large_payload,
+    'pipeline': workload_pipeline,
+    'straggler': workload_straggler,
+}
+
+
+def run_workload(nodes, name, tasks, speculate=False, speculation_threshold=coordinator.SPECULATION_THRESHOLD):
+    """Run one workload and summarise throughput, latency and transfer"""
+    # Discovery and per-task progress lines would pollute the JSON report
+    with contextlib.redirect_stdout(io.StringIO()):
+        cluster = RecordingCluster(nodes, speculate=speculate, speculation_threshold=speculation_threshold)
+        start = time.time()
+        WORKLOADS[name](cluster, tasks)
+        makespan = time.time() - start
+
+    records = list(cluster.records)
+    latencies = [r['dispatch_latency'] * 1000 for r in records]
+    return {
+        'tasks': len(records),
+        'successful': sum(1 for r in records if r.get('success')),
+        'makespan_s': round(makespan, 4),
+        'tasks_per_sec': round(len(records) / makespan, 2) if makespan else 0.0,
+        'latency_ms': {
+            'p50': round(percentile(latencies, 50), 3),
+            'p95': round(percentile(latencies, 95), 3),
+            'p99': round(percentile(latencies, 99), 3),
+        },
+        'bytes_sent': sum(r.get('bytes_sent', 0) for r in records),
+        'bytes_received': sum(r.get('bytes_received', 0) for r in records),
+        'speculation': cluster.last_speculation,
+    }
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Benchmark the BlackRoad cluster on local workers')
+    parser.add_argument('--workers', type=int, default=3, help='Number of local workers to start')
+    parser.add_argument('--tasks', type=int, default=24, help='Tasks per workload')
+    parser.add_argument('--base-port', type=int, default=BASE_PORT, help='First worker port')
+    parser.add_argument('--workload', action='append', choices=sorted(WORKLOADS),
+                        help='Workload to run (repeatable, default: all)')
+    parser.add_argument('--speculate', action='store_true',
+                        help='Back up straggling tasks (every bench workload is idempotent)')
+    parser.add_argument('--speculation-threshold', type=float, default=coordinator.SPECULATION_THRESHOLD,
+                        help='Batch fraction complete before backups launch (negative disables)')
+    parser.add_argument('--stragglers', type=int, default=0, help='Workers that emulate a throttled node')
+    parser.add_argument('--straggler-delay', type=float, default=2.0, help='Seconds each straggler task sleeps')
+    parser.add_argument('--output', help='Write JSON report to this file instead of stdout')
+    args = parser.parse_args()
+    threshold = args.speculation_threshold if args.speculation_threshold >= 0 else None
+
+    report = {
+        'timestamp': datetime.now().isoformat(),
+        'host': platform.node(),
+        'python': platform.python_version(),
+        'workers': args.workers,
+        'tasks_per_workload': args.tasks,
+        'speculate': args.speculate,
+        'speculation_threshold': threshold,
+        'stragglers': args.stragglers,
+        'workloads': {},
+    }
+
+    with LocalWorkers(args.workers, args.base_port, args.stragglers, args.straggler_delay) as workers:
+        for name in args.workload or list(WORKLOADS):
+            report['workloads'][name] = run_workload(workers.nodes, name, args.tasks, args.speculate, threshold)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
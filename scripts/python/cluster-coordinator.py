@@ -8,7 +8,9 @@ import requests
 import json
 import time
 import hashlib
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import statistics
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
 from datetime import datetime
 
 # Cluster node configurations
@@ -18,11 +20,20 @@ NODES = [
     {'name': 'lucidia', 'host': '192.168.4.38', 'port': 8888, 'power': 5, 'arch': 'aarch64'},
 ]
 
+# Fraction of a batch that must finish before stragglers get backup copies
+SPECULATION_THRESHOLD = 0.75
+# A task is a straggler once it has run this many times the median completion time
+SPECULATION_SLOWDOWN = 2.0
+# Appended to the task_id of a backup copy
+BACKUP_SUFFIX = '_spec'
+
 class BlackRoadCluster:
     """Distributed cluster coordinator"""
 
-    def __init__(self):
-        self.nodes = NODES
+    def __init__(self, nodes=None, speculation_threshold=SPECULATION_THRESHOLD):
+        self.nodes = nodes if nodes is not None else NODES
+        self.speculation_threshold = speculation_threshold
+        self.last_speculation = None
         self.available_nodes = []
         self.discover_nodes()
 
@@ -48,50 +59,138 @@ class BlackRoadCluster:
 
     def execute_task(self, node, task):
         """Execute a task on a specific node"""
+        start = time.time()
         try:
             url = f"http://{node['host']}:{node['port']}/execute"
             response = requests.post(url, json=task, timeout=300)
             if response.status_code == 200:
-                return response.json()
+                result = response.json()
             else:
-                return {'success': False, 'error': f"HTTP {response.status_code}", 'node': node['name']}
+                result = {'success': False, 'error': f"HTTP {response.status_code}", 'node': node['name']}
+            # Transfer accounting for benchmarks and dashboards
+            result['bytes_sent'] = len(response.request.body or b'')
+            result['bytes_received'] = len(response.content)
         except Exception as e:
-            return {'success': False, 'error': str(e), 'node': node['name']}
-
-    def distribute_parallel(self, tasks):
-        """Distribute tasks across all available nodes in parallel"""
+            result = {'success': False, 'error': str(e), 'node': node['name']}
+        result['dispatch_latency'] = time.time() - start
+        return result
+
+    def distribute_parallel(self, tasks, speculate=False):
+        """Distribute tasks across all available nodes in parallel
+
+        Tasks go to nodes as they become idle. With `speculate`, once
+        `speculation_threshold` of the batch has finished, idle nodes run a backup
+        copy of any task that has been running for more than SPECULATION_SLOWDOWN
+        times the batch's median completion time, and whichever copy returns first
+        wins. A backup runs the task twice, so only speculate on idempotent tasks;
+        a task's own 'speculate' key overrides the batch setting.
+        """
         print(f"🚀 Distributing {len(tasks)} tasks across {len(self.available_nodes)} nodes...")
 
-        results = []
+        results = [None] * len(tasks)
+        pending = deque(range(len(tasks)))
+        idle = list(self.available_nodes)
+        running = {}
+        abandoned = {}
+        started = {}
+        durations = []
+        backed_up = set()
+        completed = 0
+        won = 0
         start_time = time.time()
 
-        with ThreadPoolExecutor(max_workers=len(self.available_nodes)) as executor:
-            # Map tasks to nodes (round-robin)
-            futures = []
-            for i, task in enumerate(tasks):
-                node = self.available_nodes[i % len(self.available_nodes)]
-                task['task_id'] = f"task_{i}_{int(time.time())}"
-                future = executor.submit(self.execute_task, node, task)
-                futures.append((future, node['name'], task['task_id']))
-
-            # Collect results
-            for future, node_name, task_id in futures:
-                try:
-                    result = future.result()
-                    results.append(result)
+        batch_id = int(start_time)
+        for i, task in enumerate(tasks):
+            task['task_id'] = f"task_{i}_{batch_id}"
+        speculative = {i for i, task in enumerate(tasks) if task.get('speculate', speculate)}
+
+        executor = ThreadPoolExecutor(max_workers=len(self.available_nodes))
+
+        def launch(index, backup):
+            node = max(idle, key=lambda n: n.get('power', 0))
+            idle.remove(node)
+            task = tasks[index]
+            if backup:
+                task = dict(task, task_id=f"{task['task_id']}{BACKUP_SUFFIX}")
+            future = executor.submit(self.execute_task, node, task)
+            running[future] = (index, node, backup, time.time())
+
+        try:
+            while pending or running:
+                while pending and idle:
+                    index = pending.popleft()
+                    started[index] = time.time()
+                    launch(index, backup=False)
+
+                # Back up stragglers on nodes that would otherwise sit idle
+                timeout = None
+                threshold = self.speculation_threshold
+                if (threshold is not None and speculative and durations and not pending and idle
+                        and completed >= threshold * len(tasks)):
+                    cutoff = SPECULATION_SLOWDOWN * statistics.median(durations)
+                    now = time.time()
+                    candidates = sorted(
+                        (i for i in speculative if i in started and results[i] is None and i not in backed_up),
+                        key=started.get,
+                    )
+                    for index in [i for i in candidates if now - started[i] > cutoff][:len(idle)]:
+                        backed_up.add(index)
+                        launch(index, backup=True)
+                    # Wake up when the next candidate crosses the cutoff, not only on completions
+                    due = [started[i] + cutoff - now for i in candidates if i not in backed_up]
+                    if idle and due:
+                        timeout = max(min(due), 0.01)
+
+                done, _ = wait(list(running) + list(abandoned), timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future in abandoned:
+                        idle.append(abandoned.pop(future))
+                        continue
+                    index, node, backup, launched = running.pop(future)
+                    idle.append(node)
+                    task_id = tasks[index]['task_id']
+
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        result = {'success': False, 'error': str(e), 'node': node['name']}
+
+                    others = [f for f, (i, *_) in running.items() if i == index]
+                    # A failed copy only counts once no other copy can still succeed
+                    if not result.get('success') and others:
+                        continue
+                    # The losing copy keeps its node busy but no longer holds up the batch
+                    for other in others:
+                        abandoned[other] = running.pop(other)[1]
+
+                    results[index] = result
+                    completed += 1
+                    durations.append(time.time() - launched)
+                    if backup:
+                        result['speculative'] = True
+                        won += 1
                     status = "✅" if result.get('success') else "❌"
                     elapsed = result.get('elapsed', 0)
-                    print(f"  {status} {node_name}: {task_id} ({elapsed:.2f}s)")
-                except Exception as e:
-                    print(f"  ❌ {node_name}: {task_id} - {str(e)}")
-                    results.append({'success': False, 'error': str(e), 'node': node_name})
+                    tag = " [backup]" if backup else ""
+                    print(f"  {status} {node['name']}: {task_id} ({elapsed:.2f}s){tag}")
+        finally:
+            # Losing copies finish in the background; never block the batch on them
+            executor.shutdown(wait=False)
 
         total_time = time.time() - start_time
         successful = sum(1 for r in results if r.get('success'))
+        self.last_speculation = {
+            'launched': len(backed_up),
+            'won': won,
+            'rate': len(backed_up) / len(tasks) if tasks else 0.0,
+        }
 
         print(f"\n📈 Summary:")
         print(f"  Total tasks: {len(tasks)}")
         print(f"  Successful: {successful}/{len(tasks)}")
+        if speculative:
+            print(f"  Speculative: {len(backed_up)} backups launched "
+                  f"({self.last_speculation['rate']:.0%}), {won} won")
         print(f"  Total time: {total_time:.2f}s")
         print(f"  Avg per task: {total_time/len(tasks):.2f}s")
         print()
@@ -135,6 +234,109 @@ results = {outputs}
 
         return map_results
 
+    def run_dag(self, dag):
+        """Execute a task DAG, dispatching each task as soon as its dependencies finish
+
+        `dag` maps a task name to a task dict with an optional 'depends_on' list of
+        task names. Python and numpy tasks see their dependencies' outputs as an
+        `inputs` dict keyed by task name. A failed task fails all its dependents.
+        Returns a dict of task name -> result.
+        """
+        deps = {name: set(task.get('depends_on', [])) for name, task in dag.items()}
+        dependents = defaultdict(list)
+        for name, parents in deps.items():
+            for parent in parents:
+                if parent not in dag:
+                    raise ValueError(f"Task {name!r} depends on unknown task {parent!r}")
+                dependents[parent].append(name)
+        self._check_acyclic(deps, dependents)
+
+        print(f"🔀 DAG: {len(dag)} tasks across {len(self.available_nodes)} nodes")
+
+        waiting = {name: set(parents) for name, parents in deps.items()}
+        ready = deque(name for name, parents in deps.items() if not parents)
+        results = {}
+        idle = list(self.available_nodes)
+        running = {}
+        start_time = time.time()
+
+        def fail_dependents(name):
+            for child in dependents[name]:
+                if child not in results:
+                    results[child] = {'success': False, 'error': f"dependency {name} failed", 'node': None}
+                    print(f"  ⏭️  {child}: skipped ({name} failed)")
+                    fail_dependents(child)
+
+        with ThreadPoolExecutor(max_workers=len(self.available_nodes)) as executor:
+            while ready or running:
+                # Fill every idle node, strongest first
+                while ready and idle:
+                    name = ready.popleft()
+                    if name in results:
+                        continue
+                    node = max(idle, key=lambda n: n.get('power', 0))
+                    idle.remove(node)
+                    inputs = {parent: results[parent].get('output', '') for parent in deps[name]}
+                    task = self._bind_inputs(dag[name], inputs)
+                    task['task_id'] = f"{name}_{int(time.time())}"
+                    running[executor.submit(self.execute_task, node, task)] = (name, node)
+
+                if not running:
+                    break
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name, node = running.pop(future)
+                    idle.append(node)
+                    result = future.result()
+                    results[name] = result
+                    status = "✅" if result.get('success') else "❌"
+                    print(f"  {status} {node['name']}: {name} ({result.get('elapsed', 0):.2f}s)")
+
+                    if not result.get('success'):
+                        fail_dependents(name)
+                        continue
+                    for child in dependents[name]:
+                        waiting[child].discard(name)
+                        if not waiting[child] and child not in results:
+                            ready.append(child)
+
+        total_time = time.time() - start_time
+        successful = sum(1 for r in results.values() if r.get('success'))
+
+        print(f"\n📈 Summary:")
+        print(f"  Total tasks: {len(dag)}")
+        print(f"  Successful: {successful}/{len(dag)}")
+        print(f"  Total time: {total_time:.2f}s")
+        print()
+
+        return results
+
+    @staticmethod
+    def _check_acyclic(deps, dependents):
+        """Raise ValueError if the dependency graph has a cycle (Kahn's algorithm)"""
+        indegree = {name: len(parents) for name, parents in deps.items()}
+        queue = deque(name for name, count in indegree.items() if count == 0)
+        visited = 0
+        while queue:
+            name = queue.popleft()
+            visited += 1
+            for child in dependents[name]:
+                indegree[child] -= 1
+                if indegree[child] == 0:
+                    queue.append(child)
+        if visited != len(deps):
+            cyclic = sorted(name for name, count in indegree.items() if count > 0)
+            raise ValueError(f"Task DAG has a cycle through: {', '.join(cyclic)}")
+
+    @staticmethod
+    def _bind_inputs(task, inputs):
+        """Copy a DAG task, exposing dependency outputs to Python code as `inputs`"""
+        task = {k: v for k, v in task.items() if k != 'depends_on'}
+        if task.get('type', 'python') in ('python', 'numpy'):
+            task['code'] = f"inputs = {inputs!r}\n{task.get('code', '')}"
+        return task
+
     def cluster_status(self):
         """Get status from all nodes"""
         print("📊 Cluster Status")
@@ -215,6 +417,43 @@ def demo_map_reduce():
     result = cluster.map_reduce(chunks, map_code, reduce_code)
     print(f"\n📊 Final result: {result.get('output') if result else 'Failed'}")
 
+def demo_pipeline():
+    """Demo: fetch -> transform -> aggregate -> render pipeline"""
+    cluster = BlackRoadCluster()
+
+    if not cluster.available_nodes:
+        print("❌ No nodes available!")
+        return
+
+    print("🔀 Demo: Pipelined DAG")
+    print("=" * 50)
+
+    dag = {}
+    for i in range(4):
+        dag[f'fetch_{i}'] = {
+            'type': 'python',
+            'code': f"print(sum(range({i * 250000}, {(i + 1) * 250000})))",
+        }
+        dag[f'transform_{i}'] = {
+            'type': 'python',
+            'depends_on': [f'fetch_{i}'],
+            'code': f"print(int(inputs['fetch_{i}']) // 1000)",
+        }
+    dag['aggregate'] = {
+        'type': 'python',
+        'depends_on': [f'transform_{i}' for i in range(4)],
+        'code': "print(sum(int(v) for v in inputs.values()))",
+    }
+    dag['render'] = {
+        'type': 'python',
+        'depends_on': ['aggregate'],
+        'code': "print(f\"Total (thousands): {int(inputs['aggregate']):,}\")",
+    }
+
+    results = cluster.run_dag(dag)
+    print(f"📊 Final result: {results['render'].get('output', '').strip() or 'Failed'}")
+    return results
+
 if __name__ == '__main__':
     import sys
 
@@ -227,9 +466,12 @@ if __name__ == '__main__':
             demo_distributed_compute()
         elif sys.argv[1] == 'mapreduce':
             demo_map_reduce()
+        elif sys.argv[1] == 'pipeline':
+            demo_pipeline()
     else:
         print("BlackRoad Cluster Coordinator")
         print("\nUsage:")
         print("  python3 blackroad-cluster-coordinator.py status     - Show cluster status")
         print("  python3 blackroad-cluster-coordinator.py demo       - Run distributed compute demo")
         print("  python3 blackroad-cluster-coordinator.py mapreduce  - Run map/reduce demo")
+        print("  python3 blackroad-cluster-coordinator.py pipeline   - Run DAG pipeline demo")
@@ -188,12 +188,21 @@ import time
 
 def main():
     """Start worker node"""
+    global NODE_PORT
+    import argparse
+
+    parser = argparse.ArgumentParser(description='BlackRoad cluster worker node')
+    parser.add_argument('--host', default='0.0.0.0', help='Address to bind')
+    parser.add_argument('--port', type=int, default=NODE_PORT, help='Port to listen on')
+    args = parser.parse_args()
+    NODE_PORT = args.port
+
     print(f"🖤🛣️ BlackRoad Cluster Worker: {NODE_NAME}")
     print(f"Architecture: {NODE_ARCH}")
     print(f"Listening on port {NODE_PORT}")
     print(f"=" * 50)
 
-    server = HTTPServer(('0.0.0.0', NODE_PORT), WorkerHandler)
+    server = HTTPServer((args.host, NODE_PORT), WorkerHandler)
 
     try:
         server.serve_forever()
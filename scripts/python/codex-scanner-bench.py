@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Benchmark codex-scanner component extraction on large generated sources.
+
+Generates one big TSX file (components whose strings hold unbalanced
+braces, as bundled or generated code often does, and one-line components
+with JSX closing tags) and one big Python file, and times extraction with
+the current scanner and, optionally, with the scanner from an older git
+revision.
+
+Extraction includes building each component entry (MinHash signature and
+quality signals), so span finding is also timed on its own as spans_ms
+for scanners that have js_component_spans / python_component_spans.
+
+  scripts/python/codex-scanner-bench.py --components 2000 --baseline HEAD~1
+"""
+import argparse
+import importlib.util
+import json
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+SCRIPT = Path(__file__).resolve().parent / "codex-scanner.py"
+
+TSX_COMPONENT = '''export const Panel{i} = ({{ title }}) => {{
+  const open = "{{";
+  const style = {{ padding: {i}, margin: 0 }};
+  if (!title) {{
+    return null;
+  }}
+  return <div style={{style}}>{{title}}{{open}}</div>;
+}};
+
+export function format{i}(value: number): string {{
+  return `${{value}} items`;
+}}
+
+export const Badge{i} = ({{ label }}) => {{ return <span>{{label}}</span>; }}
+const badgeSize{i} = {i};
+
+'''
+
+PY_COMPONENT = '''def handler_{i}(event, context):
+    """Handle event {i}"""
+    payload = {{"id": {i}, "kind": "event"}}
+    if event:
+        payload["event"] = event
+    return payload
+
+
+TABLE_{i} = [
+{rows}
+]
+
+
+class Model{i}:
+    def save(self):
+        return {i}
+
+
+'''
+
+
+def load_scanner(path: Path):
+    spec = importlib.util.spec_from_file_location(f"codex_scanner_{abs(hash(str(path)))}", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def build_sources(components: int, table_rows: int):
+    tsx = "import React from 'react';\n\n" + "".join(TSX_COMPONENT.format(i=i) for i in range(components))
+    rows = "\n".join(f"    ({n}, 'row-{n}')," for n in range(table_rows))
+    py = "import os\n\n\n" + "".join(PY_COMPONENT.format(i=i, rows=rows) for i in range(components))
+    return tsx, py
+
+
+def median_ms(call, rounds: int):
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        result = call()
+        samples.append((time.perf_counter() - start) * 1000)
+    return result, round(statistics.median(samples), 1)
+
+
+def time_extraction(script: Path, tsx: str, py: str, rounds: int):
+    module = load_scanner(script)
+    # Span finding alone, without building component entries; older scanners lack these
+    spans = {}
+    if hasattr(module, "js_component_spans"):
+        spans["tsx"] = lambda: module.js_component_spans(tsx, jsx=True)
+    if hasattr(module, "python_component_spans"):
+        py_lines = py.split("\n")
+        spans["python"] = lambda: module.python_component_spans(py, py_lines)
+    with tempfile.TemporaryDirectory() as library:
+        scanner = module.ComponentScanner(library)
+        report = {"script": str(script)}
+        for label, source, method, name in (
+            ("tsx", tsx, scanner.extract_typescript_components, "bench.tsx"),
+            ("python", py, scanner.extract_python_components, "bench.py"),
+        ):
+            found, ms = median_ms(lambda: method(source, Path(name), "bench"), rounds)
+            report[label] = {
+                "components": len(found),
+                # Lines inside component spans; grows if a component overruns its end
+                "span_lines": sum(c["end_line"] - c["start_line"] + 1 for c in found),
+                "median_ms": ms,
+            }
+            if label in spans:
+                report[label]["spans_ms"] = median_ms(spans[label], rounds)[1]
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark codex-scanner component extraction")
+    parser.add_argument("--components", type=int, default=2000, help="component groups per generated file")
+    parser.add_argument("--table-rows", type=int, default=40, help="data rows between Python definitions")
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--baseline", help="git revision whose scripts/python/codex-scanner.py to compare against")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    tsx, py = build_sources(args.components, args.table_rows)
+    report = {
+        "tsx_lines": tsx.count("\n"),
+        "python_lines": py.count("\n"),
+        "current": time_extraction(SCRIPT, tsx, py, args.rounds),
+    }
+
+    if args.baseline:
+        source = subprocess.run(
+            ["git", "show", f"{args.baseline}:scripts/python/codex-scanner.py"],
+            cwd=SCRIPT.parent, capture_output=True, text=True,
+        )
+        if source.returncode != 0:
+            print(f"❌ {source.stderr.strip()}", file=sys.stderr)
+            return 2
+        with tempfile.TemporaryDirectory() as tmp:
+            baseline = Path(tmp) / "codex-scanner.py"
+            baseline.write_text(source.stdout, encoding="utf-8")
+            report["baseline"] = time_extraction(baseline, tsx, py, args.rounds)
+            report["baseline"]["script"] = f"{args.baseline}:scripts/python/codex-scanner.py"
+        for label in ("tsx", "python"):
+            current = report["current"][label]["median_ms"]
+            report[f"{label}_speedup"] = round(report["baseline"][label]["median_ms"] / current, 1) if current else None
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + "\n", encoding="utf-8")
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,16 +4,311 @@ BlackRoad Code Library Scanner
 Scans 66 repos and extracts reusable components into searchable library.
 """
 
+import ast
 import os
 import sqlite3
 import json
 import hashlib
+from bisect import bisect_left
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from datetime import datetime
-from typing import List, Dict, Optional
-import subprocess
+from typing import Iterator, List, Dict, Optional, Tuple
 import re
 
+import codex_minhash
+import codex_quality
+
+# Source files to scan, by suffix
+LANGUAGES = {
+    '.ts': 'typescript', '.tsx': 'typescript',
+    '.js': 'javascript', '.jsx': 'javascript',
+    '.py': 'python',
+    '.go': 'go',
+    '.rs': 'rust',
+}
+
+# Languages with an extractor; files of any other language are not read
+EXTRACTORS = {
+    'typescript': 'extract_typescript_components',
+    'javascript': 'extract_typescript_components',
+    'python': 'extract_python_components',
+    'go': 'extract_go_components',
+    'rust': 'extract_rust_components',
+}
+
+# Bump when extraction changes; the manifest is then cleared so every file
+# is extracted again on the next scan
+EXTRACTOR_VERSION = 6
+
+# Directories never descended into
+SKIP_DIRS = {'node_modules', 'dist', 'build', '.next', 'venv', '__pycache__', '.git'}
+
+# Below this many changed files a repo is extracted in-process
+POOL_MIN_FILES = 32
+
+# Top-level TS/JS component starts, in priority order: React components,
+# exported functions, exported classes
+JS_COMPONENT = re.compile(
+    r'^(?:(?:export\s+)?(?:const|function)\s+(?P<react>[A-Z][a-zA-Z0-9]*)\s*[=:]'
+    r'|export\s+(?:async\s+)?function\s+(?P<function>[a-zA-Z_][a-zA-Z0-9_]*)'
+    r'|export\s+class\s+(?P<cls>[A-Z][a-zA-Z0-9]*))',
+    re.M,
+)
+JS_TOKEN = re.compile(r'//|/\*|[{}()\[\];"\'`/]')
+JS_STRING = {
+    '"': re.compile(r'(?:[^"\\\n]|\\[\s\S])*"?'),
+    "'": re.compile(r"(?:[^'\\\n]|\\[\s\S])*'?"),
+}
+JS_TEMPLATE = re.compile(r'(?:[^`\\$]|\\[\s\S]|\$(?!\{))*')
+JS_REGEX = re.compile(r'(?:[^/\\\[\n]|\\.|\[(?:[^\]\\\n]|\\.)*\])*/?')
+# A '/' after one of these starts a regex literal rather than a division
+JS_REGEX_AFTER = set('(,=:[!&|?{};+-*%<>~^')
+# After a closing '}' these mean the declaration goes on (type literals, chains)
+JS_CONTINUES = set('{>|&[,).=?:')
+
+# Top-level Go declarations: exported functions, methods and types
+GO_COMPONENT = re.compile(
+    r'^func\s+(?:\(\s*(?:\w+\s+)?\*?(?P<receiver>\w+)[^)]*\)\s*)?(?P<func>[A-Z]\w*)'
+    r'|^type\s+(?P<type>[A-Z]\w*)(?:\[[^\]\n]*\])?\s+(?P<kind>struct|interface)?',
+    re.M,
+)
+GO_TOKEN = re.compile(r'//|/\*|[{}()\[\];"`\'\n]')
+
+# Top-level Rust items: public fn/struct/enum/trait, and every impl block.
+# pub(crate), pub(super) and pub(in ...) are not public API and are left out
+RUST_COMPONENT = re.compile(
+    r'^pub\s+(?:(?:const|async|unsafe|extern\s+"[^"\n]*")\s+)*'
+    r'(?P<kind>fn|struct|enum|trait)\s+(?P<name>[A-Za-z_]\w*)'
+    r'|^(?:unsafe\s+)?impl\b(?:\s*<[^{;]*?>)?\s+(?:(?P<trait>[\w:]+)(?:<[^{;]*?>)?\s+for\s+)?(?P<impl>[\w:]+)',
+    re.M,
+)
+RUST_TOKEN = re.compile(r'//|/\*|\bb?r#*"|[{}()\[\];"\']')
+# Unlike Go and JS, a Rust string literal may run over several lines
+RUST_STRING = re.compile(r'(?:[^"\\]|\\[\s\S])*"?')
+CHAR_LITERAL = re.compile(r"'(?:\\(?:u\{[0-9a-fA-F]+\}|x[0-9a-fA-F]{2}|[0-7]{3}|.)|[^\\'\n])'")
+
+# Column-0 Python definitions, for files ast cannot parse
+PY_DEFINITION = re.compile(r'^(?:async\s+def|def|class)\s')
+PY_COMPONENT = re.compile(
+    r'^(?:async\s+)?def\s+(?P<function>[a-zA-Z_][a-zA-Z0-9_]*)\s*\('
+    r'|^class\s+(?P<cls>[A-Z][a-zA-Z0-9_]*)\s*[:(]'
+)
+
+
+def js_component_spans(content: str, jsx: bool = False) -> List[Tuple[str, str, int, int]]:
+    """(name, kind, start_line, end_line) of top-level TS/JS components in one pass.
+
+    A single tokenizer walks the file, skipping strings, comments, regex
+    and template literals (including nested ${...}) and keeping a stack of
+    open brackets. A component opened at depth d ends at the '}' or ';'
+    that brings the stack back to d, or where the next component starts.
+    Starts inside strings, comments or templates are ignored. With `jsx`,
+    the '/' of a closing or self-closing tag ('</div>', '<br />') is not a
+    regex start.
+    """
+    newlines = [m.start() for m in re.finditer('\n', content)]
+
+    def line_of(pos):
+        return bisect_left(newlines, pos) + 1
+
+    candidates = list(JS_COMPONENT.finditer(content))
+    spans = []
+    active = None       # [name, kind, start_line, base_depth, opened]
+    active_start = 0
+    stack = []
+    in_template = 0     # ${...} frames on the stack
+    last_pos = 0        # end of the last code token
+    k = 0
+    pos = 0
+    n = len(content)
+
+    def close(end_pos):
+        nonlocal active
+        spans.append((active[0], active[1], active[2], max(active[2], line_of(end_pos))))
+        active = None
+
+    def skip_template(at):
+        """Skip template text from at; returns the new position"""
+        nonlocal in_template
+        at = JS_TEMPLATE.match(content, at).end()
+        if content.startswith('${', at):
+            stack.append('${')
+            in_template += 1
+            return at + 2
+        return at + 1
+
+    while True:
+        m = JS_TOKEN.search(content, pos)
+        p = m.start() if m else n
+        # Component starts in the code between the last token and this one
+        while k < len(candidates) and candidates[k].start() < p:
+            c = candidates[k]
+            k += 1
+            if in_template:
+                continue
+            if active:
+                close(max(last_pos - 1, active_start))
+            kind = c.lastgroup
+            active = [c.group(kind), kind, line_of(c.start()), len(stack), False]
+            active_start = c.start()
+        if not m:
+            break
+
+        tok = m.group()
+        pos = m.end()
+        if tok in '{([':
+            stack.append(tok)
+            if active and active[3] == len(stack) - 1:
+                active[4] = True
+        elif tok in '})]':
+            if stack and stack.pop() == '${':
+                in_template -= 1
+                pos = skip_template(pos)
+            elif tok == '}' and active and active[4] and active[3] == len(stack):
+                after = pos
+                while after < n and content[after] in ' \t':
+                    after += 1
+                if after >= n or content[after] not in JS_CONTINUES:
+                    close(p)
+        elif tok == ';':
+            if active and active[3] == len(stack):
+                close(p)
+        elif tok in JS_STRING:
+            pos = JS_STRING[tok].match(content, pos).end()
+        elif tok == '`':
+            pos = skip_template(pos)
+        elif tok == '//':
+            pos = content.find('\n', pos)
+            pos = n if pos < 0 else pos
+            continue
+        elif tok == '/*':
+            pos = content.find('*/', pos)
+            pos = n if pos < 0 else pos + 2
+            continue
+        elif tok == '/':
+            before = p - 1
+            while before >= 0 and content[before] in ' \t\r\n':
+                before -= 1
+            tag = jsx and (content[p - 1:p] == '<' or content[pos:pos + 1] == '>')
+            if not tag and (before < 0 or content[before] in JS_REGEX_AFTER):
+                pos = JS_REGEX.match(content, pos).end()
+        last_pos = pos
+        # Starts inside whatever was just skipped are not components
+        while k < len(candidates) and candidates[k].start() < pos:
+            k += 1
+
+    if active:
+        close(max(last_pos - 1, active_start))
+    return spans
+
+
+def block_component_spans(content: str, candidates: list, token: re.Pattern, string: re.Pattern,
+                          newline_ends: bool) -> List[Tuple[re.Match, int, int]]:
+    """(match, start_line, end_line) for Go/Rust declarations in one pass.
+
+    Same approach as js_component_spans: one tokenizer skipping strings,
+    raw strings, char literals and comments, with a bracket stack. A
+    declaration ends at the '}' or ';' that returns to its depth; in Go
+    (newline_ends) also at the first newline with its brackets closed.
+    `string` matches the rest of a "..." literal after its opening quote.
+    Rust lifetimes ('a) are told apart from char literals.
+    """
+    newlines = [m.start() for m in re.finditer('\n', content)]
+
+    def line_of(pos):
+        return bisect_left(newlines, pos) + 1
+
+    spans = []
+    active = None   # [match, start_line, base_depth]
+    depth = 0
+    k = 0
+    pos = 0
+    n = len(content)
+
+    def close(end_pos):
+        nonlocal active
+        spans.append((active[0], active[1], max(active[1], line_of(end_pos))))
+        active = None
+
+    while True:
+        m = token.search(content, pos)
+        p = m.start() if m else n
+        while k < len(candidates) and candidates[k].start() < p:
+            if active:
+                close(candidates[k].start() - 1)
+            active = [candidates[k], line_of(candidates[k].start()), depth]
+            k += 1
+        if not m:
+            break
+
+        tok = m.group()
+        pos = m.end()
+        if tok in '{([':
+            depth += 1
+        elif tok in '})]':
+            depth = max(0, depth - 1)
+            if tok == '}' and active and depth == active[2]:
+                close(p)
+        elif tok == ';':
+            if active and depth == active[2]:
+                close(p)
+        elif tok == '\n':
+            if newline_ends and active and depth == active[2]:
+                close(p - 1)
+        elif tok == '"':
+            pos = string.match(content, pos).end()
+        elif tok == '`':
+            end = content.find('`', pos)
+            pos = n if end < 0 else end + 1
+        elif tok == "'":
+            char = CHAR_LITERAL.match(content, p)
+            if char:
+                pos = char.end()
+        elif tok == '//':
+            end = content.find('\n', pos)
+            pos = n if end < 0 else end
+        elif tok == '/*':
+            end = content.find('*/', pos)
+            pos = n if end < 0 else end + 2
+        else:
+            # Rust raw string: r"..." or r#"..."# with any number of #
+            closing = '"' + '#' * tok.count('#')
+            end = content.find(closing, pos)
+            pos = n if end < 0 else end + len(closing)
+        while k < len(candidates) and candidates[k].start() < pos:
+            k += 1
+
+    if active:
+        close(n - 1)
+    return spans
+
+
+def python_component_spans(content: str, lines: List[str]) -> List[Tuple[str, str, int, int]]:
+    """(name, kind, start_line, end_line) of top-level Python functions and classes.
+
+    Spans come from the ast; files it cannot parse fall back to one pass
+    over column-0 definitions, each ending where the next begins.
+    """
+    try:
+        body = ast.parse(content).body
+    except (SyntaxError, ValueError):
+        starts = [i for i, line in enumerate(lines) if PY_DEFINITION.match(line)]
+        spans = []
+        for idx, i in enumerate(starts):
+            m = PY_COMPONENT.match(lines[i])
+            if m:
+                end = starts[idx + 1] if idx + 1 < len(starts) else len(lines)
+                spans.append((m.group(m.lastgroup), m.lastgroup, i + 1, end))
+        return spans
+    spans = []
+    for node in body:
+        if isinstance(node, ast.ClassDef) and node.name[:1].isupper():
+            spans.append((node.name, 'cls', node.lineno, node.end_lineno))
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            spans.append((node.name, 'function', node.lineno, node.end_lineno))
+    return spans
+
 class ComponentScanner:
     """Scans repositories and extracts reusable components."""
 
@@ -24,11 +319,22 @@ class ComponentScanner:
         self.db_path = self.library_path / "index" / "components.db"
         self.db_path.parent.mkdir(parents=True, exist_ok=True)
 
+        # One connection for the whole scan; each repo is saved in one transaction
+        self.conn = sqlite3.connect(self.db_path)
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.execute("PRAGMA synchronous = NORMAL")
+
         self.init_database()
 
+    def __getstate__(self):
+        # Workers get a copy of the scanner for extraction, without the connection
+        state = self.__dict__.copy()
+        state.pop('conn', None)
+        return state
+
     def init_database(self):
         """Initialize SQLite database for components."""
-        conn = sqlite3.connect(self.db_path)
+        conn = self.conn
         cursor = conn.cursor()
 
         cursor.execute("""
@@ -74,40 +380,147 @@ class ComponentScanner:
             )
         """)
 
-        conn.commit()
-        conn.close()
+        # Per-file manifest: files whose mtime and size (or content hash)
+        # are unchanged since the last scan are not extracted again
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS files (
+                repo TEXT NOT NULL,
+                path TEXT NOT NULL,
+                language TEXT,
+                mtime_ns INT,
+                size INT,
+                sha256 TEXT,
+                PRIMARY KEY (repo, path)
+            )
+        """)
 
-    def scan_repository(self, repo_path: str) -> List[Dict]:
-        """Scan a single repository for components."""
-        repo_path = Path(repo_path).expanduser()
-        repo_name = repo_path.name
+        # Lookups used by the search tools, and the per-file replace on rescans
+        cursor.executescript("""
+            CREATE INDEX IF NOT EXISTS idx_components_repo ON components(repo, file_path);
+            CREATE INDEX IF NOT EXISTS idx_components_language ON components(language);
+            CREATE INDEX IF NOT EXISTS idx_components_type ON components(type);
+            CREATE INDEX IF NOT EXISTS idx_components_code_hash ON components(code_hash);
+            CREATE INDEX IF NOT EXISTS idx_components_name ON components(name);
+        """)
 
-        print(f"📂 Scanning {repo_name}...")
+        # MinHash signatures and LSH buckets for near-duplicate queries
+        cursor.executescript(codex_minhash.SCHEMA)
 
-        components = []
+        # Quality signals behind quality_score, and identifiers used by tests
+        cursor.executescript(codex_quality.SCHEMA)
 
-        # File patterns to scan
-        patterns = {
-            'typescript': ['**/*.ts', '**/*.tsx'],
-            'javascript': ['**/*.js', '**/*.jsx'],
-            'python': ['**/*.py'],
-            'go': ['**/*.go'],
-            'rust': ['**/*.rs'],
-        }
+        if conn.execute("PRAGMA user_version").fetchone()[0] < EXTRACTOR_VERSION:
+            cursor.execute("DELETE FROM files")
+            # Signatures from an older extractor do not compare with new ones
+            cursor.execute("DELETE FROM component_fingerprints")
+            cursor.execute("DELETE FROM component_lsh")
+            cursor.execute(f"PRAGMA user_version = {EXTRACTOR_VERSION}")
 
-        for lang, pattern_list in patterns.items():
-            for pattern in pattern_list:
-                for file_path in repo_path.glob(pattern):
-                    # Skip node_modules, dist, build, etc.
-                    if any(x in file_path.parts for x in ['node_modules', 'dist', 'build', '.next', 'venv', '__pycache__']):
-                        continue
+        conn.commit()
 
-                    components.extend(self.extract_components_from_file(
-                        file_path, repo_name, lang
-                    ))
+    def walk_source_files(self, repo_path: Path) -> Iterator[Tuple[str, str, os.stat_result]]:
+        """Yield (path, language, stat) for every source file, in one pass."""
+        stack = [str(repo_path)]
+        while stack:
+            try:
+                with os.scandir(stack.pop()) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            if entry.name not in SKIP_DIRS:
+                                stack.append(entry.path)
+                            continue
+                        language = LANGUAGES.get(os.path.splitext(entry.name)[1])
+                        if language in EXTRACTORS and entry.is_file():
+                            yield entry.path, language, entry.stat()
+            except OSError as e:
+                print(f"  ⚠️  Could not list {e.filename}: {e.strerror}")
+
+    def load_manifest(self, repo_name: str) -> Dict[str, Tuple[int, int, str]]:
+        """path -> (mtime_ns, size, sha256) from the last scan of a repo."""
+        rows = self.conn.execute(
+            "SELECT path, mtime_ns, size, sha256 FROM files WHERE repo = ?", (repo_name,)
+        ).fetchall()
+        return {path: (mtime_ns, size, sha256) for path, mtime_ns, size, sha256 in rows}
+
+    def save_manifest(self, repo_name: str, entries: List[Tuple], removed: List[str]):
+        """Record scanned files and forget the ones no longer in the repo."""
+        self.conn.executemany("""
+            INSERT OR REPLACE INTO files (repo, path, language, mtime_ns, size, sha256)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, entries)
+        self.conn.executemany("DELETE FROM files WHERE repo = ? AND path = ?",
+                              [(repo_name, path) for path in removed])
+
+    def extract_file_task(self, task: Tuple[str, str, str, Optional[str]]):
+        """Worker: hash a file and extract it unless the hash is unchanged.
+
+        Returns (path, sha256, components, test_names); components is None
+        when the content matches the manifest, and sha256 is None if
+        unreadable. test_names lists the identifiers of an extracted test file.
+        """
+        path, repo, language, known_hash = task
+        try:
+            data = Path(path).read_bytes()
+        except OSError as e:
+            print(f"  ⚠️  Could not read {path}: {e}")
+            return path, None, [], None
+        digest = hashlib.sha256(data).hexdigest()
+        if digest == known_hash:
+            return path, digest, None, None
+        content = data.decode('utf-8', errors='ignore')
+        test_names = codex_quality.test_identifiers(content) if codex_quality.is_test_file(path) else None
+        return path, digest, self.extract_components_from_content(content, Path(path), repo, language), test_names
+
+    def scan_repository(self, repo_path: str, pool: Optional[ProcessPoolExecutor] = None) -> List[Dict]:
+        """Scan a single repository, extracting only files changed since the last scan.
+
+        Saves the new components and returns them.
+        """
+        repo_path = Path(repo_path).expanduser()
+        repo_name = repo_path.name
 
-        # Update repository metadata
-        self.update_repo_metadata(repo_name, str(repo_path), len(components))
+        manifest = self.load_manifest(repo_name)
+        files = list(self.walk_source_files(repo_path))
+        tasks = []
+        stats = {}
+        for path, language, st in files:
+            stats[path] = (language, st.st_mtime_ns, st.st_size)
+            known = manifest.get(path)
+            if known and known[:2] == (st.st_mtime_ns, st.st_size):
+                continue
+            tasks.append((path, repo_name, language, known[2] if known else None))
+
+        removed = [path for path in manifest if path not in stats]
+        gone = f", {len(removed)} removed" if removed else ""
+        print(f"📂 Scanning {repo_name}... {len(files)} files, {len(tasks)} changed{gone}")
+
+        if pool and len(tasks) >= POOL_MIN_FILES:
+            results = pool.map(self.extract_file_task, tasks, chunksize=16)
+        else:
+            results = map(self.extract_file_task, tasks)
+
+        components = []
+        scanned = []
+        extracted = []
+        test_names = []
+        for path, digest, file_components, names in results:
+            if digest is None:
+                continue
+            if file_components is not None:
+                components.extend(file_components)
+                extracted.append(path)
+            if names is not None:
+                test_names.append((path, names))
+            language, mtime_ns, size = stats[path]
+            scanned.append((repo_name, path, language, mtime_ns, size, digest))
+
+        with self.conn:
+            self.save_components(components)
+            self.prune_components(repo_name, extracted + removed, components)
+            codex_quality.save_test_names(
+                self.conn, repo_name, [p for p in extracted + removed if codex_quality.is_test_file(p)], test_names)
+            self.save_manifest(repo_name, scanned, removed)
+            self.update_repo_metadata(repo_name, str(repo_path), len(files))
 
         return components
 
@@ -119,79 +532,39 @@ class ComponentScanner:
             print(f"  ⚠️  Could not read {file_path}: {e}")
             return []
 
-        components = []
-
-        # Extract different types based on language
-        if language in ['typescript', 'javascript']:
-            components.extend(self.extract_typescript_components(content, file_path, repo))
-        elif language == 'python':
-            components.extend(self.extract_python_components(content, file_path, repo))
+        return self.extract_components_from_content(content, file_path, repo, language)
 
-        return components
+    def extract_components_from_content(self, content: str, file_path: Path, repo: str, language: str) -> List[Dict]:
+        """Extract components from already-read file content."""
+        extractor = EXTRACTORS.get(language)
+        if not extractor:
+            return []
+        return getattr(self, extractor)(content, file_path, repo)
 
     def extract_typescript_components(self, content: str, file_path: Path, repo: str) -> List[Dict]:
         """Extract React components, functions, classes from TypeScript/JavaScript."""
         components = []
         lines = content.split('\n')
+        kinds = {
+            'react': 'react-component' if 'tsx' in file_path.suffix else 'function',
+            'function': 'function',
+            'cls': 'class',
+        }
 
-        # Pattern 1: React components (function or const)
-        react_component_pattern = r'^(?:export\s+)?(?:const|function)\s+([A-Z][a-zA-Z0-9]*)\s*[=:]'
-
-        # Pattern 2: Named exports (utilities, helpers)
-        export_function_pattern = r'^export\s+(?:async\s+)?function\s+([a-zA-Z_][a-zA-Z0-9_]*)'
-
-        # Pattern 3: Classes
-        class_pattern = r'^export\s+class\s+([A-Z][a-zA-Z0-9]*)'
-
-        for i, line in enumerate(lines):
-            component_name = None
-            component_type = None
-
-            # Check for React components
-            match = re.search(react_component_pattern, line)
-            if match:
-                component_name = match.group(1)
-                component_type = 'react-component' if 'tsx' in file_path.suffix else 'function'
-
-            # Check for exported functions
-            if not match:
-                match = re.search(export_function_pattern, line)
-                if match:
-                    component_name = match.group(1)
-                    component_type = 'function'
-
-            # Check for classes
-            if not match:
-                match = re.search(class_pattern, line)
-                if match:
-                    component_name = match.group(1)
-                    component_type = 'class'
-
-            if component_name:
-                # Find end of component (heuristic: next export or end of file)
-                end_line = i + 1
-                brace_count = 0
-                for j in range(i, len(lines)):
-                    if '{' in lines[j]:
-                        brace_count += lines[j].count('{')
-                    if '}' in lines[j]:
-                        brace_count -= lines[j].count('}')
-                    if brace_count == 0 and j > i:
-                        end_line = j + 1
-                        break
-
-                component = self.create_component_entry(
-                    name=component_name,
-                    type=component_type,
-                    language='typescript',
-                    repo=repo,
-                    file_path=str(file_path),
-                    start_line=i + 1,
-                    end_line=end_line,
-                    code_snippet='\n'.join(lines[i:min(i+20, end_line)])
-                )
-
-                components.append(component)
+        jsx = file_path.suffix in ('.tsx', '.jsx')
+        for name, kind, start_line, end_line in js_component_spans(content, jsx):
+            components.append(self.create_component_entry(
+                name=name,
+                type=kinds[kind],
+                language='typescript',
+                repo=repo,
+                file_path=str(file_path),
+                start_line=start_line,
+                end_line=end_line,
+                code_snippet='\n'.join(lines[start_line - 1:min(start_line + 19, end_line)]),
+                body='\n'.join(lines[start_line - 1:end_line]),
+                leading='\n'.join(lines[max(0, start_line - 4):start_line - 1])
+            ))
 
         return components
 
@@ -200,60 +573,91 @@ class ComponentScanner:
         components = []
         lines = content.split('\n')
 
-        # Pattern 1: Functions
-        function_pattern = r'^(?:async\s+)?def\s+([a-zA-Z_][a-zA-Z0-9_]*)\s*\('
-
-        # Pattern 2: Classes
-        class_pattern = r'^class\s+([A-Z][a-zA-Z0-9_]*)\s*[:(]'
-
-        for i, line in enumerate(lines):
-            component_name = None
-            component_type = None
-
-            # Check for functions
-            match = re.search(function_pattern, line)
-            if match:
-                component_name = match.group(1)
-                component_type = 'function'
-
-            # Check for classes
-            if not match:
-                match = re.search(class_pattern, line)
-                if match:
-                    component_name = match.group(1)
-                    component_type = 'class'
-
-            if component_name and not component_name.startswith('_'):  # Skip private
-                # Find end (heuristic: next def/class at same indentation or end of file)
-                indent = len(line) - len(line.lstrip())
-                end_line = len(lines)
-
-                for j in range(i + 1, len(lines)):
-                    current_indent = len(lines[j]) - len(lines[j].lstrip())
-                    if lines[j].strip() and current_indent <= indent:
-                        if lines[j].strip().startswith(('def ', 'class ', 'async def ')):
-                            end_line = j
-                            break
-
-                component = self.create_component_entry(
-                    name=component_name,
-                    type=component_type,
-                    language='python',
-                    repo=repo,
-                    file_path=str(file_path),
-                    start_line=i + 1,
-                    end_line=end_line,
-                    code_snippet='\n'.join(lines[i:min(i+20, end_line)])
-                )
-
-                components.append(component)
+        for name, kind, start_line, end_line in python_component_spans(content, lines):
+            if name.startswith('_'):  # Skip private
+                continue
+            components.append(self.create_component_entry(
+                name=name,
+                type='class' if kind == 'cls' else 'function',
+                language='python',
+                repo=repo,
+                file_path=str(file_path),
+                start_line=start_line,
+                end_line=end_line,
+                code_snippet='\n'.join(lines[start_line - 1:min(start_line + 19, end_line)]),
+                body='\n'.join(lines[start_line - 1:end_line]),
+                leading='\n'.join(lines[max(0, start_line - 4):start_line - 1])
+            ))
+
+        return components
+
+    def extract_go_components(self, content: str, file_path: Path, repo: str) -> List[Dict]:
+        """Extract exported functions, methods, structs and interfaces from Go."""
+        components = []
+        lines = content.split('\n')
+        candidates = list(GO_COMPONENT.finditer(content))
+
+        for match, start_line, end_line in block_component_spans(content, candidates, GO_TOKEN, JS_STRING['"'], True):
+            if match.group('func'):
+                receiver = match.group('receiver')
+                name = f"{receiver}.{match.group('func')}" if receiver else match.group('func')
+                kind = 'method' if receiver else 'function'
+            else:
+                name = match.group('type')
+                kind = match.group('kind') or 'type'
+            components.append(self.create_component_entry(
+                name=name,
+                type=kind,
+                language='go',
+                repo=repo,
+                file_path=str(file_path),
+                start_line=start_line,
+                end_line=end_line,
+                code_snippet='\n'.join(lines[start_line - 1:min(start_line + 19, end_line)]),
+                body='\n'.join(lines[start_line - 1:end_line]),
+                leading='\n'.join(lines[max(0, start_line - 4):start_line - 1])
+            ))
+
+        return components
+
+    def extract_rust_components(self, content: str, file_path: Path, repo: str) -> List[Dict]:
+        """Extract public fns, structs, enums, traits and impl blocks from Rust."""
+        components = []
+        lines = content.split('\n')
+        candidates = list(RUST_COMPONENT.finditer(content))
+
+        for match, start_line, end_line in block_component_spans(content, candidates, RUST_TOKEN, RUST_STRING, False):
+            if match.group('impl'):
+                trait = match.group('trait')
+                name = f"{trait} for {match.group('impl')}" if trait else match.group('impl')
+                kind = 'impl'
+            else:
+                name = match.group('name')
+                kind = 'function' if match.group('kind') == 'fn' else match.group('kind')
+            components.append(self.create_component_entry(
+                name=name,
+                type=kind,
+                language='rust',
+                repo=repo,
+                file_path=str(file_path),
+                start_line=start_line,
+                end_line=end_line,
+                code_snippet='\n'.join(lines[start_line - 1:min(start_line + 19, end_line)]),
+                body='\n'.join(lines[start_line - 1:end_line]),
+                leading='\n'.join(lines[max(0, start_line - 4):start_line - 1])
+            ))
 
         return components
 
     def create_component_entry(self, name: str, type: str, language: str,
                               repo: str, file_path: str, start_line: int,
-                              end_line: int, code_snippet: str) -> Dict:
-        """Create a component entry with metadata."""
+                              end_line: int, code_snippet: str, body: Optional[str] = None,
+                              leading: str = '') -> Dict:
+        """Create a component entry with metadata.
+
+        body is the full source (fingerprint and quality signals) and
+        leading the few lines above it (doc comments).
+        """
 
         # Generate unique ID
         component_id = hashlib.sha256(
@@ -269,6 +673,11 @@ class ComponentScanner:
         # Auto-tag based on patterns
         tags = self.auto_tag_component(name, type, code_snippet, file_path)
 
+        # Static quality signals; reuse, test references and usage are
+        # added by codex_quality.rescore once the scan is saved
+        tokens = codex_minhash.normalise(body if body is not None else code_snippet, language)
+        signals = codex_quality.static_signals(name, language, tokens, leading, start_line, end_line)
+
         return {
             'id': component_id,
             'name': name,
@@ -285,7 +694,9 @@ class ComponentScanner:
             'code_hash': code_hash,
             'code_snippet': code_snippet[:500],  # First 500 chars
             'description': self.generate_description(name, type, tags),
-            'quality_score': 5.0  # Default, will be calculated later
+            'quality_score': codex_quality.score(signals['lines'], signals['complexity'], signals['documented']),
+            'fingerprint': codex_minhash.fingerprint_tokens(tokens),
+            'signals': signals,
         }
 
     def extract_dependencies(self, code: str, language: str) -> List[str]:
@@ -371,47 +782,68 @@ class ComponentScanner:
         return f"{type.title()}: {name} ({', '.join(tags[:3])})"
 
     def save_components(self, components: List[Dict]):
-        """Save components to database."""
+        """Upsert components in the current transaction.
+
+        Components that already exist keep their created_at, usage_count
+        and last_used_at.
+        """
         if not components:
             return
 
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-
-        for comp in components:
-            cursor.execute("""
-                INSERT OR REPLACE INTO components (
-                    id, name, type, language, framework, repo, file_path,
-                    start_line, end_line, created_at, dependencies, tags,
-                    code_hash, code_snippet, description, quality_score
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                comp['id'], comp['name'], comp['type'], comp['language'],
-                comp['framework'], comp['repo'], comp['file_path'],
-                comp['start_line'], comp['end_line'], comp['created_at'],
-                comp['dependencies'], comp['tags'], comp['code_hash'],
-                comp['code_snippet'], comp['description'], comp['quality_score']
-            ))
-
-        conn.commit()
-        conn.close()
+        self.conn.executemany("""
+            INSERT INTO components (
+                id, name, type, language, framework, repo, file_path,
+                start_line, end_line, created_at, dependencies, tags,
+                code_hash, code_snippet, description, quality_score
+            ) VALUES (
+                :id, :name, :type, :language, :framework, :repo, :file_path,
+                :start_line, :end_line, :created_at, :dependencies, :tags,
+                :code_hash, :code_snippet, :description, :quality_score
+            )
+            ON CONFLICT(id) DO UPDATE SET
+                name = excluded.name, type = excluded.type, language = excluded.language,
+                framework = excluded.framework, end_line = excluded.end_line,
+                dependencies = excluded.dependencies, tags = excluded.tags,
+                code_hash = excluded.code_hash, code_snippet = excluded.code_snippet,
+                description = excluded.description, quality_score = excluded.quality_score
+        """, components)
+        codex_minhash.save_fingerprints(self.conn, [(c['id'], c['fingerprint']) for c in components])
+        codex_quality.save_signals(self.conn, [(c['id'], c['signals']) for c in components])
 
         print(f"  ✅ Saved {len(components)} components")
 
-    def update_repo_metadata(self, repo_name: str, repo_path: str, component_count: int):
-        """Update repository metadata."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-
+    def prune_components(self, repo_name: str, paths: List[str], components: List[Dict]):
+        """Delete components of re-extracted or removed files that were not found again."""
+        if not paths:
+            return
+        cursor = self.conn.cursor()
+        cursor.execute("CREATE TEMP TABLE IF NOT EXISTS scan_paths (path TEXT PRIMARY KEY)")
+        cursor.execute("CREATE TEMP TABLE IF NOT EXISTS scan_ids (id TEXT PRIMARY KEY)")
+        cursor.execute("DELETE FROM scan_paths")
+        cursor.execute("DELETE FROM scan_ids")
+        cursor.executemany("INSERT OR IGNORE INTO scan_paths VALUES (?)", [(p,) for p in paths])
+        cursor.executemany("INSERT OR IGNORE INTO scan_ids VALUES (?)", [(c['id'],) for c in components])
         cursor.execute("""
-            INSERT OR REPLACE INTO repositories (name, path, last_scanned, component_count)
-            VALUES (?, ?, ?, ?)
-        """, (repo_name, repo_path, datetime.now().isoformat(), component_count))
-
-        conn.commit()
-        conn.close()
-
-    def scan_all_repos(self, repos_base_path: str = "~/projects"):
+            DELETE FROM components
+            WHERE repo = ? AND file_path IN (SELECT path FROM scan_paths)
+              AND id NOT IN (SELECT id FROM scan_ids)
+        """, (repo_name,))
+        if cursor.rowcount > 0:
+            print(f"  🗑️  Removed {cursor.rowcount} stale components")
+
+    def update_repo_metadata(self, repo_name: str, repo_path: str, total_files: int):
+        """Update repository metadata (component count covers unchanged files too)."""
+        self.conn.execute("""
+            INSERT OR REPLACE INTO repositories (name, path, last_scanned, component_count, total_files)
+            VALUES (?, ?, ?, (SELECT COUNT(*) FROM components WHERE repo = ?), ?)
+        """, (repo_name, repo_path, datetime.now().isoformat(), repo_name, total_files))
+
+    def rescore(self):
+        """Recompute quality scores from the saved signals, in one transaction."""
+        with self.conn:
+            codex_quality.rescore(self.conn)
+
+    def scan_all_repos(self, repos_base_path: str = "~/projects", workers: Optional[int] = None):
         """Scan all repositories in a base directory."""
         repos_path = Path(repos_base_path).expanduser()
 
@@ -420,15 +852,16 @@ class ComponentScanner:
         total_components = 0
         repo_count = 0
 
-        for repo_dir in repos_path.iterdir():
-            if repo_dir.is_dir() and not repo_dir.name.startswith('.'):
-                components = self.scan_repository(repo_dir)
-                self.save_components(components)
+        repo_dirs = sorted(d for d in repos_path.iterdir() if d.is_dir() and not d.name.startswith('.'))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for repo_dir in repo_dirs:
+                components = self.scan_repository(repo_dir, pool)
                 total_components += len(components)
                 repo_count += 1
+        self.rescore()
 
         print(f"\n✅ Scanned {repo_count} repositories")
-        print(f"📦 Found {total_components} components")
+        print(f"📦 Found {total_components} new or changed components")
         print(f"💾 Library saved to: {self.library_path}")
 
         return total_components
@@ -441,16 +874,18 @@ def main():
     parser.add_argument('--repos', default='~/projects', help='Path to repositories')
     parser.add_argument('--library', default='~/blackroad-code-library', help='Library output path')
     parser.add_argument('--repo', help='Scan single repository')
+    parser.add_argument('--workers', type=int, help='Extraction processes (default: one per CPU)')
 
     args = parser.parse_args()
 
     scanner = ComponentScanner(args.library)
 
     if args.repo:
-        components = scanner.scan_repository(args.repo)
-        scanner.save_components(components)
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            scanner.scan_repository(args.repo, pool)
+        scanner.rescore()
     else:
-        scanner.scan_all_repos(args.repos)
+        scanner.scan_all_repos(args.repos, args.workers)
 
 if __name__ == '__main__':
     main()
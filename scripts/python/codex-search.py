@@ -11,6 +11,11 @@ from typing import List, Dict, Optional
 from datetime import datetime, timedelta
 import re
 
+# Must match codex_minhash.DUPLICATE_THRESHOLD; the MinHash and quality
+# helpers are imported where used so a standalone copy of this script
+# (see scripts/setup) still searches without them
+DUPLICATE_THRESHOLD = 0.8
+
 class LibrarySearch:
     """Search interface for the code library."""
 
@@ -100,10 +105,15 @@ class LibrarySearch:
 
         cursor.execute("SELECT * FROM components WHERE id = ?", (component_id,))
         row = cursor.fetchone()
+        try:
+            import codex_quality
+            signals = codex_quality.load_signals(conn, component_id) if row else None
+        except ImportError:
+            signals = None
 
         conn.close()
 
-        return dict(row) if row else None
+        return {**dict(row), 'signals': signals} if row else None
 
     def get_similar_components(self, component_id: str, limit: int = 5) -> List[Dict]:
         """
@@ -145,6 +155,43 @@ class LibrarySearch:
 
         return [dict(row) for row in rows]
 
+    def find_duplicates(self, component_id: str, threshold: float = DUPLICATE_THRESHOLD,
+                        limit: int = 10) -> List[Dict]:
+        """Near-duplicate copies of a component (MinHash LSH), most similar first."""
+        import codex_minhash
+
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+
+        matches = codex_minhash.find_duplicates(conn, component_id, threshold, limit)
+        results = []
+        for match_id, score in matches:
+            row = conn.execute("SELECT * FROM components WHERE id = ?", (match_id,)).fetchone()
+            if row:
+                results.append({**dict(row), 'similarity': score})
+
+        conn.close()
+        return results
+
+    def cluster_duplicates(self, threshold: float = DUPLICATE_THRESHOLD,
+                           min_size: int = 2, limit: int = 10) -> List[List[Dict]]:
+        """Groups of near-duplicate components across the library, largest first."""
+        import codex_minhash
+
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+
+        clusters = []
+        for members in codex_minhash.cluster(conn, threshold, min_size)[:limit]:
+            placeholders = ','.join('?' * len(members))
+            rows = conn.execute(
+                f"SELECT * FROM components WHERE id IN ({placeholders}) ORDER BY repo, file_path", members
+            ).fetchall()
+            clusters.append([dict(row) for row in rows])
+
+        conn.close()
+        return clusters
+
     def get_stats(self) -> Dict:
         """Get library statistics."""
         conn = sqlite3.connect(self.db_path)
@@ -210,6 +257,13 @@ class LibrarySearch:
         """Format a component result for display."""
         tags = json.loads(component['tags'])
         deps = json.loads(component['dependencies'])
+        signals = component.get('signals')
+        quality = (
+            f"{signals['lines']} lines, complexity {signals['complexity']}, "
+            f"{'documented' if signals['documented'] else 'undocumented'}, "
+            f"{signals['test_refs']} test file(s), in {signals['reuse']} repo(s), "
+            f"used {component.get('usage_count') or 0}x"
+        ) if signals else 'not scored yet (rescan)'
 
         output = f"""
 {'='*70}
@@ -224,6 +278,7 @@ Location:    {component['file_path']}:{component['start_line']}-{component['end_
 
 Tags:        {', '.join(tags[:8])}
 Dependencies: {', '.join(deps[:5]) if deps else 'None'}
+Quality:     {quality}
 
 Description:
 {component['description']}
@@ -268,6 +323,10 @@ def main():
     parser.add_argument('--stats', action='store_true', help='Show library statistics')
     parser.add_argument('--id', help='Get specific component by ID')
     parser.add_argument('--similar', help='Find similar components to ID')
+    parser.add_argument('--duplicates', help='Find near-duplicate copies of component ID')
+    parser.add_argument('--clusters', action='store_true', help='List groups of near-duplicate components')
+    parser.add_argument('--threshold', type=float, default=DUPLICATE_THRESHOLD,
+                        help='Similarity for --duplicates/--clusters (0-1)')
 
     args = parser.parse_args()
 
@@ -314,6 +373,39 @@ def main():
         print(search.format_results(comps))
         return
 
+    if args.duplicates or args.clusters:
+        try:
+            import codex_minhash  # noqa: F401
+        except ImportError:
+            print("❌ --duplicates and --clusters need codex_minhash.py next to this script")
+            return
+
+    # Near-duplicates of one component
+    if args.duplicates:
+        comps = search.find_duplicates(args.duplicates, args.threshold, args.limit)
+        if not comps:
+            print(f"No near-duplicates of {args.duplicates} found.")
+            return
+        print(f"\n🧬 {len(comps)} near-duplicates of {args.duplicates}:")
+        for comp in comps:
+            print(f"  {comp['similarity']:.0%}  {comp['name']} ({comp['repo']}) {comp['file_path']}:{comp['start_line']}  [{comp['id']}]")
+        return
+
+    # Near-duplicate groups across the library
+    if args.clusters:
+        clusters = search.cluster_duplicates(args.threshold, limit=args.limit)
+        if not clusters:
+            print("No near-duplicate groups found.")
+            return
+        for i, members in enumerate(clusters, 1):
+            repos = len({comp['repo'] for comp in members})
+            print(f"\n🧬 Group {i}: {len(members)} copies of {members[0]['name']} across {repos} repos")
+            for comp in members[:10]:
+                print(f"  {comp['name']} ({comp['repo']}) {comp['file_path']}:{comp['start_line']}  [{comp['id']}]")
+            if len(members) > 10:
+                print(f"  ... {len(members) - 10} more")
+        return
+
     # Search
     if not args.query:
         parser.print_help()
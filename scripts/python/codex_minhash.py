@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+BlackRoad Code Library near-duplicate index
+MinHash fingerprints of components and an LSH banding table in
+components.db, shared by codex-scanner.py (writes) and codex-search.py
+(find_duplicates / cluster)
+"""
+
+import re
+import struct
+import zlib
+from itertools import accumulate
+from typing import Dict, List, Optional, Tuple
+
+# One-permutation MinHash: NUM_BINS minima from a single hash per shingle,
+# split into BANDS bands of ROWS values for LSH. Pairs sharing a band are
+# candidates (likely above ~0.5 similarity) and are then checked on the
+# full signature.
+NUM_BINS = 64
+BANDS = 16
+ROWS = NUM_BINS // BANDS
+SHINGLE = 4
+DUPLICATE_THRESHOLD = 0.8
+
+# A shingle's CRC-32 gives the bin (low 6 bits) and the value (the other
+# 26); densified bins add the borrowed distance above the value
+VALUE_BITS = 32 - (NUM_BINS.bit_length() - 1)
+EMPTY = 1 << VALUE_BITS
+SIGNATURE = struct.Struct(f'>{NUM_BINS}I')
+
+# Rows are keyed by the components rowid (stable across the scanner's
+# upserts), which keeps the LSH rows small integers
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS component_fingerprints (
+    component INTEGER PRIMARY KEY,
+    signature BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS component_lsh (
+    bucket INTEGER NOT NULL,
+    component INTEGER NOT NULL,
+    PRIMARY KEY (bucket, component)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_component_lsh_component ON component_lsh(component);
+CREATE TRIGGER IF NOT EXISTS components_fingerprint_delete AFTER DELETE ON components BEGIN
+    DELETE FROM component_fingerprints WHERE component = old.rowid;
+    DELETE FROM component_lsh WHERE component = old.rowid;
+END;
+"""
+
+TOKEN = re.compile(
+    r'"(?:[^"\\\n]|\\.)*"|\'(?:[^\'\\\n]|\\.)*\'|`[^`]*`'
+    r'|//[^\n]*|/\*.*?\*/|(?P<hash>#[^\n]*)'
+    r'|[A-Za-z_]\w*|\d[\w.]*|[^\s\w]',
+    re.S,
+)
+
+
+def normalise(code: str, language: str) -> List[str]:
+    """Tokens with comments dropped, literals collapsed and identifiers lowercased"""
+    tokens = []
+    for m in TOKEN.finditer(code):
+        tok = m.group()
+        first = tok[0]
+        if tok.startswith(('//', '/*')) or (m.lastgroup == 'hash' and language == 'python'):
+            continue
+        if m.lastgroup == 'hash':
+            tokens.append('#')
+        elif first in '"\'`':
+            tokens.append('S')
+        elif first.isdigit():
+            tokens.append('0')
+        else:
+            tokens.append(tok.lower())
+    return tokens
+
+
+def fingerprint_tokens(tokens: List[str]) -> Optional[bytes]:
+    """Packed MinHash signature of normalised tokens, or None if there are none
+
+    Each shingle is one slice of the space-joined tokens, hashed once with
+    CRC-32; the low bits pick a bin and the rest is the value kept if
+    smaller (repeated shingles cannot change a minimum, so no set is
+    built). Empty bins borrow the next filled bin's value, tagged with the
+    distance, so short components still compare.
+    """
+    if not tokens:
+        return None
+    text = ' '.join(tokens)
+    if len(tokens) < SHINGLE:
+        shingles = [text.encode()]
+    else:
+        ends = list(accumulate(len(tok) + 1 for tok in tokens))  # one past each token's space
+        shingles = [text[start:end - 1].encode() for start, end in zip([0] + ends, ends[SHINGLE - 1:])]
+    bins = [EMPTY] * NUM_BINS
+    mask = NUM_BINS - 1
+    shift = NUM_BINS.bit_length() - 1
+    for h in map(zlib.crc32, shingles):
+        value = h >> shift
+        if value < bins[h & mask]:
+            bins[h & mask] = value
+    if EMPTY in bins:
+        # Right to left, starting from the first filled bin one lap ahead
+        nearest = next(i for i, value in enumerate(bins) if value < EMPTY) + NUM_BINS
+        for i in range(NUM_BINS - 1, -1, -1):
+            if bins[i] < EMPTY:
+                nearest = i
+            else:
+                bins[i] = ((nearest - i) << VALUE_BITS) | bins[nearest & mask]
+    return SIGNATURE.pack(*bins)
+
+
+def band_buckets(signature: bytes) -> List[int]:
+    """One LSH bucket per band: the band number above the CRC-32 of its rows,
+    so bands never collide"""
+    width = SIGNATURE.size // BANDS
+    return [(band << 32) | zlib.crc32(signature[band * width:(band + 1) * width]) for band in range(BANDS)]
+
+
+def similarity(a: bytes, b: bytes) -> float:
+    """Estimated Jaccard similarity of two signatures"""
+    return sum(x == y for x, y in zip(SIGNATURE.unpack(a), SIGNATURE.unpack(b))) / NUM_BINS
+
+
+def component_keys(conn, component_ids: List[str]) -> Dict[str, int]:
+    """components rowid of each id"""
+    keys = {}
+    for i in range(0, len(component_ids), 500):
+        chunk = component_ids[i:i + 500]
+        keys.update(conn.execute(
+            f"SELECT id, rowid FROM components WHERE id IN ({','.join('?' * len(chunk))})", chunk))
+    return keys
+
+
+def component_ids(conn, keys: List[int]) -> Dict[int, str]:
+    """Component id of each rowid"""
+    ids = {}
+    for i in range(0, len(keys), 500):
+        chunk = keys[i:i + 500]
+        ids.update(conn.execute(
+            f"SELECT rowid, id FROM components WHERE rowid IN ({','.join('?' * len(chunk))})", chunk))
+    return ids
+
+
+def save_fingerprints(conn, fingerprints: List[Tuple[str, Optional[bytes]]]):
+    """Replace the signatures and LSH rows of saved components (caller commits)"""
+    keys = component_keys(conn, [cid for cid, _ in fingerprints])
+    rows = [(keys[cid], signature) for cid, signature in fingerprints if cid in keys]
+    conn.executemany("DELETE FROM component_lsh WHERE component = ?", [(key,) for key, _ in rows])
+    conn.executemany("DELETE FROM component_fingerprints WHERE component = ?",
+                     [(key,) for key, signature in rows if signature is None])
+    rows = [row for row in rows if row[1] is not None]
+    conn.executemany("INSERT OR REPLACE INTO component_fingerprints (component, signature) VALUES (?, ?)", rows)
+    conn.executemany("INSERT OR IGNORE INTO component_lsh (bucket, component) VALUES (?, ?)",
+                     [(bucket, key) for key, signature in rows for bucket in band_buckets(signature)])
+
+
+def find_duplicates(conn, component_id: str, threshold: float = DUPLICATE_THRESHOLD,
+                    limit: int = 20) -> List[Tuple[str, float]]:
+    """(id, similarity) of components near-identical to one, best first"""
+    row = conn.execute("""
+        SELECT f.component, f.signature FROM components c
+        JOIN component_fingerprints f ON f.component = c.rowid WHERE c.id = ?
+    """, (component_id,)).fetchone()
+    # Signatures of another size are from an older extractor; the next scan replaces them
+    if not row or len(row[1]) != SIGNATURE.size:
+        return []
+    key, mine = row
+    candidates = conn.execute("""
+        SELECT c.id, f.signature FROM component_fingerprints f JOIN components c ON c.rowid = f.component
+        WHERE f.component IN (
+            SELECT other.component FROM component_lsh own
+            JOIN component_lsh other ON other.bucket = own.bucket
+            WHERE own.component = ? AND other.component != ?
+        )
+    """, (key, key)).fetchall()
+    scored = [(cid, similarity(mine, signature)) for cid, signature in candidates
+              if len(signature) == SIGNATURE.size]
+    scored = [item for item in scored if item[1] >= threshold]
+    scored.sort(key=lambda item: (-item[1], item[0]))
+    return scored[:limit]
+
+
+def cluster(conn, threshold: float = DUPLICATE_THRESHOLD, min_size: int = 2) -> List[List[str]]:
+    """Groups of near-duplicate component ids, largest first
+
+    Only components sharing an LSH bucket are compared, each against the
+    bucket's first member, and joined with union-find, so the work grows
+    with the number of bucket members rather than the square of the library.
+    """
+    parent: Dict[int, int] = {}
+    signatures = {key: signature for key, signature in conn.execute(
+        "SELECT component, signature FROM component_fingerprints") if len(signature) == SIGNATURE.size}
+
+    def find(x):
+        root = x
+        while parent.get(root, root) != root:
+            root = parent[root]
+        while x != root:
+            parent[x], x = root, parent.get(x, x)
+        return root
+
+    buckets = conn.execute("""
+        SELECT group_concat(component) FROM component_lsh
+        GROUP BY bucket HAVING COUNT(*) > 1
+    """)
+    for (members,) in buckets:
+        keys = [key for key in map(int, members.split(',')) if key in signatures]
+        for other in keys[1:]:
+            a, b = find(keys[0]), find(other)
+            if a != b and similarity(signatures[keys[0]], signatures[other]) >= threshold:
+                parent[b] = a
+
+    groups: Dict[int, List[int]] = {}
+    for key in parent:
+        groups.setdefault(find(key), []).append(key)
+    for root, members in groups.items():
+        if root not in members:
+            members.append(root)
+    groups = {root: members for root, members in groups.items() if len(members) >= min_size}
+    ids = component_ids(conn, [key for members in groups.values() for key in members])
+    clusters = [sorted(ids[key] for key in members if key in ids) for members in groups.values()]
+    clusters.sort(key=lambda members: (-len(members), members[0]))
+    return clusters
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+BlackRoad Code Library quality scoring
+Static signals per component (computed by codex-scanner.py's extraction
+workers) and the library-wide signals joined in after each scan, combined
+into components.quality_score (0-10) and kept in component_quality so
+codex-search.py can show why a component ranks where it does
+"""
+
+import math
+import re
+import sqlite3
+from typing import Dict, List, Optional, Tuple
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS component_quality (
+    id TEXT PRIMARY KEY,
+    ref_name TEXT,            -- name tests refer to the component by
+    lines INT,
+    complexity INT,           -- cyclomatic: 1 + decision points
+    documented INT,           -- docstring, JSDoc or doc comment
+    test_refs INT DEFAULT 0,  -- other test files in the repo naming it
+    reuse INT DEFAULT 1       -- repos holding the same code_hash
+);
+CREATE TABLE IF NOT EXISTS test_names (
+    repo TEXT NOT NULL,
+    name TEXT NOT NULL,
+    path TEXT NOT NULL,
+    PRIMARY KEY (repo, name, path)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_test_names_path ON test_names(repo, path);
+CREATE TRIGGER IF NOT EXISTS components_quality_delete AFTER DELETE ON components BEGIN
+    DELETE FROM component_quality WHERE id = old.id;
+END;
+"""
+
+TEST_FILE = re.compile(
+    r'(?:^|/)(?:tests?|__tests__|spec)/|[._-](?:test|spec)\.\w+$|(?:^|/)test_\w+\.py$|_test\.go$'
+)
+IDENTIFIER = re.compile(r'[A-Za-z_]\w{2,}')
+
+# Decision-point tokens (after codex_minhash.normalise) per language; the
+# paired operators count once per adjacent pair of their character
+BRANCHES = {
+    'python': {'if', 'elif', 'for', 'while', 'except', 'and', 'or', 'case'},
+    'typescript': {'if', 'for', 'while', 'case', 'catch'},
+    'go': {'if', 'for', 'case', 'select'},
+    'rust': {'if', 'for', 'while', 'loop'},
+}
+PAIRED = {
+    'python': set(),
+    'typescript': {('&', '&'), ('|', '|'), ('?', '?')},
+    'go': {('&', '&'), ('|', '|')},
+    'rust': {('&', '&'), ('|', '|'), ('=', '>')},
+}
+DOC_COMMENT = ('/**', '*', '*/', '///', '//!', '//', '#')
+DECORATOR = ('@', '#[')
+
+
+def is_test_file(path: str) -> bool:
+    return bool(TEST_FILE.search(path.replace('\\', '/')))
+
+
+def test_identifiers(content: str) -> List[str]:
+    """Identifiers a test file mentions, for the test_refs signal"""
+    return sorted(set(IDENTIFIER.findall(content)))
+
+
+def ref_name(name: str) -> str:
+    """The bare name a test would use: Recv.Method -> Method, Trait for Type -> Type"""
+    return name.split(' for ')[-1].split('.')[-1]
+
+
+def complexity(tokens: List[str], language: str) -> int:
+    branches = BRANCHES.get(language, BRANCHES['typescript'])
+    paired = PAIRED.get(language, PAIRED['typescript'])
+    count = 1 + sum(tok in branches for tok in tokens)
+    if paired:
+        count += sum(pair in paired for pair in zip(tokens, tokens[1:]))
+    return count
+
+
+def documented(tokens: List[str], leading: str, language: str) -> bool:
+    """Docstring as the first statement (Python) or a comment block just above"""
+    if language == 'python':
+        depth = 0
+        for i, tok in enumerate(tokens):
+            if tok in '([{':
+                depth += 1
+            elif tok in ')]}':
+                depth -= 1
+            elif tok == ':' and depth == 0:
+                return tokens[i + 1:i + 2] == ['S']
+        return False
+    for line in reversed(leading.split('\n')):
+        line = line.strip()
+        if line.startswith(DECORATOR):
+            continue
+        return line.startswith(DOC_COMMENT)
+    return False
+
+
+def static_signals(name: str, language: str, tokens: List[str], leading: str,
+                   start_line: int, end_line: int) -> Dict:
+    """Signals that depend only on the component's own source"""
+    return {
+        'ref_name': ref_name(name),
+        'lines': end_line - start_line + 1,
+        'complexity': complexity(tokens, language),
+        'documented': int(documented(tokens, leading, language)),
+    }
+
+
+def score(lines: int, complexity: int, documented: int, test_refs: int = 0,
+          reuse: int = 1, usage: int = 0) -> Optional[float]:
+    """0-10: size 2, complexity 2, docs 2, tests 2, cross-repo reuse 1, usage 1"""
+    if lines is None:
+        return None
+    total = 2.0 if 3 <= lines <= 80 else 1.0 if lines <= 200 else 0.0
+    total += 2.0 if complexity <= 10 else 1.0 if complexity <= 20 else 0.0
+    total += 2.0 if documented else 0.0
+    total += min(test_refs or 0, 2)
+    total += min((reuse or 1) - 1, 3) / 3
+    total += min(math.log2(1 + (usage or 0)) / 4, 1.0)
+    return round(total, 1)
+
+
+def save_signals(conn, signals: List[Tuple[str, Dict]]):
+    """Replace the static signals of saved components (caller commits)"""
+    conn.executemany("""
+        INSERT INTO component_quality (id, ref_name, lines, complexity, documented)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(id) DO UPDATE SET
+            ref_name = excluded.ref_name, lines = excluded.lines,
+            complexity = excluded.complexity, documented = excluded.documented
+    """, [(cid, s['ref_name'], s['lines'], s['complexity'], s['documented']) for cid, s in signals])
+
+
+def save_test_names(conn, repo: str, paths: List[str], names: List[Tuple[str, List[str]]]):
+    """Replace the identifiers recorded for re-extracted or removed test files"""
+    conn.executemany("DELETE FROM test_names WHERE repo = ? AND path = ?", [(repo, p) for p in paths])
+    conn.executemany("INSERT OR IGNORE INTO test_names (repo, name, path) VALUES (?, ?, ?)",
+                     [(repo, name, path) for path, idents in names for name in idents])
+
+
+def rescore(conn):
+    """Refresh test_refs and reuse, then quality_score, for the whole library
+
+    One grouped pass over code_hash and indexed lookups into test_names, so
+    the cost grows with the library rather than with copies squared; only
+    rows whose values change are written.
+    """
+    conn.create_function('quality_score', 6, score, deterministic=True)
+    conn.execute("DROP TABLE IF EXISTS temp.hash_repos")
+    conn.execute("""
+        CREATE TEMP TABLE hash_repos AS
+        SELECT code_hash, COUNT(DISTINCT repo) AS repos FROM components GROUP BY code_hash
+    """)
+    conn.execute("CREATE UNIQUE INDEX temp.idx_hash_repos ON hash_repos(code_hash)")
+    conn.execute("""
+        UPDATE component_quality SET reuse = r.reuse, test_refs = r.test_refs
+        FROM (
+            SELECT q.id, h.repos AS reuse, (
+                SELECT COUNT(*) FROM test_names t
+                WHERE t.repo = c.repo AND t.name = q.ref_name AND t.path != c.file_path
+            ) AS test_refs
+            FROM component_quality q
+            JOIN components c ON c.id = q.id
+            JOIN hash_repos h ON h.code_hash = c.code_hash
+        ) r
+        WHERE r.id = component_quality.id
+        AND (component_quality.reuse IS NOT r.reuse OR component_quality.test_refs IS NOT r.test_refs)
+    """)
+    conn.execute("""
+        UPDATE components SET quality_score = r.score
+        FROM (
+            SELECT c.id, quality_score(q.lines, q.complexity, q.documented, q.test_refs, q.reuse,
+                                       c.usage_count) AS score
+            FROM component_quality q JOIN components c ON c.id = q.id
+        ) r
+        WHERE r.id = components.id AND components.quality_score IS NOT r.score
+    """)
+    conn.execute("DROP TABLE temp.hash_repos")
+
+
+def load_signals(conn, component_id: str) -> Optional[Dict]:
+    """Stored signals of one component, or None (also for libraries not yet rescanned)"""
+    try:
+        row = conn.execute("""
+            SELECT lines, complexity, documented, test_refs, reuse FROM component_quality WHERE id = ?
+        """, (component_id,)).fetchone()
+    except sqlite3.OperationalError:
+        return None
+    if not row:
+        return None
+    return dict(zip(('lines', 'complexity', 'documented', 'test_refs', 'reuse'), row))
+
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+BlackRoad DNS Codec Benchmark
+Measures parse/encode throughput of dns_codec and fuzzes the parser with mutated messages
+"""
+
+import json
+import random
+import time
+from datetime import datetime
+from pathlib import Path
+
+import dns_codec
+from dns_codec import DNSError, QTYPES, TYPE_A, TYPE_AAAA, TYPE_CNAME, TYPE_MX
+
+NAMES = ['google.com', 'www.github.com', 'nas.blackroad.local', 'api.blackroad.io',
+         'a.very.deep.subdomain.example.co.uk', 'x.y']
+
+
+def build_corpus(size, seed):
+    """Queries (with and without EDNS) plus responses that exercise compression"""
+    rng = random.Random(seed)
+    queries, responses = [], []
+    for i in range(size):
+        name = rng.choice(NAMES)
+        qtype = rng.choice(list(QTYPES.values()))
+        query = dns_codec.encode_query(i & 0xFFFF, name, qtype, edns_payload=rng.choice([None, 1232, 4096]))
+        queries.append(query)
+
+        parsed = dns_codec.parse_message(query)
+        answers = [
+            dns_codec.make_record(name, TYPE_CNAME, 300, f'edge.{name}'),
+            dns_codec.make_record(f'edge.{name}', TYPE_A, 60, f'10.0.{i % 256}.{rng.randrange(256)}'),
+            dns_codec.make_record(f'edge.{name}', TYPE_AAAA, 60, f'fd00::{i % 65536:x}'),
+            dns_codec.make_record(name, TYPE_MX, 3600, f'10 mail.{name}'),
+        ]
+        responses.append(dns_codec.build_response(parsed, query, answers))
+    return queries, responses
+
+
+def throughput(label, func, inputs, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for item in inputs:
+            func(item)
+    elapsed = time.perf_counter() - start
+    ops = len(inputs) * rounds
+    return {
+        'operation': label,
+        'ops': ops,
+        'ops_per_sec': round(ops / elapsed),
+        'us_per_op': round(elapsed / ops * 1e6, 3),
+    }
+
+
+def mutate(rng, data):
+    """One random corruption: bit flips, truncation, splices or random bytes"""
+    data = bytearray(data)
+    choice = rng.randrange(5)
+    if choice == 0:
+        for _ in range(rng.randint(1, 4)):
+            data[rng.randrange(len(data))] ^= 1 << rng.randrange(8)
+    elif choice == 1:
+        del data[rng.randrange(len(data)):]
+    elif choice == 2:
+        pos = rng.randrange(12, len(data))
+        data[pos:pos] = bytes([0xC0 | rng.randrange(64), rng.randrange(256)])
+    elif choice == 3:
+        pos = rng.randrange(4, 12)
+        data[pos] = rng.randrange(256)
+    else:
+        data = bytearray(rng.randbytes(rng.randint(0, 64)))
+    return bytes(data)
+
+
+def fuzz(corpus, iterations, seed):
+    """Every mutated input must parse or raise DNSError - anything else is a bug"""
+    rng = random.Random(seed)
+    accepted = rejected = 0
+    crashes = []
+    start = time.perf_counter()
+    for _ in range(iterations):
+        data = mutate(rng, rng.choice(corpus))
+        try:
+            query = dns_codec.parse_message(data)
+            # Responses to whatever parsed must encode too
+            dns_codec.build_response(query, data)
+            accepted += 1
+        except DNSError:
+            rejected += 1
+        except Exception as e:
+            crashes.append({'input': data.hex(), 'error': f'{type(e).__name__}: {e}'})
+    elapsed = time.perf_counter() - start
+    return {
+        'iterations': iterations,
+        'accepted': accepted,
+        'rejected': rejected,
+        'crashes': len(crashes),
+        'crash_samples': crashes[:5],
+        'inputs_per_sec': round(iterations / elapsed),
+    }
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Benchmark and fuzz the BlackRoad DNS codec')
+    parser.add_argument('--corpus', type=int, default=1000, help='Distinct messages in the corpus')
+    parser.add_argument('--rounds', type=int, default=20, help='Passes over the corpus per measurement')
+    parser.add_argument('--fuzz', type=int, default=100000, help='Fuzz iterations (0 to skip)')
+    parser.add_argument('--seed', type=int, default=1, help='Random seed')
+    parser.add_argument('--output', help='Write JSON report to this file instead of stdout')
+    args = parser.parse_args()
+
+    queries, responses = build_corpus(args.corpus, args.seed)
+    parsed = [(dns_codec.parse_message(q), q) for q in queries]
+    answers = [dns_codec.make_record('google.com', TYPE_A, 60, '10.0.0.1')]
+
+    report = {
+        'timestamp': datetime.now().isoformat(),
+        'corpus': args.corpus,
+        'throughput': [
+            throughput('parse_query', dns_codec.parse_message, queries, args.rounds),
+            throughput('parse_response', dns_codec.parse_message, responses, args.rounds),
+            throughput('build_response', lambda item: dns_codec.build_response(item[0], item[1], answers),
+                       parsed, args.rounds),
+            throughput('error_response', lambda q: dns_codec.error_response(q, 2), queries, args.rounds),
+        ],
+    }
+    if args.fuzz:
+        report['fuzz'] = fuzz(queries + responses, args.fuzz, args.seed)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+BlackRoad DNS Load Generator
+Replays a query mix against a resolver and reports queries/sec and tail latency
+"""
+
+import json
+import random
+import socket
+import struct
+import sys
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+import dns_codec
+from latency_stats import percentile
+
+# Browser-ish default mix: popular names repeat, a long tail does not
+DEFAULT_MIX = (
+    [('google.com', 'A')] * 20
+    + [('google.com', 'AAAA')] * 10
+    + [('github.com', 'A')] * 10
+    + [('blackroad.io', 'A')] * 10
+    + [('blackroad.io', 'MX')] * 2
+    + [(f'cdn{i}.example.com', 'A') for i in range(50)]
+)
+
+
+def load_mix(path):
+    """Read a query mix: one `name [TYPE]` per line, `#` comments allowed"""
+    mix = []
+    for lineno, line in enumerate(Path(path).read_text().splitlines(), 1):
+        fields = line.split('#', 1)[0].split()
+        if not fields:
+            continue
+        qtype = fields[1].upper() if len(fields) > 1 else 'A'
+        if qtype not in dns_codec.QTYPES:
+            raise ValueError(f"{path}:{lineno}: unknown query type {fields[1]!r} "
+                             f"(expected one of {', '.join(dns_codec.QTYPES)})")
+        mix.append((fields[0], qtype))
+    return mix
+
+
+def client(server, mix, deadline, timeout, seed, results):
+    """Closed-loop client: one outstanding query at a time until the deadline"""
+    rng = random.Random(seed)
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.settimeout(timeout)
+    latencies = []
+    rcodes = {}
+    timeouts = 0
+    while time.monotonic() < deadline:
+        name, qtype = rng.choice(mix)
+        query_id = rng.randrange(65536)
+        start = time.perf_counter()
+        sock.sendto(dns_codec.encode_query(query_id, name, dns_codec.QTYPES[qtype]), server)
+        try:
+            while True:
+                reply = sock.recv(4096)
+                if len(reply) >= 4 and struct.unpack('!H', reply[:2])[0] == query_id:
+                    break
+        except socket.timeout:
+            timeouts += 1
+            continue
+        latencies.append((time.perf_counter() - start) * 1000)
+        rcode = dns_codec.RCODE_NAMES.get(reply[3] & 0x0F, str(reply[3] & 0x0F))
+        rcodes[rcode] = rcodes.get(rcode, 0) + 1
+    sock.close()
+    results.append((latencies, rcodes, timeouts))
+
+
+def run(server, mix, concurrency, duration, timeout):
+    results = []
+    deadline = time.monotonic() + duration
+    threads = [
+        threading.Thread(target=client, args=(server, mix, deadline, timeout, i, results))
+        for i in range(concurrency)
+    ]
+    start = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - start
+
+    latencies = [ms for lat, _, _ in results for ms in lat]
+    rcodes = {}
+    for _, counts, _ in results:
+        for rcode, count in counts.items():
+            rcodes[rcode] = rcodes.get(rcode, 0) + count
+    timeouts = sum(t for _, _, t in results)
+
+    return {
+        'answered': len(latencies),
+        'timeouts': timeouts,
+        'elapsed_s': round(elapsed, 3),
+        'qps': round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        'latency_ms': {
+            'p50': round(percentile(latencies, 50), 3),
+            'p95': round(percentile(latencies, 95), 3),
+            'p99': round(percentile(latencies, 99), 3),
+            'max': round(max(latencies), 3) if latencies else 0.0,
+        },
+        'rcodes': rcodes,
+    }
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Load test the BlackRoad DNS resolver')
+    parser.add_argument('--server', default='127.0.0.1', help='Resolver address')
+    parser.add_argument('--port', type=int, default=53, help='Resolver port')
+    parser.add_argument('--mix', help='Query mix file (`name [TYPE]` per line)')
+    parser.add_argument('--concurrency', type=int, default=32, help='Concurrent clients')
+    parser.add_argument('--duration', type=float, default=10.0, help='Seconds to run')
+    parser.add_argument('--timeout', type=float, default=2.0, help='Per-query timeout in seconds')
+    parser.add_argument('--output', help='Write JSON report to this file instead of stdout')
+    args = parser.parse_args()
+
+    try:
+        mix = load_mix(args.mix) if args.mix else DEFAULT_MIX
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    report = {
+        'timestamp': datetime.now().isoformat(),
+        'server': f'{args.server}:{args.port}',
+        'concurrency': args.concurrency,
+        'distinct_queries': len(set(mix)),
+        **run((args.server, args.port), mix, args.concurrency, args.duration, args.timeout),
+    }
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
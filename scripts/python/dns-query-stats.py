@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+BlackRoad DNS Query Stats
+Offline top-domain, QPS and latency report from the dns-system query log
+"""
+
+import json
+from collections import Counter
+
+from dns_codec import RCODE_NAMES
+from dns_querylog import QUERY_LOG, iter_records
+from latency_stats import percentile
+
+
+def summarize(records, top=20, since=None):
+    """Fold raw and aggregated log lines into one report
+
+    Raw lines count `w` queries each (the inverse sampling rate); aggregated
+    lines carry their own weighted `count`.
+    """
+    domains = Counter()
+    rcodes = Counter()
+    qtypes = Counter()
+    per_second = Counter()
+    latencies = []
+    total = 0.0
+    first = last = None
+
+    for record in records:
+        ts = record.get('ts', 0)
+        if since is not None and ts < since:
+            continue
+        count = record['count'] if 'count' in record else record.get('w', 1.0)
+        end = ts + record.get('interval', 0)
+        first = ts if first is None else min(first, ts)
+        last = end if last is None else max(last, end)
+
+        total += count
+        domains[record['name']] += count
+        rcodes[RCODE_NAMES.get(record['rcode'], str(record['rcode']))] += count
+        qtypes[str(record['qtype'])] += count
+        if 'interval' not in record:
+            per_second[int(ts)] += count
+            latencies.append(record.get('us', 0))
+
+    span = (last - first) if first is not None else 0
+    return {
+        'queries': round(total),
+        'span_s': round(span, 1),
+        'qps_avg': round(total / span, 2) if span else 0.0,
+        'qps_peak': round(max(per_second.values()), 1) if per_second else None,
+        'latency_us': {
+            'p50': percentile(latencies, 50),
+            'p99': percentile(latencies, 99),
+        } if latencies else None,
+        'rcodes': {k: round(v) for k, v in rcodes.most_common()},
+        'qtypes': {k: round(v) for k, v in qtypes.most_common()},
+        'top_domains': [{'name': name, 'queries': round(n)} for name, n in domains.most_common(top)],
+    }
+
+
+def main():
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description='Summarise the BlackRoad DNS query log')
+    parser.add_argument('--log', default=str(QUERY_LOG), help='Query log path (backups are included)')
+    parser.add_argument('--top', type=int, default=20, help='Number of top domains to show')
+    parser.add_argument('--hours', type=float, help='Only include the last N hours')
+    parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+    args = parser.parse_args()
+
+    since = time.time() - args.hours * 3600 if args.hours else None
+    report = summarize(iter_records(args.log), args.top, since)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"📊 BlackRoad DNS: {report['queries']} queries over {report['span_s']}s")
+    peak = f", peak {report['qps_peak']}" if report['qps_peak'] is not None else ""
+    print(f"   QPS: avg {report['qps_avg']}{peak}")
+    if report['latency_us']:
+        print(f"   Latency: p50 {report['latency_us']['p50']}us, p99 {report['latency_us']['p99']}us")
+    print(f"   Rcodes: {', '.join(f'{k}={v}' for k, v in report['rcodes'].items())}")
+    print(f"   Types: {', '.join(f'{k}={v}' for k, v in report['qtypes'].items())}")
+    print(f"\n🔝 Top {len(report['top_domains'])} domains:")
+    for i, entry in enumerate(report['top_domains'], 1):
+        print(f"  {i:3}. {entry['name']:<50} {entry['queries']:>8}")
+
+
+if __name__ == '__main__':
+    main()
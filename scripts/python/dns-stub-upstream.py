@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+BlackRoad DNS Stub Upstream
+Local stand-in upstream resolver (UDP + TCP) for exercising dns-system forwarding
+
+Name prefixes pick the behaviour:
+  nx*      NXDOMAIN with an SOA (negative TTL --negative-ttl)
+  nodata*  NOERROR/NODATA with an SOA
+  big*     100 A records, too large for UDP so the client must retry over TCP
+  slow*    answers after --slow seconds
+  *        one A record (and one AAAA) derived from the name
+"""
+
+import hashlib
+import struct
+import threading
+import time
+from socketserver import BaseRequestHandler, ThreadingTCPServer, ThreadingUDPServer
+
+import dns_codec
+from dns_codec import DNSError, RCODE_NXDOMAIN, TYPE_A, TYPE_AAAA, TYPE_SOA
+
+ZONE_SOA = 'ns.stub.test hostmaster.stub.test 1 3600 600 86400 {minimum}'
+
+stats = {'udp': 0, 'tcp': 0, 'tcp_connections': 0}
+settings = {'ttl': 60, 'negative_ttl': 30, 'slow': 5.0}
+
+
+def answer(data, max_size=None):
+    query = dns_codec.parse_message(data)
+    question = query.questions[0]
+    name, qtype = question.name, question.qtype
+    label = name.split('.')[0]
+    soa = dns_codec.make_record(name.partition('.')[2] or name, TYPE_SOA, settings['negative_ttl'],
+                                ZONE_SOA.format(minimum=settings['negative_ttl']))
+
+    if label.startswith('slow'):
+        time.sleep(settings['slow'])
+    if label.startswith('nx'):
+        return dns_codec.build_response(query, data, authority=[soa], rcode=RCODE_NXDOMAIN,
+                                        authoritative=True, max_size=max_size)
+    if label.startswith('nodata') or qtype not in (TYPE_A, TYPE_AAAA):
+        return dns_codec.build_response(query, data, authority=[soa], authoritative=True, max_size=max_size)
+
+    digest = hashlib.md5(name.encode()).digest()
+    count = 100 if label.startswith('big') else 1
+    if qtype == TYPE_A:
+        records = [dns_codec.make_record(name, TYPE_A, settings['ttl'], f'10.{digest[0]}.{digest[1]}.{i}')
+                   for i in range(count)]
+    else:
+        records = [dns_codec.make_record(name, TYPE_AAAA, settings['ttl'], f'fd00::{digest[0]:x}:{i}')
+                   for i in range(count)]
+    return dns_codec.build_response(query, data, records, authoritative=True, max_size=max_size)
+
+
+class UDPHandler(BaseRequestHandler):
+    def handle(self):
+        data, sock = self.request
+        stats['udp'] += 1
+        try:
+            sock.sendto(answer(data), self.client_address)
+        except (DNSError, IndexError):
+            pass
+
+
+class TCPHandler(BaseRequestHandler):
+    def handle(self):
+        stats['tcp_connections'] += 1
+        lock = threading.Lock()
+        while True:
+            header = self._recv(2)
+            if header is None:
+                return
+            data = self._recv(struct.unpack('!H', header)[0])
+            if data is None:
+                return
+            stats['tcp'] += 1
+            # Answer each query on its own thread so pipelined queries overlap
+            threading.Thread(target=self._reply, args=(data, lock), daemon=True).start()
+
+    def _reply(self, data, lock):
+        try:
+            response = answer(data, max_size=65535)
+        except (DNSError, IndexError):
+            return
+        with lock:
+            try:
+                self.request.sendall(struct.pack('!H', len(response)) + response)
+            except OSError:
+                pass
+
+    def _recv(self, size):
+        data = b''
+        while len(data) < size:
+            chunk = self.request.recv(size - len(data))
+            if not chunk:
+                return None
+            data += chunk
+        return data
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Stand-in upstream DNS server for testing')
+    parser.add_argument('--port', type=int, default=5399, help='UDP and TCP port')
+    parser.add_argument('--ttl', type=int, default=settings['ttl'], help='TTL of positive answers')
+    parser.add_argument('--negative-ttl', type=int, default=settings['negative_ttl'], help='SOA minimum')
+    parser.add_argument('--slow', type=float, default=settings['slow'], help='Delay for slow* names')
+    args = parser.parse_args()
+    settings.update(ttl=args.ttl, negative_ttl=args.negative_ttl, slow=args.slow)
+
+    ThreadingUDPServer.allow_reuse_address = True
+    ThreadingTCPServer.allow_reuse_address = True
+    udp = ThreadingUDPServer(('127.0.0.1', args.port), UDPHandler)
+    tcp = ThreadingTCPServer(('127.0.0.1', args.port), TCPHandler)
+    udp.daemon_threads = tcp.daemon_threads = True
+    threading.Thread(target=tcp.serve_forever, daemon=True).start()
+
+    print(f"Stub upstream on 127.0.0.1:{args.port} (udp+tcp)")
+    try:
+        udp.serve_forever()
+    except KeyboardInterrupt:
+        print(f"\n{stats}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,17 +1,57 @@
 #!/usr/bin/env python3
 """
-BLACKROAD DNS - ALL TRAFFIC ROUTES THROUGH BLACKROAD
-No upstream DNS. Everything is BlackRoad.
+BLACKROAD DNS - BLACKROAD TRAFFIC ROUTES THROUGH BLACKROAD
+BlackRoad zones resolve to the gateway; everything else is forwarded upstream.
+Run it from scripts/python: it imports dns_codec, dns_upstream and dns_querylog
+from the same directory, so it cannot be copied out on its own.
 """
 
 import socket
 import subprocess
 import threading
-import struct
 import os
+import queue
+import signal
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+import dns_codec
+from dns_codec import (
+    CLASS_IN, DNSError, FLAG_QR, OPCODE_MASK, QTYPES, RCODE_FORMERR, RCODE_NOERROR,
+    RCODE_NOTIMP, RCODE_SERVFAIL, ResourceRecord, TYPE_A, TYPE_ANY, TYPE_CNAME, TYPE_SOA,
+)
+from dns_querylog import QUERY_LOG, QueryLog
+from dns_upstream import Forwarder, UpstreamError, parse_address
 
 LISTEN_PORT = 53
 
+# Local BlackRoad gateway - the answer for BlackRoad names not in the zone table
+BLACKROAD_IP = "127.0.0.1"
+DEFAULT_TTL = 60
+
+# Names under these zones go to the gateway; the rest go to the upstreams
+BLACKROAD_ZONES = os.environ.get('BLACKROAD_DNS_ZONES', 'blackroad.io,blackroad.local').split(',')
+UPSTREAMS = os.environ.get('BLACKROAD_DNS_UPSTREAMS', '1.1.1.1,9.9.9.9').split(',')
+
+# Cache bounds; expired answers are kept this long to serve when upstreams fail (RFC 8767)
+MAX_CACHE_TTL = 86400
+STALE_WINDOW = 86400
+STALE_TTL = 30
+
+# Local zone table: one `name [ttl] TYPE value` record per line
+ZONE_FILE = Path(os.environ.get('BLACKROAD_DNS_ZONE', Path.home() / ".blackroad" / "dns-zone.txt"))
+
+# Fixed worker pool; queries beyond the queue depth are answered SERVFAIL
+WORKERS = 8
+QUEUE_DEPTH = 256
+
+# Idle DNS-over-TCP client connections are closed after this many seconds
+TCP_IDLE_TIMEOUT = 10
+
+# In-zone CNAME chains longer than this are cut short
+MAX_CNAME_CHAIN = 8
+
 # BlackRoad login state
 BLACKROAD_AUTHENTICATED = os.environ.get('BLACKROAD_AUTH', '0') == '1'
 
@@ -33,85 +73,404 @@ def query_claude(name):
     except Exception as e:
         return f"BLACKROAD: {e}"
 
-def build_dns_response(query_data, ip_address):
-    """Build a DNS response pointing to our IP"""
-    # Transaction ID from query
-    transaction_id = query_data[:2]
-
-    # Flags: standard response, no error
-    flags = b'\x81\x80'
-
-    # Questions: 1, Answers: 1, Authority: 0, Additional: 0
-    counts = b'\x00\x01\x00\x01\x00\x00\x00\x00'
-
-    # Copy question section from query
-    question_end = 12
-    while query_data[question_end] != 0:
-        question_end += query_data[question_end] + 1
-    question_end += 5  # null byte + qtype (2) + qclass (2)
-    question = query_data[12:question_end]
-
-    # Answer: pointer to name + type A + class IN + TTL + rdlength + IP
-    answer = b'\xc0\x0c'  # Pointer to name in question
-    answer += b'\x00\x01'  # Type A
-    answer += b'\x00\x01'  # Class IN
-    answer += b'\x00\x00\x00\x3c'  # TTL 60 seconds
-    answer += b'\x00\x04'  # rdlength 4
-
-    # Convert IP to bytes
-    ip_parts = ip_address.split('.')
-    answer += bytes([int(p) for p in ip_parts])
-
-    return transaction_id + flags + counts + question + answer
-
-def handle_query(data, addr, sock):
-    """Handle DNS query - ALL traffic goes through BlackRoad"""
-    # Parse domain name from query
-    pos = 12
-    labels = []
-    try:
-        while pos < len(data) and data[pos] != 0:
-            length = data[pos]
-            labels.append(data[pos+1:pos+1+length].decode('utf-8', errors='ignore'))
-            pos += length + 1
-    except:
-        pass
+def load_zone(path=ZONE_FILE):
+    """Load the local zone table into {name: {rtype: [ResourceRecord, ...]}}
+
+    Each line is `name [ttl] TYPE value`; blank lines and `#` comments are
+    skipped. Record data is encoded once here so answers cost no encoding.
+    """
+    zone = {}
+    path = Path(path)
+    if not path.exists():
+        return zone
+
+    for lineno, line in enumerate(path.read_text().splitlines(), 1):
+        fields = line.split('#', 1)[0].split()
+        if not fields:
+            continue
+        try:
+            if fields[1].isdigit():
+                name, ttl, rtype, value = fields[0], int(fields[1]), fields[2], ' '.join(fields[3:])
+            else:
+                name, ttl, rtype, value = fields[0], DEFAULT_TTL, fields[1], ' '.join(fields[2:])
+            qtype = QTYPES[rtype.upper()]
+            if qtype == TYPE_ANY:
+                raise ValueError("ANY is not a record type")
+            record = dns_codec.make_record(name, qtype, ttl, value)
+        except (ValueError, KeyError, IndexError) as e:
+            print(f"BLACKROAD: skipping bad zone record {path}:{lineno}: {line.strip()} ({e})")
+            continue
+        zone.setdefault(record.name, {}).setdefault(qtype, []).append(record)
+
+    return zone
+
+class AnswerCache:
+    """TTL-aware LRU cache of resolved answers keyed by (qname, qtype)
+
+    Expired entries linger for `stale_window` seconds so get_stale() can
+    still answer while every upstream is down.
+    """
+
+    def __init__(self, max_entries=10000, stale_window=STALE_WINDOW):
+        self.max_entries = max_entries
+        self.stale_window = stale_window
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+
+    def get(self, key):
+        """Return (value, age in whole seconds) for a live entry, else None"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None and entry[0] + self.stale_window <= now:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[2], int(now - entry[1])
+
+    def get_stale(self, key):
+        """Return the value of an expired entry still inside the stale window"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] + self.stale_window <= now:
+                return None
+            self.stale_hits += 1
+            return entry[2]
+
+    def put(self, key, value, ttl):
+        ttl = min(ttl, MAX_CACHE_TTL)
+        if ttl <= 0:
+            return
+        now = time.monotonic()
+        with self._lock:
+            self._entries[key] = (now + ttl, now, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
 
-    name = '.'.join(labels).lower()
+class Enricher(threading.Thread):
+    """Background worker that asks Claude about names it has not seen recently
 
-    print(f"\n[BLACKROAD DNS] Query: {name}")
-    print(f"  -> ALL TRAFFIC ROUTES THROUGH BLACKROAD")
+    The response path only does a non-blocking put; when the queue is full the
+    name is dropped rather than delaying an answer.
+    """
 
-    # Log to Claude what's being accessed
-    response_text = query_claude(name)
-    print(f"  <- Claude: {response_text[:100]}...")
+    def __init__(self, max_pending=1000, remember=10000):
+        super().__init__(daemon=True)
+        self.pending = queue.Queue(maxsize=max_pending)
+        self.remember = remember
+        self.seen = OrderedDict()
+        self.dropped = 0
 
-    # Return BlackRoad's IP for EVERYTHING
-    # This means all domains resolve to BlackRoad
-    # The actual routing/proxy happens at the web layer
-    BLACKROAD_IP = "127.0.0.1"  # Local BlackRoad gateway
+    def submit(self, name, answer):
+        try:
+            self.pending.put_nowait((name, answer))
+        except queue.Full:
+            self.dropped += 1
+
+    def run(self):
+        while True:
+            name, answer = self.pending.get()
+            if name in self.seen:
+                continue
+            self.seen[name] = True
+            if len(self.seen) > self.remember:
+                self.seen.popitem(last=False)
+            response_text = query_claude(name)
+            print(f"[BLACKROAD DNS] {name} -> {answer}")
+            print(f"  <- Claude: {response_text[:100]}...")
+
+zone_table = {}
+answer_cache = AnswerCache()
+enricher = None
+query_log = None
+forwarder = None
+blackroad_zones = [zone.strip().lower().strip('.') for zone in BLACKROAD_ZONES if zone.strip()]
+serve_stats = {'received': 0, 'overloaded': 0}
+
+GATEWAY_RDATA = socket.inet_aton(BLACKROAD_IP)
+
+def enclosing_soa(name):
+    """SOA record of the closest zone-table ancestor of `name`, if any"""
+    labels = name.split('.')
+    for i in range(len(labels)):
+        soa = zone_table.get('.'.join(labels[i:]), {}).get(TYPE_SOA)
+        if soa:
+            return soa[0]
+    return None
+
+def is_blackroad(name):
+    """True for names at or under one of the BlackRoad zones"""
+    return any(name == zone or name.endswith('.' + zone) for zone in blackroad_zones)
+
+def negative_ttl(authority):
+    """RFC 2308 negative-caching TTL from the SOA in `authority`, 0 without one"""
+    for rr in authority:
+        if rr.rtype == TYPE_SOA:
+            return min(rr.ttl, dns_codec.soa_minimum(rr.rdata))
+    return 0
+
+def nodata(name, answers=()):
+    """NOERROR with no records of the asked type, plus the SOA for negative caching"""
+    soa = enclosing_soa(name)
+    if soa:
+        return RCODE_NOERROR, list(answers), [soa], negative_ttl([soa])
+    return RCODE_NOERROR, list(answers), [], DEFAULT_TTL
+
+def forward(name, qtype, answers=()):
+    """Ask the upstreams; returns (rcode, answers, authority, cache ttl)
+
+    Positive answers keep only the answer section. Negative answers
+    (NXDOMAIN/NODATA) keep the SOA and cache for its negative TTL, or not at
+    all when the upstream sent none.
+    """
+    response = forwarder.query(name, qtype)
+    rcode = dns_codec.rcode_of(response.header.flags)
+    records = list(answers) + response.answers
+    if rcode == RCODE_NOERROR and response.answers:
+        return rcode, records, [], min(rr.ttl for rr in records)
+    authority = [rr for rr in response.authority if rr.rtype == TYPE_SOA]
+    return rcode, records, authority, negative_ttl(authority)
+
+def resolve(name, qtype):
+    """Answer one question; returns (rcode, answers, authority, cache ttl)
+
+    The local zone table wins, with in-zone CNAMEs followed. Other BlackRoad
+    names resolve to the gateway for A (and ANY) and get NODATA for other
+    types. Everything else is forwarded upstream, which may raise UpstreamError.
+    """
+    answers = []
+    for _ in range(MAX_CNAME_CHAIN):
+        rrsets = zone_table.get(name)
+        if rrsets is None:
+            break
+        if qtype == TYPE_ANY:
+            answers += [rr for rrs in rrsets.values() for rr in rrs]
+            return RCODE_NOERROR, answers, [], min(rr.ttl for rr in answers)
+        if qtype in rrsets:
+            answers += rrsets[qtype]
+            return RCODE_NOERROR, answers, [], min(rr.ttl for rr in answers)
+        cname = rrsets.get(TYPE_CNAME)
+        if not cname:
+            return nodata(name, answers)
+        answers += cname
+        name = dns_codec.rdata_to_text(TYPE_CNAME, cname[0].rdata)
+    else:
+        return RCODE_SERVFAIL, [], [], 0
+
+    if forwarder is not None and not is_blackroad(name):
+        return forward(name, qtype, answers)
+
+    # The actual routing/proxy for BlackRoad names happens at the web layer
+    if qtype in (TYPE_A, TYPE_ANY):
+        answers.append(ResourceRecord(name, TYPE_A, CLASS_IN, DEFAULT_TTL, GATEWAY_RDATA))
+        return RCODE_NOERROR, answers, [], min(rr.ttl for rr in answers)
+    return nodata(name, answers)
+
+def lookup(name, qtype):
+    """resolve() through the answer cache; returns (rcode, answers, authority)
+
+    Cache hits count their TTLs down. When the upstreams fail, an expired
+    answer is served with a short TTL rather than SERVFAIL.
+    """
+    key = (name, qtype)
+    cached = answer_cache.get(key)
+    if cached is not None:
+        (rcode, answers, authority), age = cached
+        if age:
+            answers = [rr._replace(ttl=max(rr.ttl - age, 0)) for rr in answers]
+            authority = [rr._replace(ttl=max(rr.ttl - age, 0)) for rr in authority]
+        return rcode, answers, authority
 
     try:
-        response = build_dns_response(data, BLACKROAD_IP)
-        sock.sendto(response, addr)
-        print(f"  -> Resolved {name} to {BLACKROAD_IP} (BLACKROAD)")
-    except Exception as e:
+        rcode, answers, authority, ttl = resolve(name, qtype)
+    except UpstreamError as e:
+        stale = answer_cache.get_stale(key)
+        if stale is None:
+            print(f"  UPSTREAM ERROR: {name}: {e}")
+            return RCODE_SERVFAIL, [], []
+        rcode, answers, authority = stale
+        return (rcode, [rr._replace(ttl=min(rr.ttl, STALE_TTL)) for rr in answers],
+                [rr._replace(ttl=min(rr.ttl, STALE_TTL)) for rr in authority])
+
+    if rcode != RCODE_SERVFAIL:
+        answer_cache.put(key, (rcode, answers, authority), ttl)
+    return rcode, answers, authority
+
+def handle_query(data, addr, sock, max_size=None):
+    """Handle DNS query - ALL traffic goes through BlackRoad
+
+    `max_size` overrides the client's UDP limit (TCP passes 65535).
+    """
+    start = time.perf_counter()
+    try:
+        query = dns_codec.parse_message(data)
+    except DNSError as e:
         print(f"  ERROR: {e}")
-        # Send NXDOMAIN on error
-        nxdomain = bytearray(data[:12])
-        nxdomain[2] = 0x81
-        nxdomain[3] = 0x83
-        sock.sendto(bytes(nxdomain) + data[12:], addr)
+        response = dns_codec.error_response(data, RCODE_FORMERR)
+        if response:
+            sock.sendto(response, addr)
+        return
+
+    if query.header.flags & FLAG_QR:
+        return  # a response, not a query
+    if query.header.flags & OPCODE_MASK:
+        sock.sendto(dns_codec.build_response(query, data, rcode=RCODE_NOTIMP), addr)
+        return
+    if not query.questions:
+        sock.sendto(dns_codec.build_response(query, data, rcode=RCODE_FORMERR), addr)
+        return
+
+    rcode = RCODE_NOERROR
+    answers = []
+    authority = []
+    for question in query.questions:
+        q_rcode, q_answers, q_authority = lookup(question.name, question.qtype)
+        rcode = max(rcode, q_rcode)
+        answers += q_answers
+        authority += [rr for rr in q_authority if rr not in authority]
+
+    sock.sendto(dns_codec.build_response(query, data, answers, authority, rcode, max_size=max_size), addr)
+
+    # Logging and Claude enrichment happen off the response path
+    question = query.questions[0]
+    if query_log is not None:
+        latency_us = int((time.perf_counter() - start) * 1e6)
+        query_log.record(addr[0], question.name, question.qtype, rcode, len(answers), latency_us)
+    if enricher is not None:
+        first = answers[-1] if answers else None
+        description = dns_codec.rdata_to_text(first.rtype, first.rdata) if first else "NODATA"
+        enricher.submit(question.name, description)
+
+class TCPReply:
+    """sendto()-compatible writer that frames responses for a TCP client"""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.lock = threading.Lock()
+
+    def sendto(self, data, addr):
+        with self.lock:
+            self.conn.sendall(len(data).to_bytes(2, 'big') + data)
+
+def answer_failed(data, addr, sock, error):
+    """Log a query whose handling raised and answer it SERVFAIL, so the client
+    does not sit out its whole timeout"""
+    print(f"  ERROR: {error}")
+    response = dns_codec.error_response(data, RCODE_SERVFAIL)
+    if response:
+        sock.sendto(response, addr)
+
+def serve_tcp(listener):
+    """Answer DNS over TCP for clients retrying truncated UDP answers
+
+    Each connection gets a thread; queries on it are answered in order.
+    """
+    def client(conn, addr):
+        reply = TCPReply(conn)
+        conn.settimeout(TCP_IDLE_TIMEOUT)
+        try:
+            with conn:
+                while True:
+                    header = conn.recv(2, socket.MSG_WAITALL)
+                    if len(header) < 2:
+                        return
+                    data = conn.recv(int.from_bytes(header, 'big'), socket.MSG_WAITALL)
+                    try:
+                        handle_query(data, addr, reply, max_size=65535)
+                    except OSError:
+                        raise
+                    except Exception as e:
+                        answer_failed(data, addr, reply, e)
+        except OSError:
+            pass
+
+    while True:
+        conn, addr = listener.accept()
+        threading.Thread(target=client, args=(conn, addr), daemon=True).start()
+
+def serve(sock, workers=WORKERS, queue_depth=QUEUE_DEPTH):
+    """Receive datagrams and hand them to a fixed pool of worker threads
+
+    The receive loop never blocks on a worker: when the queue is full the query
+    is answered SERVFAIL straight away so clients back off or try another server.
+    """
+    backlog = queue.Queue(maxsize=queue_depth)
+    stats = serve_stats
+
+    def worker():
+        while True:
+            data, addr = backlog.get()
+            try:
+                handle_query(data, addr, sock)
+            except Exception as e:
+                try:
+                    answer_failed(data, addr, sock, e)
+                except OSError:
+                    pass
+
+    for _ in range(workers):
+        threading.Thread(target=worker, daemon=True).start()
+
+    while True:
+        data, addr = sock.recvfrom(4096)
+        stats['received'] += 1
+        try:
+            backlog.put_nowait((data, addr))
+        except queue.Full:
+            stats['overloaded'] += 1
+            response = dns_codec.error_response(data, RCODE_SERVFAIL)
+            if response:
+                sock.sendto(response, addr)
 
 def main():
+    global zone_table, enricher, query_log, forwarder, blackroad_zones
+    import argparse
+
+    parser = argparse.ArgumentParser(description='BlackRoad DNS')
+    parser.add_argument('--port', type=int, default=LISTEN_PORT, help='UDP port to listen on')
+    parser.add_argument('--zone', default=str(ZONE_FILE), help='Local zone table file')
+    parser.add_argument('--workers', type=int, default=WORKERS, help='Query worker threads')
+    parser.add_argument('--queue-depth', type=int, default=QUEUE_DEPTH,
+                        help='Queued queries before answering SERVFAIL')
+    parser.add_argument('--upstream', action='append',
+                        help='Upstream resolver host[:port] (repeatable, default: %s)' % ','.join(UPSTREAMS))
+    parser.add_argument('--no-upstream', action='store_true',
+                        help='Resolve every name to the BlackRoad gateway')
+    parser.add_argument('--blackroad-zone', action='append',
+                        help='Zone routed to the gateway (repeatable, default: %s)' % ','.join(BLACKROAD_ZONES))
+    parser.add_argument('--no-claude', action='store_true', help='Skip background Claude enrichment')
+    parser.add_argument('--query-log', default=str(QUERY_LOG), help='Structured JSONL query log')
+    parser.add_argument('--no-query-log', action='store_true', help='Disable the query log')
+    parser.add_argument('--log-sample', type=float, default=1.0, help='Fraction of queries to log')
+    parser.add_argument('--log-aggregate', action='store_true',
+                        help='Log per-domain counts each minute instead of every query')
+    args = parser.parse_args()
+
+    if args.blackroad_zone:
+        blackroad_zones = [zone.lower().strip('.') for zone in args.blackroad_zone]
+    if not args.no_upstream:
+        forwarder = Forwarder([parse_address(u.strip()) for u in args.upstream or UPSTREAMS if u.strip()])
+
     print("╔═══════════════════════════════════════╗")
     print("║   BLACKROAD DNS - ALL IS BLACKROAD    ║")
     print("╚═══════════════════════════════════════╝")
     print("")
-    print("NO UPSTREAM DNS. EVERYTHING ROUTES HERE.")
-    print("google.com -> BLACKROAD")
-    print("facebook.com -> BLACKROAD")
-    print("*.* -> BLACKROAD")
+    for zone in blackroad_zones:
+        print(f"*.{zone} -> BLACKROAD")
+    if forwarder is None:
+        print("NO UPSTREAM DNS. EVERYTHING ROUTES HERE.")
+        print("*.* -> BLACKROAD")
+    else:
+        upstreams = ', '.join(f"{host}:{port}" for host, port in forwarder.upstreams)
+        print(f"*.* -> {upstreams}")
     print("")
 
     if not blackroad_login():
@@ -121,25 +480,48 @@ def main():
     print("BLACKROAD: Authenticated")
     print("")
 
+    zone_table = load_zone(args.zone)
+    print(f"Zone: {len(zone_table)} names from {args.zone}")
+
+    if not args.no_claude:
+        enricher = Enricher()
+        enricher.start()
+    if not args.no_query_log:
+        query_log = QueryLog(args.query_log, sample_rate=args.log_sample, aggregate=args.log_aggregate).start()
+        print(f"Query log: {args.query_log}")
+
     sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
     sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
 
     try:
-        sock.bind(('127.0.0.1', LISTEN_PORT))
+        sock.bind(('127.0.0.1', args.port))
     except PermissionError:
-        print(f"ERROR: Need sudo for port {LISTEN_PORT}")
-        print("Run: sudo python3 ~/blackroad-dns-system.py")
+        print(f"ERROR: Need sudo for port {args.port}")
+        print(f"Run: sudo python3 {Path(__file__).resolve()} (or pick --port above 1023)")
         return
 
-    print(f"Listening on 127.0.0.1:{LISTEN_PORT}")
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind(('127.0.0.1', args.port))
+    listener.listen(64)
+    threading.Thread(target=serve_tcp, args=(listener,), daemon=True).start()
+
+    print(f"Listening on 127.0.0.1:{args.port} (udp+tcp)")
     print("All DNS queries now route through BlackRoad + Claude")
     print("")
 
-    while True:
-        data, addr = sock.recvfrom(4096)
-        thread = threading.Thread(target=handle_query, args=(data, addr, sock))
-        thread.daemon = True
-        thread.start()
+    # kill/systemd stop with SIGTERM; shut down the same way as Ctrl-C
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    try:
+        serve(sock, args.workers, args.queue_depth)
+    except KeyboardInterrupt:
+        print(f"\nBLACKROAD: {serve_stats['received']} queries, "
+              f"{serve_stats['overloaded']} answered SERVFAIL under overload")
+    finally:
+        # Flush buffered log lines however serving ends
+        if query_log is not None:
+            query_log.close()
+            print(f"BLACKROAD: {query_log.written} log lines written, {query_log.dropped} dropped")
 
 if __name__ == "__main__":
     main()
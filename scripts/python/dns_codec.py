@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+"""
+BlackRoad DNS wire-format codec
+Zero-copy parsing and encoding of DNS messages (RFC 1035, EDNS0 per RFC 6891)
+"""
+
+import socket
+import struct
+from collections import namedtuple
+
+TYPE_A = 1
+TYPE_NS = 2
+TYPE_CNAME = 5
+TYPE_SOA = 6
+TYPE_PTR = 12
+TYPE_MX = 15
+TYPE_TXT = 16
+TYPE_AAAA = 28
+TYPE_SRV = 33
+TYPE_OPT = 41
+TYPE_ANY = 255
+
+QTYPES = {
+    'A': TYPE_A, 'NS': TYPE_NS, 'CNAME': TYPE_CNAME, 'SOA': TYPE_SOA, 'PTR': TYPE_PTR,
+    'MX': TYPE_MX, 'TXT': TYPE_TXT, 'AAAA': TYPE_AAAA, 'SRV': TYPE_SRV, 'ANY': TYPE_ANY,
+}
+TYPE_NAMES = {code: name for name, code in QTYPES.items()}
+
+CLASS_IN = 1
+
+RCODE_NOERROR = 0
+RCODE_FORMERR = 1
+RCODE_SERVFAIL = 2
+RCODE_NXDOMAIN = 3
+RCODE_NOTIMP = 4
+RCODE_REFUSED = 5
+RCODE_NAMES = {
+    RCODE_NOERROR: 'NOERROR', RCODE_FORMERR: 'FORMERR', RCODE_SERVFAIL: 'SERVFAIL',
+    RCODE_NXDOMAIN: 'NXDOMAIN', RCODE_NOTIMP: 'NOTIMP', RCODE_REFUSED: 'REFUSED',
+}
+
+FLAG_QR = 0x8000
+FLAG_AA = 0x0400
+FLAG_TC = 0x0200
+FLAG_RD = 0x0100
+FLAG_RA = 0x0080
+OPCODE_MASK = 0x7800
+
+# Largest response to a client that did not send EDNS, and what we advertise
+CLASSIC_UDP_PAYLOAD = 512
+EDNS_UDP_PAYLOAD = 1232
+
+MAX_NAME_LENGTH = 255
+MAX_LABEL_LENGTH = 63
+
+Header = namedtuple('Header', 'id flags qdcount ancount nscount arcount')
+Question = namedtuple('Question', 'name qtype qclass')
+ResourceRecord = namedtuple('ResourceRecord', 'name rtype rclass ttl rdata')
+Edns = namedtuple('Edns', 'payload_size version do options')
+Message = namedtuple('Message', 'header questions answers authority additional edns question_end')
+
+_HEADER = struct.Struct('!HHHHHH')
+_QUESTION = struct.Struct('!HH')
+_RR = struct.Struct('!HHIH')
+_OPTION = struct.Struct('!HH')
+_POINTER = struct.Struct('!H')
+
+
+class DNSError(ValueError):
+    """Raised for messages that are truncated or violate the wire format"""
+
+
+def rcode_of(flags):
+    return flags & 0x000F
+
+
+def read_name(buf, offset):
+    """Decode the (possibly compressed) name at `offset`
+
+    Returns (name, offset just past the name in the original position). Names
+    come back lower-cased without a trailing dot; the root is ''.
+    """
+    labels = []
+    end = None
+    total = 0
+    size = len(buf)
+    segment = offset
+    while True:
+        if offset >= size:
+            raise DNSError("name runs past end of message")
+        length = buf[offset]
+        if length >= 0xC0:
+            if offset + 1 >= size:
+                raise DNSError("truncated compression pointer")
+            pointer = ((length & 0x3F) << 8) | buf[offset + 1]
+            # Each jump must land before the previous segment (and past the header),
+            # so targets strictly decrease and loops are impossible
+            if pointer >= segment or pointer < 12:
+                raise DNSError("bad compression pointer")
+            if end is None:
+                end = offset + 2
+            offset = segment = pointer
+            continue
+        if length & 0xC0:
+            raise DNSError("reserved label type")
+        offset += 1
+        if length == 0:
+            break
+        if offset + length > size:
+            raise DNSError("label runs past end of message")
+        total += length + 1
+        if total > MAX_NAME_LENGTH:
+            raise DNSError("name too long")
+        labels.append(bytes(buf[offset:offset + length]))
+        offset += length
+
+    name = b'.'.join(labels).decode('latin-1').lower()
+    return name, end if end is not None else offset
+
+
+def parse_options(rdata):
+    """Split OPT rdata into [(code, memoryview)]"""
+    options = []
+    offset = 0
+    while offset < len(rdata):
+        if offset + 4 > len(rdata):
+            raise DNSError("truncated EDNS option")
+        code, length = _OPTION.unpack_from(rdata, offset)
+        offset += 4
+        if offset + length > len(rdata):
+            raise DNSError("EDNS option runs past OPT record")
+        options.append((code, rdata[offset:offset + length]))
+        offset += length
+    return options
+
+
+def _expand_rdata(buf, rtype, offset, rdlength):
+    """Copy rdata with any embedded names decompressed so it stands alone"""
+    end = offset + rdlength
+    if rtype in (TYPE_CNAME, TYPE_NS, TYPE_PTR):
+        fixed, names, tail = 0, 1, 0
+    elif rtype == TYPE_MX:
+        fixed, names, tail = 2, 1, 0
+    elif rtype == TYPE_SRV:
+        fixed, names, tail = 6, 1, 0
+    elif rtype == TYPE_SOA:
+        fixed, names, tail = 0, 2, 20
+    else:
+        return bytes(buf[offset:end])
+
+    if offset + fixed > end:
+        raise DNSError("truncated rdata")
+    out = bytes(buf[offset:offset + fixed])
+    pos = offset + fixed
+    for _ in range(names):
+        name, pos = read_name(buf, pos)
+        out += encode_name(name)
+    if pos + tail != end:
+        raise DNSError("rdata length mismatch")
+    return out + bytes(buf[pos:end])
+
+
+def parse_message(data, expand_names=False):
+    """Parse a full DNS message without copying record data
+
+    rdata fields are memoryview slices of `data`; names inside them are left
+    encoded (and may point back into the message). With `expand_names`, rdata
+    of name-bearing types is copied out decompressed instead, so the records
+    can be cached and re-encoded into other messages. Raises DNSError.
+    """
+    buf = memoryview(data)
+    if len(buf) < 12:
+        raise DNSError("message shorter than header")
+    header = Header(*_HEADER.unpack_from(buf, 0))
+    offset = 12
+
+    questions = []
+    for _ in range(header.qdcount):
+        name, offset = read_name(buf, offset)
+        if offset + 4 > len(buf):
+            raise DNSError("truncated question")
+        qtype, qclass = _QUESTION.unpack_from(buf, offset)
+        offset += 4
+        questions.append(Question(name, qtype, qclass))
+    question_end = offset
+
+    edns = None
+    sections = []
+    for section, count in enumerate((header.ancount, header.nscount, header.arcount)):
+        records = []
+        for _ in range(count):
+            name, offset = read_name(buf, offset)
+            if offset + 10 > len(buf):
+                raise DNSError("truncated resource record")
+            rtype, rclass, ttl, rdlength = _RR.unpack_from(buf, offset)
+            offset += 10
+            if offset + rdlength > len(buf):
+                raise DNSError("rdata runs past end of message")
+            if expand_names and rtype != TYPE_OPT:
+                rdata = _expand_rdata(buf, rtype, offset, rdlength)
+            else:
+                rdata = buf[offset:offset + rdlength]
+            offset += rdlength
+
+            if rtype == TYPE_OPT:
+                if section != 2 or edns is not None or name:
+                    raise DNSError("misplaced or duplicate OPT record")
+                edns = Edns(max(rclass, CLASSIC_UDP_PAYLOAD), (ttl >> 16) & 0xFF,
+                            bool(ttl & 0x8000), parse_options(rdata))
+                continue
+            records.append(ResourceRecord(name, rtype, rclass, ttl, rdata))
+        sections.append(records)
+
+    return Message(header, questions, sections[0], sections[1], sections[2], edns, question_end)
+
+
+def encode_name(name, compress=None, offset=0):
+    """Encode `name`, pointing at known suffixes in `compress` ({name: offset})
+
+    When `compress` is given, suffixes written here are added to it, with
+    `offset` being where the encoded name will start in the message.
+    """
+    labels = [label for label in name.strip('.').split('.') if label]
+    out = bytearray()
+    for i in range(len(labels)):
+        if compress is not None:
+            suffix = '.'.join(labels[i:]).lower()
+            pointer = compress.get(suffix)
+            if pointer is not None:
+                out += _POINTER.pack(0xC000 | pointer)
+                return bytes(out)
+            if offset + len(out) < 0x3FFF:
+                compress[suffix] = offset + len(out)
+        label = labels[i].encode('latin-1')
+        if len(label) > MAX_LABEL_LENGTH:
+            raise DNSError(f"label too long: {labels[i][:20]}...")
+        out.append(len(label))
+        out += label
+    out.append(0)
+    if len(out) > MAX_NAME_LENGTH:
+        raise DNSError("name too long")
+    return bytes(out)
+
+
+def encode_rdata(rtype, value):
+    """Encode zone-file style text rdata for the record types we serve"""
+    fields = value.split()
+    try:
+        if rtype == TYPE_A:
+            return socket.inet_pton(socket.AF_INET, value)
+        if rtype == TYPE_AAAA:
+            return socket.inet_pton(socket.AF_INET6, value)
+        if rtype in (TYPE_CNAME, TYPE_NS, TYPE_PTR):
+            return encode_name(value)
+        if rtype == TYPE_MX:
+            return struct.pack('!H', int(fields[0])) + encode_name(fields[1])
+        if rtype == TYPE_SRV:
+            priority, weight, port, target = fields
+            return struct.pack('!HHH', int(priority), int(weight), int(port)) + encode_name(target)
+        if rtype == TYPE_SOA:
+            mname, rname = fields[:2]
+            timers = struct.pack('!IIIII', *(int(f) for f in fields[2:7]))
+            return encode_name(mname) + encode_name(rname) + timers
+        if rtype == TYPE_TXT:
+            text = value.strip('"').encode()
+            return b''.join(bytes([len(chunk)]) + chunk
+                            for chunk in (text[i:i + 255] for i in range(0, len(text), 255))) or b'\x00'
+    except (OSError, ValueError, IndexError, struct.error) as e:
+        raise DNSError(f"bad {TYPE_NAMES.get(rtype, rtype)} rdata {value!r}: {e}")
+    raise DNSError(f"unsupported record type {rtype}")
+
+
+def rdata_to_text(rtype, rdata):
+    """Best-effort text form of rdata, for logs"""
+    if rtype == TYPE_A and len(rdata) == 4:
+        return socket.inet_ntop(socket.AF_INET, bytes(rdata))
+    if rtype == TYPE_AAAA and len(rdata) == 16:
+        return socket.inet_ntop(socket.AF_INET6, bytes(rdata))
+    if rtype in (TYPE_CNAME, TYPE_NS, TYPE_PTR):
+        try:
+            return read_name(b'\x00' * 12 + bytes(rdata), 12)[0]
+        except DNSError:
+            pass
+    return bytes(rdata).hex()
+
+
+def soa_minimum(rdata):
+    """The MINIMUM field of SOA rdata, used as the negative-caching TTL"""
+    return struct.unpack('!I', bytes(rdata[-4:]))[0]
+
+
+def make_record(name, rtype, ttl, value):
+    """ResourceRecord from text, with rdata encoded once up front"""
+    return ResourceRecord(name.lower().rstrip('.'), rtype, CLASS_IN, ttl, encode_rdata(rtype, value))
+
+
+def _encode_records(out, records, compress):
+    for rr in records:
+        out += encode_name(rr.name, compress, len(out))
+        out += _RR.pack(rr.rtype, rr.rclass, rr.ttl, len(rr.rdata))
+        out += rr.rdata
+
+
+def build_response(query, data, answers=(), authority=(), rcode=RCODE_NOERROR,
+                   authoritative=False, max_size=None):
+    """Encode a response to the parsed `query`, echoing its question section verbatim
+
+    The question bytes are copied from `data` as sent, so 0x20 case
+    randomisation survives. Answer owner names are compressed against the
+    first question. If the response would not fit the client's UDP limit the
+    record sections are dropped and TC is set so it retries over TCP.
+    """
+    flags = FLAG_QR | FLAG_RA | (query.header.flags & (OPCODE_MASK | FLAG_RD)) | (rcode & 0x000F)
+    if authoritative:
+        flags |= FLAG_AA
+
+    out = bytearray(12)
+    out += memoryview(data)[12:query.question_end]
+    compress = {}
+    if query.questions:
+        # The first question name is never compressed, so its suffixes sit at known offsets
+        starts = []
+        offset = 12
+        while out[offset]:
+            starts.append(offset)
+            offset += out[offset] + 1
+        labels = [bytes(out[o + 1:o + 1 + out[o]]).decode('latin-1').lower() for o in starts]
+        for i, start in enumerate(starts):
+            compress['.'.join(labels[i:])] = start
+    records_start = len(out)
+
+    _encode_records(out, answers, compress)
+    _encode_records(out, authority, compress)
+
+    if max_size is None:
+        max_size = query.edns.payload_size if query.edns else CLASSIC_UDP_PAYLOAD
+    opt = b''
+    if query.edns is not None:
+        opt = b'\x00' + _RR.pack(TYPE_OPT, EDNS_UDP_PAYLOAD, 0, 0)
+
+    ancount, nscount = len(answers), len(authority)
+    if len(out) + len(opt) > max_size:
+        del out[records_start:]
+        flags |= FLAG_TC
+        ancount = nscount = 0
+    out += opt
+
+    _HEADER.pack_into(out, 0, query.header.id, flags, len(query.questions), ancount, nscount, 1 if opt else 0)
+    return bytes(out)
+
+
+def error_response(data, rcode):
+    """Echo a query back as a response carrying `rcode`, or None if too short
+
+    Works on unparsed bytes so it stays cheap under overload and for garbage.
+    """
+    if len(data) < 12:
+        return None
+    # QR set, opcode and RD copied, RA set
+    flags = bytes([0x80 | (data[2] & 0x79), 0x80 | rcode])
+    return bytes(data[:2]) + flags + bytes(data[4:])
+
+
+def encode_query(query_id, name, qtype, rd=True, edns_payload=None):
+    """Encode a single-question query, optionally with an EDNS0 OPT record"""
+    flags = FLAG_RD if rd else 0
+    out = _HEADER.pack(query_id, flags, 1, 0, 0, 1 if edns_payload else 0)
+    out += encode_name(name) + _QUESTION.pack(qtype, CLASS_IN)
+    if edns_payload:
+        out += b'\x00' + _RR.pack(TYPE_OPT, edns_payload, 0, 0)
+    return out
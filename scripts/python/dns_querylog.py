@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+BlackRoad DNS query log
+Non-blocking structured query logging with a batching, rotating JSONL writer
+"""
+
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+from pathlib import Path
+
+from dns_codec import TYPE_NAMES
+
+QUERY_LOG = Path(os.environ.get('BLACKROAD_DNS_QUERY_LOG', Path.home() / ".blackroad" / "dns-queries.jsonl"))
+
+FLUSH_INTERVAL = 1.0
+AGGREGATE_INTERVAL = 60
+MAX_PENDING = 100000
+MAX_BYTES = 64 * 1024 * 1024
+BACKUPS = 5
+
+
+class QueryLog:
+    """Structured query log fed from the response path
+
+    record() is a sampling check plus a deque append - no locks, no I/O - so
+    answering never waits on logging; when the writer falls behind records
+    are counted as dropped instead. A background thread drains the deque in
+    batches into a JSONL file that rotates at `max_bytes`.
+
+    With `aggregate`, the writer emits one line per (name, qtype, rcode) per
+    `aggregate_interval` instead of one per query. Every line carries a
+    weight `w` so counts stay correct under sampling.
+    """
+
+    def __init__(self, path=QUERY_LOG, sample_rate=1.0, aggregate=False,
+                 flush_interval=FLUSH_INTERVAL, aggregate_interval=AGGREGATE_INTERVAL,
+                 max_pending=MAX_PENDING, max_bytes=MAX_BYTES, backups=BACKUPS):
+        self.path = Path(path)
+        self.sample_rate = sample_rate
+        self.weight = 1.0 / sample_rate if sample_rate > 0 else 0.0
+        self.aggregate = aggregate
+        self.flush_interval = flush_interval
+        self.aggregate_interval = aggregate_interval
+        self.max_pending = max_pending
+        self.max_bytes = max_bytes
+        self.backups = backups
+
+        self._pending = deque()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._file = None
+        self._counts = {}
+        self._window = None
+
+        self.written = 0
+        self.dropped = 0
+
+    def start(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, 'a')
+        self._thread.start()
+        return self
+
+    def close(self):
+        """Stop the writer after a final flush (including a partial aggregate window)"""
+        self._stop.set()
+        self._thread.join()
+
+    def record(self, client, name, qtype, rcode, answers, latency_us):
+        """Queue one query for logging; never blocks"""
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return
+        if len(self._pending) >= self.max_pending:
+            self.dropped += 1
+            return
+        self._pending.append((time.time(), client, name, qtype, rcode, answers, latency_us))
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self._flush()
+        self._flush(final=True)
+        self._file.close()
+
+    def _drain(self):
+        batch = []
+        pending = self._pending
+        while pending:
+            batch.append(pending.popleft())
+        return batch
+
+    def _flush(self, final=False):
+        batch = self._drain()
+        if self.aggregate:
+            lines = self._aggregate(batch, final)
+        else:
+            lines = [json.dumps({'ts': round(ts, 3), 'client': client, 'name': name,
+                                 'qtype': TYPE_NAMES.get(qtype, qtype),
+                                 'rcode': rcode, 'answers': answers, 'us': latency_us, 'w': self.weight})
+                     for ts, client, name, qtype, rcode, answers, latency_us in batch]
+        if not lines:
+            return
+        self._file.write('\n'.join(lines) + '\n')
+        self._file.flush()
+        self.written += len(lines)
+        if self._file.tell() >= self.max_bytes:
+            self._rotate()
+
+    def _aggregate(self, batch, final):
+        """Fold a batch into the current window; return lines for closed windows"""
+        lines = []
+        for ts, _, name, qtype, rcode, _, latency_us in batch:
+            window = int(ts // self.aggregate_interval) * self.aggregate_interval
+            if self._window is not None and window > self._window:
+                lines += self._emit_window()
+            if self._window is None or window > self._window:
+                self._window = window
+            counts = self._counts.setdefault((name, qtype, rcode), [0, 0])
+            counts[0] += 1
+            counts[1] += latency_us
+
+        now_window = int(time.time() // self.aggregate_interval) * self.aggregate_interval
+        if self._window is not None and (final or now_window > self._window):
+            lines += self._emit_window()
+        return lines
+
+    def _emit_window(self):
+        lines = [json.dumps({'ts': self._window, 'interval': self.aggregate_interval, 'name': name,
+                             'qtype': TYPE_NAMES.get(qtype, qtype), 'rcode': rcode, 'count': count * self.weight,
+                             'us': round(us_total / count), 'w': self.weight})
+                 for (name, qtype, rcode), (count, us_total) in self._counts.items()]
+        self._counts = {}
+        self._window = None
+        return lines
+
+    def _rotate(self):
+        self._file.close()
+        for i in range(self.backups - 1, 0, -1):
+            older = self.path.with_name(f"{self.path.name}.{i}")
+            if older.exists():
+                older.replace(self.path.with_name(f"{self.path.name}.{i + 1}"))
+        if self.backups > 0:
+            self.path.replace(self.path.with_name(f"{self.path.name}.1"))
+        else:
+            self.path.unlink()
+        self._file = open(self.path, 'a')
+
+
+def log_files(path=QUERY_LOG):
+    """The live log and its rotated backups, oldest first"""
+    path = Path(path)
+    backups = sorted(path.parent.glob(f"{path.name}.*"),
+                     key=lambda p: int(p.suffix[1:]) if p.suffix[1:].isdigit() else 0, reverse=True)
+    return [p for p in backups if p.suffix[1:].isdigit()] + ([path] if path.exists() else [])
+
+
+def iter_records(path=QUERY_LOG):
+    """Yield every record across the live log and its backups, skipping torn lines"""
+    for log_file in log_files(path):
+        with open(log_file) as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+BlackRoad DNS upstream forwarding
+UDP queries with TCP fallback over persistent, pipelined TCP connections
+"""
+
+import secrets
+import socket
+import struct
+import threading
+import time
+
+import dns_codec
+from dns_codec import DNSError, EDNS_UDP_PAYLOAD, FLAG_TC, RCODE_NOTIMP, RCODE_REFUSED, RCODE_SERVFAIL
+
+DNS_PORT = 53
+UPSTREAM_TIMEOUT = 2.0
+
+_LENGTH = struct.Struct('!H')
+
+
+class UpstreamError(Exception):
+    """No usable answer from any upstream (timeout, refusal or garbage)"""
+
+
+def parse_address(text, default_port=DNS_PORT):
+    """'1.1.1.1', '1.1.1.1:5353' or '[::1]:53' -> (host, port)"""
+    if text.startswith('['):
+        host, _, port = text[1:].partition(']')
+        port = port.lstrip(':')
+    elif text.count(':') == 1:
+        host, port = text.split(':')
+    else:
+        host, port = text, ''
+    return host, int(port) if port else default_port
+
+
+def _recv_exact(sock, size):
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("upstream closed the connection")
+        data += chunk
+    return bytes(data)
+
+
+class TCPUpstream:
+    """One persistent TCP connection to an upstream, shared by all workers
+
+    Queries are written back to back without waiting for earlier answers; a
+    reader thread hands each response to its caller by message ID, so many
+    lookups pipeline over a single connection. A dropped connection fails its
+    in-flight queries and is reopened by the next query. Writes have a
+    kernel send timeout and run outside the state lock, so a stalled
+    upstream cannot block every worker.
+    """
+
+    def __init__(self, address, connect_timeout=UPSTREAM_TIMEOUT):
+        self.address = address
+        self.connect_timeout = connect_timeout
+        self._lock = threading.Lock()
+        self._send_lock = threading.Lock()
+        self._sock = None
+        self._waiters = None
+        self.connects = 0
+
+    def _connect(self):
+        sock = socket.create_connection(self.address, timeout=self.connect_timeout)
+        sock.settimeout(None)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        # Blocking reads for the reader thread, but sends give up
+        seconds = int(self.connect_timeout)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDTIMEO,
+                        struct.pack('ll', seconds, int((self.connect_timeout - seconds) * 1e6)))
+        self._sock = sock
+        self._waiters = {}
+        self.connects += 1
+        threading.Thread(target=self._reader, args=(sock, self._waiters), daemon=True).start()
+
+    def _reader(self, sock, waiters):
+        try:
+            while True:
+                length = _LENGTH.unpack(_recv_exact(sock, 2))[0]
+                data = _recv_exact(sock, length)
+                if len(data) < 2:
+                    continue
+                with self._lock:
+                    waiter = waiters.pop(_LENGTH.unpack_from(data)[0], None)
+                if waiter is not None:
+                    waiter[1] = data
+                    waiter[0].set()
+        except OSError:
+            pass
+        finally:
+            with self._lock:
+                if self._sock is sock:
+                    self._sock = None
+                pending = list(waiters.values())
+                waiters.clear()
+            for event, _ in pending:
+                event.set()
+            sock.close()
+
+    def _drop(self, sock):
+        """Forget a failed connection; its reader fails the in-flight queries"""
+        with self._lock:
+            if self._sock is sock:
+                self._sock = None
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        sock.close()
+
+    def query(self, message, timeout):
+        """Send one query and wait for the response with the same ID"""
+        query_id = _LENGTH.unpack_from(message)[0]
+        waiter = [threading.Event(), None]
+        with self._lock:
+            try:
+                if self._sock is None:
+                    self._connect()
+            except OSError as e:
+                raise UpstreamError(f"TCP {self.address[0]}: {e}")
+            if query_id in self._waiters:
+                raise UpstreamError("duplicate in-flight query ID")
+            sock, waiters = self._sock, self._waiters
+            waiters[query_id] = waiter
+        try:
+            with self._send_lock:
+                sock.sendall(_LENGTH.pack(len(message)) + message)
+        except OSError as e:
+            # A partly written frame leaves the stream unusable
+            self._drop(sock)
+            raise UpstreamError(f"TCP {self.address[0]}: {e}")
+
+        if not waiter[0].wait(timeout):
+            with self._lock:
+                waiters.pop(query_id, None)
+            raise UpstreamError(f"TCP {self.address[0]}: timed out")
+        if waiter[1] is None:
+            raise UpstreamError(f"TCP {self.address[0]}: connection closed")
+        return waiter[1]
+
+
+class Forwarder:
+    """Forward questions to a list of upstream resolvers
+
+    UDP goes first, from a fresh socket (new ephemeral source port) with a
+    random query ID from the secrets module each time, so off-path spoofing
+    has to guess both; truncated answers are retried over that upstream's
+    pipelined TCP connection. Upstreams are tried in order starting from the
+    last one that answered, and SERVFAIL/REFUSED/NOTIMP count as failures.
+    """
+
+    def __init__(self, upstreams, timeout=UPSTREAM_TIMEOUT):
+        if not upstreams:
+            raise ValueError("Forwarder needs at least one upstream")
+        self.upstreams = list(upstreams)
+        self.timeout = timeout
+        self.tcp = {address: TCPUpstream(address, timeout) for address in self.upstreams}
+        self._preferred = 0
+        self.stats = {'udp': 0, 'tcp': 0, 'failures': 0}
+
+    def _udp_query(self, address, message):
+        family = socket.AF_INET6 if ':' in address[0] else socket.AF_INET
+        deadline = time.monotonic() + self.timeout
+        try:
+            with socket.socket(family, socket.SOCK_DGRAM) as sock:
+                # Connected, so the kernel drops datagrams from other sources
+                sock.connect(address)
+                sock.send(message)
+                while True:
+                    sock.settimeout(max(deadline - time.monotonic(), 0.001))
+                    data = sock.recv(65535)
+                    # Wrong IDs are spoof attempts; keep waiting until the deadline
+                    if data[:2] == message[:2]:
+                        return data
+        except OSError as e:
+            raise UpstreamError(f"UDP {address[0]}: {e}")
+
+    def _ask(self, address, name, qtype):
+        message = dns_codec.encode_query(secrets.randbits(16), name, qtype, edns_payload=EDNS_UDP_PAYLOAD)
+        self.stats['udp'] += 1
+        data = self._udp_query(address, message)
+        response = dns_codec.parse_message(data, expand_names=True)
+        if response.header.flags & FLAG_TC:
+            self.stats['tcp'] += 1
+            data = self.tcp[address].query(message, self.timeout)
+            response = dns_codec.parse_message(data, expand_names=True)
+
+        if not response.questions or response.questions[0][:2] != (name, qtype):
+            raise UpstreamError(f"{address[0]}: answer does not match question")
+        if dns_codec.rcode_of(response.header.flags) in (RCODE_SERVFAIL, RCODE_REFUSED, RCODE_NOTIMP):
+            raise UpstreamError(f"{address[0]}: rcode {dns_codec.rcode_of(response.header.flags)}")
+        return response
+
+    def query(self, name, qtype):
+        """Parsed upstream response for one question; raises UpstreamError"""
+        errors = []
+        start = self._preferred
+        for i in range(len(self.upstreams)):
+            index = (start + i) % len(self.upstreams)
+            try:
+                response = self._ask(self.upstreams[index], name, qtype)
+            except (UpstreamError, DNSError) as e:
+                errors.append(str(e))
+                continue
+            self._preferred = index
+            return response
+
+        self.stats['failures'] += 1
+        raise UpstreamError('; '.join(errors))
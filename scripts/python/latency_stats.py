@@ -0,0 +1,16 @@
+#!/usr/bin/env python3
+"""
+BlackRoad latency statistics
+Summary helpers shared by the cluster and DNS benchmarks and reports
+"""
+
+import math
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
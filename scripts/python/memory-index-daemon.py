@@ -1,17 +1,25 @@
 #!/usr/bin/env python3
 """
 BlackRoad Memory Index Auto-Update Daemon
-Watches journal file and automatically updates search index when new entries are added.
+Tails the journal file and indexes new entries in-process as they are appended.
 """
 
+import ctypes
+import ctypes.util
+import hashlib
+import json
 import os
+import select
+import sqlite3
 import sys
 import time
 import signal
-import subprocess
+from collections import deque
 from pathlib import Path
 from datetime import datetime
-import hashlib
+
+from memory_index import (complete_end, fts_segments, index_entries, last_line, load_checkpoint,
+                          open_index, parse_journal_line, rebuild_index)
 
 # Configuration
 MEMORY_DIR = Path.home() / ".blackroad" / "memory"
@@ -19,11 +27,25 @@ JOURNAL_FILE = MEMORY_DIR / "journals" / "master-journal.jsonl"
 INDEX_DB = MEMORY_DIR / "memory-index.db"
 PID_FILE = MEMORY_DIR / "memory-index-daemon.pid"
 LOG_FILE = MEMORY_DIR / "memory-index-daemon.log"
-INDEXER_SCRIPT = Path.home() / "memory-indexer.py"
+STATUS_FILE = MEMORY_DIR / "memory-index-daemon.status.json"
 
 # Settings
-CHECK_INTERVAL = 5  # seconds between checks
-BATCH_DELAY = 2     # seconds to wait before indexing (batch multiple writes)
+CHECK_INTERVAL = 1     # seconds between checks when no change is reported
+POLL_INTERVAL = 0.25   # stat() interval when inotify is unavailable
+BATCH_DELAY = 0.1      # seconds to wait after a change (batch multiple writes)
+READ_CHUNK = 8 * 1024 * 1024  # journal bytes indexed per transaction
+RATE_WINDOW = 60       # seconds of batches behind entries_per_sec
+LAG_WARN_SECONDS = 10  # status warns once the index is this far behind
+STATUS_HEARTBEAT = 30  # seconds between status rewrites while nothing changes
+
+# inotify(7) event bits
+IN_MODIFY = 0x002
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_FROM = 0x040
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
 
 # ANSI Colors
 GREEN = '\033[0;32m'
@@ -32,13 +54,208 @@ CYAN = '\033[0;36m'
 RED = '\033[0;31m'
 NC = '\033[0m'
 
+class InotifyWatcher:
+    """Wakes when anything in the journal directory is written, created or renamed"""
+    name = "inotify"
+
+    def __init__(self, directory):
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        if libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, f"inotify_add_watch failed on {directory}")
+
+    def wait(self, timeout):
+        """True if events arrived within timeout; drains them"""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return False
+        try:
+            while os.read(self.fd, 65536):
+                pass
+        except BlockingIOError:
+            pass
+        return True
+
+    def close(self):
+        os.close(self.fd)
+
+class PollingWatcher:
+    """stat() fallback where inotify is not available"""
+    name = "polling"
+
+    def __init__(self, path):
+        self.path = path
+        self.last = self.snapshot()
+
+    def snapshot(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return st.st_ino, st.st_size, st.st_mtime_ns
+
+    def wait(self, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            current = self.snapshot()
+            if current != self.last:
+                self.last = current
+                return True
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            time.sleep(min(POLL_INTERVAL, remaining))
+
+    def close(self):
+        pass
+
+def line_hash(line):
+    return hashlib.sha256(line).hexdigest()
+
+class JournalTail:
+    """Complete lines appended to the journal, resumable from a checkpoint
+
+    The position is the byte offset just past the last indexed line, and is
+    only trusted while the file has the same inode and the line before it
+    still hashes the same. A partial last line is read again once its
+    newline arrives. After a rename the old file is drained to its end
+    before the new one is read. read() does not move the position; commit()
+    does, once the lines are indexed.
+    """
+
+    def __init__(self, path, checkpoint=None, log=print):
+        self.path = path
+        self.log = log
+        self.file = None
+        checkpoint = checkpoint or {}
+        self.inode = checkpoint.get('inode')
+        self.offset = checkpoint.get('offset', 0)
+        self.line_hash = checkpoint.get('line_hash')
+        self.remaining = 0
+        self._next = None
+
+    def checkpoint(self):
+        """Position after the last read(), to be saved with its entries"""
+        inode, offset, digest = self._next or (self.inode, self.offset, self.line_hash)
+        return {'journal': str(self.path), 'inode': inode, 'offset': offset, 'line_hash': digest}
+
+    def commit(self):
+        if self._next:
+            self.inode, self.offset, self.line_hash = self._next
+            self._next = None
+
+    def close(self):
+        if self.file:
+            self.file.close()
+            self.file = None
+
+    def verified(self):
+        if self.offset == 0:
+            return True
+        if os.fstat(self.file.fileno()).st_size < self.offset:
+            return False
+        return line_hash(last_line(self.file, self.offset)) == self.line_hash
+
+    def find_rotated(self):
+        """The checkpointed inode under a rotated name (master-journal.jsonl.1 etc)"""
+        for sibling in sorted(self.path.parent.glob(self.path.name + '?*')):
+            try:
+                if sibling.stat().st_ino == self.inode:
+                    return sibling
+            except OSError:
+                continue
+        return None
+
+    def lag_bytes(self):
+        """Complete journal lines not yet indexed, in bytes, including a rotated
+        file still being drained; a partial last line is not lag until its
+        newline arrives"""
+        if self.file is None:
+            return max(0, self.complete_size(self.path) - self.offset)
+        size = os.fstat(self.file.fileno()).st_size
+        pending = max(0, complete_end(self.file, size) - self.offset) if size > self.offset else 0
+        return pending + self.complete_size(self.path) if self.replaced() else pending
+
+    @staticmethod
+    def complete_size(path):
+        """Bytes up to the last newline of the file at path (0 if missing)"""
+        try:
+            with open(path, 'rb') as f:
+                return complete_end(f, os.fstat(f.fileno()).st_size)
+        except FileNotFoundError:
+            return 0
+
+    def replaced(self):
+        """True once the path names a different file than the one being read"""
+        try:
+            return os.stat(self.path).st_ino != os.fstat(self.file.fileno()).st_ino
+        except FileNotFoundError:
+            return False
+
+    def open(self):
+        try:
+            f = open(self.path, 'rb')
+        except FileNotFoundError:
+            return None
+        inode = os.fstat(f.fileno()).st_ino
+        if self.inode is not None and inode != self.inode:
+            rotated = self.find_rotated()
+            if rotated:
+                f.close()
+                f, inode = open(rotated, 'rb'), self.inode
+                self.log(f"Finishing rotated journal {rotated.name} from byte {self.offset}")
+            else:
+                self.log("Journal was replaced, indexing the new file from the start", "WARNING")
+                self.offset, self.line_hash = 0, None
+        self.inode = inode
+        return f
+
+    def read(self, limit=READ_CHUNK):
+        self._next = None
+        if self.file is None:
+            self.file = self.open()
+            if self.file is None:
+                self.remaining = 0
+                return []
+        if not self.verified():
+            self.log("Journal truncated or rewritten, re-reading from the start "
+                     "(entries already indexed are skipped)", "WARNING")
+            self.offset, self.line_hash = 0, None
+        size = os.fstat(self.file.fileno()).st_size
+        self.file.seek(self.offset)
+        data = self.file.read(limit)
+        if len(data) == limit and not data.endswith(b'\n'):
+            data += self.file.readline()  # finish a line longer than the chunk
+        end = data.rfind(b'\n') + 1
+        self.remaining = max(0, size - self.offset - len(data))
+        if end:
+            lines = data[:end - 1].split(b'\n')
+            self._next = (self.inode, self.offset + end, line_hash(lines[-1]))
+            return lines
+        if self.replaced():
+            # Rotated and fully read: move on to the file now at the path
+            self.close()
+            self.inode, self.offset, self.line_hash = None, 0, None
+            self.remaining = 1
+        return []
+
 class MemoryIndexDaemon:
     def __init__(self):
         self.running = False
-        self.last_size = 0
-        self.last_mtime = 0
-        self.pending_update = False
-        self.update_scheduled_at = 0
+        self.conn = None
+        self.watcher = None
+        self.tail = None
+        self.started_at = time.time()
+        self.indexed_total = 0
+        self.batches = deque()  # (time, entries) within RATE_WINDOW
+        self.last_batch = None
+        self.behind_since = None
+        self.segments = (None, 0)  # (conn.total_changes, fts_segments) when last decoded
+        self.status = None         # last metrics written to the status file
         
     def log(self, message, level="INFO"):
         """Log message to file and optionally stdout"""
@@ -98,62 +315,95 @@ class MemoryIndexDaemon:
         except Exception:
             return False
     
-    def get_file_info(self):
-        """Get journal file size and modification time"""
-        if not JOURNAL_FILE.exists():
-            return 0, 0
-        
-        stat = JOURNAL_FILE.stat()
-        return stat.st_size, stat.st_mtime
-    
-    def run_indexer(self):
-        """Run memory-indexer.py update"""
+    def open_watcher(self):
+        """inotify on the journal directory, or stat() polling without it"""
         try:
-            self.log("Running index update...")
-            result = subprocess.run(
-                [sys.executable, str(INDEXER_SCRIPT), 'update'],
-                capture_output=True,
-                text=True,
-                timeout=30
-            )
-            
-            if result.returncode == 0:
-                # Parse output for indexed count
-                output = result.stdout
-                if 'new entries' in output:
-                    for line in output.split('\n'):
-                        if 'Indexed' in line and 'new entries' in line:
-                            self.log(f"✓ {line.strip()}")
-                            break
-                else:
-                    self.log("✓ Index updated (no new entries)")
-            else:
-                self.log(f"Indexer failed: {result.stderr}", "ERROR")
-                
-        except subprocess.TimeoutExpired:
-            self.log("Indexer timeout", "ERROR")
-        except Exception as e:
-            self.log(f"Indexer error: {e}", "ERROR")
+            return InotifyWatcher(JOURNAL_FILE.parent)
+        except (OSError, AttributeError) as e:
+            self.log(f"inotify unavailable ({e}), polling every {POLL_INTERVAL}s", "WARNING")
+            return PollingWatcher(JOURNAL_FILE)
     
-    def check_and_update(self):
-        """Check for changes and schedule update if needed"""
-        current_size, current_mtime = self.get_file_info()
-        
-        # Check if file has changed
-        if current_size != self.last_size or current_mtime != self.last_mtime:
-            if not self.pending_update:
-                self.log(f"Journal changed (size: {current_size} bytes)")
-                self.pending_update = True
-                self.update_scheduled_at = time.time() + BATCH_DELAY
-            
-            self.last_size = current_size
-            self.last_mtime = current_mtime
-        
-        # Check if it's time to run scheduled update
-        if self.pending_update and time.time() >= self.update_scheduled_at:
-            self.run_indexer()
-            self.pending_update = False
-            self.update_scheduled_at = 0
+    def index_pending(self):
+        """Index every complete line appended since the last batch"""
+        while True:
+            lines = self.tail.read()
+            if lines:
+                started = time.perf_counter()
+                entries = [e for e in map(parse_journal_line, lines) if e]
+                try:
+                    added = index_entries(self.conn, entries, self.tail.checkpoint())
+                except sqlite3.Error as e:
+                    self.log(f"Index update failed: {e}", "ERROR")
+                    return
+                elapsed = (time.perf_counter() - started) * 1000
+                self.record_batch(added, len(lines), elapsed)
+                skipped = len(lines) - len(entries)
+                note = f", {skipped} unparseable" if skipped else ""
+                self.log(f"✓ Indexed {added} new entries from {len(lines)} lines{note} ({elapsed:.0f} ms)")
+            self.tail.commit()
+            if not self.tail.remaining:
+                return
+    
+    def record_batch(self, added, lines, elapsed_ms):
+        now = time.time()
+        self.indexed_total += added
+        self.batches.append((now, added))
+        self.last_batch = {'at': now, 'entries': added, 'lines': lines, 'ms': round(elapsed_ms, 1)}
+    
+    def metrics(self):
+        """Runtime metrics for the status file"""
+        now = time.time()
+        while self.batches and self.batches[0][0] < now - RATE_WINDOW:
+            self.batches.popleft()
+        window = min(RATE_WINDOW, max(now - self.started_at, 1e-3))
+        lag = self.tail.lag_bytes()
+        if lag and self.behind_since is None:
+            self.behind_since = now
+        elif not lag:
+            self.behind_since = None
+        db_bytes = sum(os.path.getsize(f"{INDEX_DB}{suffix}")
+                       for suffix in ('', '-wal') if os.path.exists(f"{INDEX_DB}{suffix}"))
+        return {
+            'pid': os.getpid(),
+            'updated': now,
+            'started': self.started_at,
+            'watcher': self.watcher.name,
+            'journal': str(JOURNAL_FILE),
+            'offset': self.tail.offset,
+            'lag_bytes': lag,
+            'lag_seconds': round(now - self.behind_since, 1) if self.behind_since else 0.0,
+            'entries_indexed': self.indexed_total,
+            'entries_per_sec': round(sum(n for _, n in self.batches) / window, 2),
+            'last_batch': self.last_batch,
+            'db_bytes': db_bytes,
+            'fts_segments': self.fts_segments(),
+        }
+    
+    def fts_segments(self):
+        """FTS segment count, decoded again only after this connection wrote"""
+        changes = self.conn.total_changes
+        if self.segments[0] != changes:
+            self.segments = (changes, fts_segments(self.conn))
+        return self.segments[1]
+    
+    def write_status(self):
+        """Replace the status file atomically so readers never see half of it
+
+        While nothing changes the file is only rewritten every
+        STATUS_HEARTBEAT seconds, so readers can still tell a stuck daemon.
+        """
+        try:
+            metrics = self.metrics()
+            if self.status:
+                same = {**self.status, 'updated': metrics['updated']} == metrics
+                if same and metrics['updated'] - self.status['updated'] < STATUS_HEARTBEAT:
+                    return
+            tmp = STATUS_FILE.with_suffix('.tmp')
+            tmp.write_text(json.dumps(metrics, indent=2))
+            os.replace(tmp, STATUS_FILE)
+            self.status = metrics
+        except (OSError, sqlite3.Error) as e:
+            self.log(f"Failed to write status: {e}", "WARNING")
     
     def signal_handler(self, signum, frame):
         """Handle shutdown signals"""
@@ -167,13 +417,9 @@ class MemoryIndexDaemon:
             print(f"{RED}[✗]{NC} Daemon already running")
             return 1
         
-        # Check dependencies
-        if not INDEXER_SCRIPT.exists():
-            print(f"{RED}[✗]{NC} Indexer script not found: {INDEXER_SCRIPT}")
-            return 1
-        
         if not JOURNAL_FILE.exists():
             print(f"{YELLOW}[!]{NC} Journal file not found, will wait for it")
+            JOURNAL_FILE.parent.mkdir(parents=True, exist_ok=True)
         
         # Setup signal handlers
         signal.signal(signal.SIGTERM, self.signal_handler)
@@ -182,14 +428,19 @@ class MemoryIndexDaemon:
         # Write PID file
         self.write_pid()
         
-        # Initialize state
-        self.last_size, self.last_mtime = self.get_file_info()
+        # One connection and one watch for the life of the daemon
+        self.conn = open_index(INDEX_DB)
+        self.watcher = self.open_watcher()
+        checkpoint = load_checkpoint(self.conn, JOURNAL_FILE)
+        self.tail = JournalTail(JOURNAL_FILE, checkpoint, self.log)
         self.running = True
         
         self.log("=" * 60)
         self.log("Memory Index Daemon Started")
-        self.log(f"Watching: {JOURNAL_FILE}")
-        self.log(f"Check interval: {CHECK_INTERVAL}s")
+        self.log(f"Watching: {JOURNAL_FILE} ({self.watcher.name})")
+        self.log(f"Index: {INDEX_DB}")
+        if checkpoint:
+            self.log(f"Resuming at byte {checkpoint['offset']} (inode {checkpoint['inode']})")
         self.log(f"Batch delay: {BATCH_DELAY}s")
         self.log("=" * 60)
         
@@ -198,15 +449,23 @@ class MemoryIndexDaemon:
             print(f"{CYAN}[→]{NC} PID: {os.getpid()}")
             print(f"{CYAN}[→]{NC} Log: {LOG_FILE}")
         
-        # Main loop
+        # Main loop: catch up, then index each burst of appends as it lands
         try:
+            self.index_pending()
+            self.write_status()
             while self.running:
-                self.check_and_update()
-                time.sleep(CHECK_INTERVAL)
+                if self.watcher.wait(CHECK_INTERVAL):
+                    time.sleep(BATCH_DELAY)
+                self.index_pending()
+                self.write_status()
         except KeyboardInterrupt:
             self.log("Interrupted by user")
         finally:
+            self.watcher.close()
+            self.tail.close()
+            self.conn.close()
             self.log("Daemon stopped")
+            STATUS_FILE.unlink(missing_ok=True)
             self.remove_pid()
         
         return 0
@@ -239,7 +498,75 @@ def stop_daemon():
         print(f"{RED}[✗]{NC} Failed to stop daemon: {e}")
         return 1
 
-def status_daemon():
+def running_pid():
+    """PID of the running daemon, or None"""
+    try:
+        pid = int(PID_FILE.read_text().strip())
+        os.kill(pid, 0)
+        return pid
+    except (OSError, ValueError):
+        return None
+
+def rebuild(workers=None):
+    """Rebuild the whole index from the journal (the daemon must be stopped)"""
+    pid = running_pid()
+    if pid:
+        # Its tail position and batches would race the rebuilt index
+        print(f"{RED}[✗]{NC} Daemon is running (PID: {pid}); stop it or use: restart --rebuild")
+        return 1
+    if not JOURNAL_FILE.exists():
+        print(f"{RED}[✗]{NC} Journal file not found: {JOURNAL_FILE}")
+        return 1
+    print(f"{CYAN}[→]{NC} Rebuilding {INDEX_DB.name} from {JOURNAL_FILE}...")
+    try:
+        stats = rebuild_index(JOURNAL_FILE, INDEX_DB, workers)
+    except (OSError, sqlite3.Error) as e:
+        print(f"{RED}[✗]{NC} Rebuild failed: {e}")
+        return 1
+    print(f"{GREEN}[✓]{NC} Indexed {stats['rows']:,} entries in {stats['total_s']}s "
+          f"({stats['rows_per_s']:,} rows/s, {stats['ranges']} ranges, load {stats['load_s']}s)")
+    if stats['skipped']:
+        print(f"{YELLOW}[!]{NC} Skipped {stats['skipped']} unparseable lines")
+    return 0
+
+def tail_lines(path, count, block=8192):
+    """Last count lines of a file, read backwards from the end"""
+    with open(path, 'rb') as f:
+        pos = f.seek(0, 2)
+        data = b''
+        while pos > 0 and data.count(b'\n') <= count:
+            step = min(block, pos)
+            pos -= step
+            f.seek(pos)
+            data = f.read(step) + data
+    lines = data.decode('utf-8', errors='replace').splitlines()
+    return lines[-count:] if count > 0 else []
+
+def read_status():
+    try:
+        return json.loads(STATUS_FILE.read_text())
+    except (OSError, ValueError):
+        return None
+
+def print_metrics(metrics):
+    """Human-readable metrics from the status file"""
+    age = time.time() - metrics['updated']
+    batch = metrics.get('last_batch')
+    print(f"{CYAN}[→]{NC} Watcher: {metrics['watcher']}, offset {metrics['offset']:,}")
+    print(f"{CYAN}[→]{NC} Lag: {metrics['lag_bytes']:,} bytes, {metrics['lag_seconds']}s")
+    print(f"{CYAN}[→]{NC} Rate: {metrics['entries_per_sec']} entries/s "
+          f"({metrics['entries_indexed']:,} since start)")
+    if batch:
+        print(f"{CYAN}[→]{NC} Last batch: {batch['entries']} entries from {batch['lines']} lines "
+              f"in {batch['ms']} ms, {time.time() - batch['at']:.0f}s ago")
+    print(f"{CYAN}[→]{NC} Index: {metrics['db_bytes'] / 1048576:.1f} MiB, "
+          f"{metrics['fts_segments']} FTS segments")
+    if age > STATUS_HEARTBEAT + 5 * CHECK_INTERVAL:
+        print(f"{YELLOW}[!]{NC} Status is {age:.0f}s old, the daemon may be stuck")
+    if metrics['lag_seconds'] > LAG_WARN_SECONDS:
+        print(f"{YELLOW}[!]{NC} Index is falling behind the journal")
+
+def status_daemon(as_json=False):
     """Check daemon status"""
     if not PID_FILE.exists():
         print(f"{YELLOW}[STATUS]{NC} Daemon is not running")
@@ -251,17 +578,21 @@ def status_daemon():
         
         try:
             os.kill(pid, 0)
+            metrics = read_status()
+            if as_json:
+                print(json.dumps(metrics or {'pid': pid}, indent=2))
+                return 0
             print(f"{GREEN}[STATUS]{NC} Daemon is running")
             print(f"{CYAN}[→]{NC} PID: {pid}")
             print(f"{CYAN}[→]{NC} Log: {LOG_FILE}")
+            if metrics:
+                print_metrics(metrics)
             
             # Show recent log entries
             if LOG_FILE.exists():
                 print(f"\n{CYAN}Recent log entries:{NC}")
-                with open(LOG_FILE, 'r') as f:
-                    lines = f.readlines()
-                    for line in lines[-5:]:
-                        print(f"  {line.rstrip()}")
+                for line in tail_lines(LOG_FILE, 5):
+                    print(f"  {line}")
             
             return 0
         except OSError:
@@ -298,13 +629,10 @@ def show_logs(follow=False, lines=20):
         return 0
     else:
         # Show last N lines
-        with open(LOG_FILE, 'r') as f:
-            all_lines = f.readlines()
-            recent = all_lines[-lines:] if len(all_lines) > lines else all_lines
-            
-            print(f"{CYAN}Last {len(recent)} log entries:{NC}\n")
-            for line in recent:
-                print(line.rstrip())
+        recent = tail_lines(LOG_FILE, lines)
+        print(f"{CYAN}Last {len(recent)} log entries:{NC}\n")
+        for line in recent:
+            print(line)
         return 0
 
 def main():
@@ -318,9 +646,11 @@ Examples:
   memory-index-daemon.py start              # Start daemon in background
   memory-index-daemon.py start --foreground # Start in foreground (testing)
   memory-index-daemon.py stop               # Stop daemon
-  memory-index-daemon.py status             # Check if running
+  memory-index-daemon.py status             # Check if running, with lag and rates
+  memory-index-daemon.py status --json      # Metrics as JSON (for monitoring)
   memory-index-daemon.py logs               # Show recent logs
   memory-index-daemon.py logs --follow      # Follow logs in real-time
+  memory-index-daemon.py restart --rebuild  # Rebuild the index from the journal, then start
         """
     )
     
@@ -332,6 +662,12 @@ Examples:
                         help='Follow logs in real-time (for logs command)')
     parser.add_argument('--lines', '-n', type=int, default=20,
                         help='Number of log lines to show (default: 20)')
+    parser.add_argument('--json', action='store_true',
+                        help='Print metrics as JSON (for status command)')
+    parser.add_argument('--rebuild', action='store_true',
+                        help='Rebuild the index from the whole journal (for restart command)')
+    parser.add_argument('--workers', type=int,
+                        help='Parser processes for --rebuild (default: one per CPU)')
     
     args = parser.parse_args()
     
@@ -358,7 +694,7 @@ Examples:
         return stop_daemon()
         
     elif args.command == 'status':
-        return status_daemon()
+        return status_daemon(as_json=args.json)
         
     elif args.command == 'logs':
         return show_logs(follow=args.follow, lines=args.lines)
@@ -367,6 +703,8 @@ Examples:
         print(f"{CYAN}[→]{NC} Restarting daemon...")
         stop_daemon()
         time.sleep(1)
+        if args.rebuild and rebuild(args.workers) != 0:
+            return 1
         daemon = MemoryIndexDaemon()
         
         # Fork for background
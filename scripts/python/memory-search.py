@@ -7,15 +7,29 @@ Supports text search, tag filtering, entity lookup, time-range queries
 
 import sqlite3
 import sys
+import os
+import queue
 import argparse
 from pathlib import Path
 from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from socketserver import ThreadingMixIn, UnixStreamServer
+from urllib.parse import parse_qs, urlparse
 import json
 
+import memory_index
+
 # Configuration
 MEMORY_DIR = Path.home() / ".blackroad" / "memory"
 INDEX_DB = MEMORY_DIR / "memory-index.db"
 
+# Query engine / --serve
+CACHE_MB = 64
+MMAP_MB = 256
+SERVE_PORT = 8765
+SERVE_POOL = 4
+HTTP_MAX_LIMIT = 1000
+
 # ANSI Colors
 BLUE = '\033[0;34m'
 GREEN = '\033[0;32m'
@@ -69,31 +83,226 @@ def print_result(row, query_term="", show_hash=False, compact=False):
             print(f"{DIM}SHA256:{NC}   {sha256[:16]}...")
         print()
 
+class MemoryQuery:
+    """Any mix of text, action, entity, tag and time filters as one SQL statement
+
+    Results come newest first in (timestamp, sha256) order, which is also
+    the keyset: pass the `cursor` of the last row seen as `after` and the
+    next page starts right below it through the index, so page 50 costs
+    the same as page 1. A limit of 0 or less streams every match.
+    """
+
+    def __init__(self, text=None, action=None, entity=None, tag=None,
+                 since=None, until=None, after=None, limit=20):
+        self.text = text
+        self.action = action
+        self.entity = entity
+        self.tag = tag
+        self.since = since
+        self.until = until
+        self.after = after
+        self.limit = limit
+
+    @staticmethod
+    def cursor(row):
+        return f"{row['timestamp']}|{row['sha256']}"
+
+    def build(self, indexed=True, fts_rowids=True):
+        clauses, params = [], []
+        if self.text:
+            if fts_rowids:
+                clauses.append("m.rowid IN (SELECT rowid FROM memories_fts WHERE memories_fts MATCH ?)")
+            else:
+                clauses.append("m.sha256 IN (SELECT sha256 FROM memories_fts WHERE memories_fts MATCH ?)")
+            params.append(self.text)
+        if self.action:
+            clauses.append("m.action = ?")
+            params.append(self.action)
+        if self.entity:
+            if indexed:
+                clauses.append("m.entity IN (SELECT entity FROM entity_trigram WHERE entity LIKE ?)")
+            else:
+                clauses.append("m.entity LIKE ?")
+            params.append(f'%{self.entity}%')
+        if self.tag:
+            clauses.append("EXISTS (SELECT 1 FROM tags t WHERE t.memory_sha256 = m.sha256 AND t.tag = ?)")
+            params.append(self.tag)
+        if self.since:
+            clauses.append("m.timestamp >= ?")
+            params.append(self.since)
+        if self.until:
+            clauses.append("m.timestamp < ?")
+            params.append(self.until)
+        if self.after:
+            timestamp, _, sha256 = self.after.rpartition('|')
+            # Spelled out (not a row value) so the timestamp bound can use an index
+            clauses.append("m.timestamp <= ? AND (m.timestamp < ? OR m.sha256 < ?)")
+            params += [timestamp, timestamp, sha256]
+
+        sql = "SELECT m.timestamp, m.action, m.entity, m.details, m.sha256 FROM memories_meta m"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY m.timestamp DESC, m.sha256 DESC"
+        if self.limit and self.limit > 0:
+            sql += " LIMIT ?"
+            params.append(self.limit)
+        return sql, params
+
+class MemoryQueryEngine:
+    """One long-lived, read-only connection to the memory index
+
+    Opening a connection, reading the schema and preparing statements costs
+    more than a typical lookup, so an engine does it once: the connection is
+    opened read-only (writers keep the index in WAL mode, so it never blocks
+    them) and tuned for reads (mmap, a larger page cache, query_only), and
+    every query uses constant SQL so sqlite3's statement cache reuses the
+    prepared statement on each call. If the index file is replaced (a new
+    inode), the next query reopens the connection on it.
+    """
+
+    def __init__(self, db_path=INDEX_DB, cache_mb=CACHE_MB, mmap_mb=MMAP_MB):
+        self.db_path = Path(db_path)
+        self.cache_mb = cache_mb
+        self.mmap_mb = mmap_mb
+        self._open()
+
+    def _open(self):
+        self.inode = os.stat(self.db_path).st_ino
+        self.conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True,
+                                    cached_statements=256, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute(f"PRAGMA cache_size = -{self.cache_mb * 1024}")
+        self.conn.execute(f"PRAGMA mmap_size = {self.mmap_mb * 1024 * 1024}")
+        self.conn.execute("PRAGMA query_only = ON")
+        # Indexes older than memory_index v1 lack the counts and trigram
+        # tables; before v2, text rows are not keyed by the meta rowid
+        self.indexed = memory_index.has_schema(self.conn, 1)
+        self.fts_rowids = memory_index.has_schema(self.conn, 2)
+
+    def close(self):
+        self.conn.close()
+
+    def _current(self):
+        """The connection, reopened first if the index file was replaced"""
+        try:
+            replaced = os.stat(self.db_path).st_ino != self.inode
+        except FileNotFoundError:
+            replaced = False
+        if replaced:
+            self.conn.close()
+            self._open()
+        return self.conn
+
+    def _rows(self, sql, params=()):
+        return self._current().execute(sql, params).fetchall()
+
+    def search_text(self, query, limit=20):
+        return self._rows("""
+            SELECT timestamp, action, entity, details, sha256
+            FROM memories_fts
+            WHERE memories_fts MATCH ?
+            ORDER BY rank
+            LIMIT ?
+        """, (query, limit))
+
+    def run(self, query):
+        """Rows of a MemoryQuery, fetched lazily as the caller iterates"""
+        conn = self._current()
+        sql, params = query.build(self.indexed, self.fts_rowids)
+        return conn.execute(sql, params)
+
+    def by_action(self, action, limit=20):
+        return self._rows("""
+            SELECT timestamp, action, entity, details, sha256
+            FROM memories_meta
+            WHERE action = ?
+            ORDER BY timestamp DESC
+            LIMIT ?
+        """, (action, limit))
+
+    def by_entity(self, entity, limit=20):
+        if self.indexed:
+            # Substring match over distinct entities via the trigram index,
+            # then (entity, timestamp) index lookups for the rows
+            return self._rows("""
+                SELECT timestamp, action, entity, details, sha256
+                FROM memories_meta
+                WHERE entity IN (SELECT entity FROM entity_trigram WHERE entity LIKE ?)
+                ORDER BY timestamp DESC
+                LIMIT ?
+            """, (f'%{entity}%', limit))
+        return self._rows("""
+            SELECT timestamp, action, entity, details, sha256
+            FROM memories_meta
+            WHERE entity LIKE ?
+            ORDER BY timestamp DESC
+            LIMIT ?
+        """, (f'%{entity}%', limit))
+
+    def by_tag(self, tag, limit=20):
+        return self._rows("""
+            SELECT m.timestamp, m.action, m.entity, m.details, m.sha256
+            FROM memories_meta m
+            JOIN tags t ON m.sha256 = t.memory_sha256
+            WHERE t.tag = ?
+            ORDER BY m.timestamp DESC
+            LIMIT ?
+        """, (tag, limit))
+
+    def recent(self, limit=10):
+        return self._rows("""
+            SELECT timestamp, action, entity, details, sha256
+            FROM memories_meta
+            ORDER BY timestamp DESC
+            LIMIT ?
+        """, (limit,))
+
+    def actions(self):
+        if self.indexed:
+            return self._rows("SELECT action, count FROM action_counts ORDER BY count DESC")
+        return self._rows("""
+            SELECT action, COUNT(*) as count
+            FROM memories_meta
+            GROUP BY action
+            ORDER BY count DESC
+        """)
+
+    def entities(self, limit=50):
+        if self.indexed:
+            return self._rows("SELECT entity, count FROM entity_counts ORDER BY count DESC LIMIT ?", (limit,))
+        return self._rows("""
+            SELECT entity, COUNT(*) as count
+            FROM memories_meta
+            GROUP BY entity
+            ORDER BY count DESC
+            LIMIT ?
+        """, (limit,))
+
+
+_engine = None
+
+def get_engine():
+    """The process-wide engine, or None (with a hint) when there is no index yet"""
+    global _engine
+    if _engine is None:
+        if not INDEX_DB.exists():
+            print(f"{RED}[✗]{NC} Index not found. Run: ./memory-index-daemon.py restart --rebuild")
+            return None
+        _engine = MemoryQueryEngine()
+    return _engine
+
 def search_text(query, limit=20, compact=False, show_hash=False):
     """Full-text search across all memories"""
-    if not INDEX_DB.exists():
-        print(f"{RED}[✗]{NC} Index not found. Run: ./memory-indexer.py rebuild")
+    engine = get_engine()
+    if engine is None:
         return
-        
-    conn = sqlite3.connect(str(INDEX_DB))
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    
+
     # FTS5 full-text search
-    cursor.execute("""
-        SELECT timestamp, action, entity, details, sha256
-        FROM memories_fts
-        WHERE memories_fts MATCH ?
-        ORDER BY rank
-        LIMIT ?
-    """, (query, limit))
-    
-    results = cursor.fetchall()
+    results = engine.search_text(query, limit)
     count = len(results)
     
     if count == 0:
         print(f"{YELLOW}[!]{NC} No results found for: {BOLD}{query}{NC}")
-        conn.close()
         return
         
     print(f"\n{BOLD}{GREEN}Found {count} result(s){NC} for: {BOLD}{query}{NC}\n")
@@ -103,127 +312,68 @@ def search_text(query, limit=20, compact=False, show_hash=False):
         
     if count == limit:
         print(f"{DIM}Showing first {limit} results. Use --limit to see more.{NC}\n")
-        
-    conn.close()
 
 def search_by_action(action, limit=20, compact=False):
     """Search by action type"""
-    if not INDEX_DB.exists():
-        print(f"{RED}[✗]{NC} Index not found. Run: ./memory-indexer.py rebuild")
+    engine = get_engine()
+    if engine is None:
         return
-        
-    conn = sqlite3.connect(str(INDEX_DB))
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    
-    cursor.execute("""
-        SELECT timestamp, action, entity, details, sha256
-        FROM memories_meta
-        WHERE action = ?
-        ORDER BY timestamp DESC
-        LIMIT ?
-    """, (action, limit))
-    
-    results = cursor.fetchall()
+
+    results = engine.by_action(action, limit)
     count = len(results)
     
     if count == 0:
         print(f"{YELLOW}[!]{NC} No memories with action: {BOLD}{action}{NC}")
-        conn.close()
         return
         
     print(f"\n{BOLD}{GREEN}Found {count} result(s){NC} with action: {BOLD}{action}{NC}\n")
     
     for row in results:
         print_result(row, compact=compact)
-        
-    conn.close()
 
 def search_by_entity(entity, limit=20, compact=False):
     """Search by entity"""
-    if not INDEX_DB.exists():
-        print(f"{RED}[✗]{NC} Index not found. Run: ./memory-indexer.py rebuild")
+    engine = get_engine()
+    if engine is None:
         return
-        
-    conn = sqlite3.connect(str(INDEX_DB))
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    
-    cursor.execute("""
-        SELECT timestamp, action, entity, details, sha256
-        FROM memories_meta
-        WHERE entity LIKE ?
-        ORDER BY timestamp DESC
-        LIMIT ?
-    """, (f'%{entity}%', limit))
-    
-    results = cursor.fetchall()
+
+    results = engine.by_entity(entity, limit)
     count = len(results)
     
     if count == 0:
         print(f"{YELLOW}[!]{NC} No memories for entity: {BOLD}{entity}{NC}")
-        conn.close()
         return
         
     print(f"\n{BOLD}{GREEN}Found {count} result(s){NC} for entity: {BOLD}{entity}{NC}\n")
     
     for row in results:
         print_result(row, compact=compact)
-        
-    conn.close()
 
 def search_by_tag(tag, limit=20, compact=False):
     """Search by tag"""
-    if not INDEX_DB.exists():
-        print(f"{RED}[✗]{NC} Index not found. Run: ./memory-indexer.py rebuild")
+    engine = get_engine()
+    if engine is None:
         return
-        
-    conn = sqlite3.connect(str(INDEX_DB))
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    
-    cursor.execute("""
-        SELECT m.timestamp, m.action, m.entity, m.details, m.sha256
-        FROM memories_meta m
-        JOIN tags t ON m.sha256 = t.memory_sha256
-        WHERE t.tag = ?
-        ORDER BY m.timestamp DESC
-        LIMIT ?
-    """, (tag, limit))
-    
-    results = cursor.fetchall()
+
+    results = engine.by_tag(tag, limit)
     count = len(results)
     
     if count == 0:
         print(f"{YELLOW}[!]{NC} No memories with tag: {BOLD}#{tag}{NC}")
-        conn.close()
         return
         
     print(f"\n{BOLD}{GREEN}Found {count} result(s){NC} with tag: {BOLD}#{tag}{NC}\n")
     
     for row in results:
         print_result(row, compact=compact)
-        
-    conn.close()
 
 def list_actions():
     """List all unique actions"""
-    if not INDEX_DB.exists():
-        print(f"{RED}[✗]{NC} Index not found. Run: ./memory-indexer.py rebuild")
+    engine = get_engine()
+    if engine is None:
         return
-        
-    conn = sqlite3.connect(str(INDEX_DB))
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    
-    cursor.execute("""
-        SELECT action, COUNT(*) as count
-        FROM memories_meta
-        GROUP BY action
-        ORDER BY count DESC
-    """)
-    
-    results = cursor.fetchall()
+
+    results = engine.actions()
     
     print(f"\n{BOLD}{PURPLE}All Actions{NC} ({len(results)} unique)\n")
     
@@ -233,27 +383,14 @@ def list_actions():
         print(f"{CYAN}{action:30}{NC} {DIM}({count} entries){NC}")
         
     print()
-    conn.close()
 
 def list_entities(limit=50):
     """List top entities"""
-    if not INDEX_DB.exists():
-        print(f"{RED}[✗]{NC} Index not found. Run: ./memory-indexer.py rebuild")
+    engine = get_engine()
+    if engine is None:
         return
-        
-    conn = sqlite3.connect(str(INDEX_DB))
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    
-    cursor.execute("""
-        SELECT entity, COUNT(*) as count
-        FROM memories_meta
-        GROUP BY entity
-        ORDER BY count DESC
-        LIMIT ?
-    """, (limit,))
-    
-    results = cursor.fetchall()
+
+    results = engine.entities(limit)
     
     print(f"\n{BOLD}{PURPLE}Top Entities{NC} (showing {len(results)})\n")
     
@@ -263,26 +400,14 @@ def list_entities(limit=50):
         print(f"{GREEN}{entity:40}{NC} {DIM}({count} entries){NC}")
         
     print()
-    conn.close()
 
 def recent_memories(limit=10, compact=True):
     """Show recent memories"""
-    if not INDEX_DB.exists():
-        print(f"{RED}[✗]{NC} Index not found. Run: ./memory-indexer.py rebuild")
+    engine = get_engine()
+    if engine is None:
         return
-        
-    conn = sqlite3.connect(str(INDEX_DB))
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    
-    cursor.execute("""
-        SELECT timestamp, action, entity, details, sha256
-        FROM memories_meta
-        ORDER BY timestamp DESC
-        LIMIT ?
-    """, (limit,))
-    
-    results = cursor.fetchall()
+
+    results = engine.recent(limit)
     
     print(f"\n{BOLD}{PURPLE}Recent Memories{NC} (last {limit})\n")
     
@@ -290,7 +415,158 @@ def recent_memories(limit=10, compact=True):
         print_result(row, compact=compact)
         
     print()
-    conn.close()
+
+def upgrade_index():
+    """Add the lookup indexes, counts and trigram tables to an existing index"""
+    if not INDEX_DB.exists():
+        print(f"{RED}[✗]{NC} Index not found. Run: ./memory-index-daemon.py restart --rebuild")
+        return 1
+    conn = sqlite3.connect(str(INDEX_DB))
+    try:
+        before = memory_index.ensure_schema(conn)
+    finally:
+        conn.close()
+    version = memory_index.SCHEMA_VERSION
+    if before >= version:
+        print(f"{GREEN}[✓]{NC} Index already at schema v{version}")
+    else:
+        print(f"{GREEN}[✓]{NC} Index upgraded from schema v{before} to v{version}")
+    return 0
+
+def run_query(query, compact=False, show_hash=False, as_json=False):
+    """Print a combined query; with as_json, one JSON object per line as rows arrive"""
+    engine = get_engine()
+    if engine is None:
+        return 1
+
+    if as_json:
+        for row in engine.run(query):
+            record = dict(row)
+            record['cursor'] = MemoryQuery.cursor(row)
+            sys.stdout.write(json.dumps(record) + '\n')
+        sys.stdout.flush()
+        return 0
+
+    results = engine.run(query).fetchall()
+    count = len(results)
+    if count == 0:
+        print(f"{YELLOW}[!]{NC} No memories match these filters")
+        return 0
+
+    print(f"\n{BOLD}{GREEN}Found {count} result(s){NC}\n")
+    for row in results:
+        print_result(row, query_term=query.text or "", show_hash=show_hash, compact=compact)
+    if query.limit and count == query.limit:
+        print(f"{DIM}Next page: --after '{MemoryQuery.cursor(results[-1])}'{NC}\n")
+    return 0
+
+def http_limit(params, default):
+    """The `limit` query parameter clamped to 1..HTTP_MAX_LIMIT
+
+    SQLite reads a negative LIMIT as no limit, so it must never get through.
+    A value that is not an integer raises ValueError (a 400 response).
+    """
+    return max(1, min(int(params.get('limit', default)), HTTP_MAX_LIMIT))
+
+
+class SearchHandler(BaseHTTPRequestHandler):
+    """JSON lookups over keep-alive HTTP; see ROUTES for the endpoints"""
+
+    protocol_version = 'HTTP/1.1'
+
+    ROUTES = {
+        '/search': lambda e, q: e.search_text(q['q'], http_limit(q, 20)),
+        '/action': lambda e, q: e.by_action(q['name'], http_limit(q, 20)),
+        '/entity': lambda e, q: e.by_entity(q['name'], http_limit(q, 20)),
+        '/tag': lambda e, q: e.by_tag(q['name'], http_limit(q, 20)),
+        '/recent': lambda e, q: e.recent(http_limit(q, 10)),
+        '/actions': lambda e, q: e.actions(),
+        '/entities': lambda e, q: e.entities(http_limit(q, 50)),
+        '/query': lambda e, q: e.run(MemoryQuery(
+            text=q.get('q'), action=q.get('action'), entity=q.get('entity'), tag=q.get('tag'),
+            since=q.get('since'), until=q.get('until'), after=q.get('after'),
+            limit=http_limit(q, 20))).fetchall(),
+    }
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        if url.path == '/health':
+            return self._send(200, {'status': 'ok', 'db': str(self.server.db_path)})
+        route = self.ROUTES.get(url.path)
+        if route is None:
+            return self._send(404, {'error': f'unknown endpoint {url.path}'})
+
+        engine = self.server.engines.get()
+        try:
+            rows = route(engine, params)
+        except (KeyError, ValueError) as e:
+            return self._send(400, {'error': f'bad parameter: {e}'})
+        except sqlite3.Error as e:
+            return self._send(400, {'error': str(e)})
+        finally:
+            self.server.engines.put(engine)
+        body = {'count': len(rows), 'results': [dict(row) for row in rows]}
+        if url.path == '/query' and rows:
+            body['next'] = MemoryQuery.cursor(rows[-1])
+        self._send(200, body)
+
+    def setup(self):
+        # Headers and body go out as separate writes; don't let Nagle hold the body
+        self.disable_nagle_algorithm = isinstance(self.client_address, tuple)
+        super().setup()
+
+    def _send(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def address_string(self):
+        # Unix socket peers have no (host, port)
+        return self.client_address[0] if isinstance(self.client_address, tuple) else 'unix'
+
+    def log_message(self, format, *args):
+        pass
+
+class ThreadingUnixHTTPServer(ThreadingMixIn, UnixStreamServer):
+    daemon_threads = True
+
+def serve(host='127.0.0.1', port=SERVE_PORT, socket_path=None, pool_size=SERVE_POOL):
+    """Answer lookups over HTTP from a small pool of engines until interrupted"""
+    if not INDEX_DB.exists():
+        print(f"{RED}[✗]{NC} Index not found. Run: ./memory-index-daemon.py restart --rebuild")
+        return 1
+
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        server = ThreadingUnixHTTPServer(socket_path, SearchHandler)
+        where = f"unix:{socket_path}"
+    else:
+        server = ThreadingHTTPServer((host, port), SearchHandler)
+        server.daemon_threads = True
+        where = f"http://{host}:{port}"
+
+    server.db_path = INDEX_DB
+    server.engines = queue.Queue()
+    for _ in range(pool_size):
+        server.engines.put(MemoryQueryEngine())
+
+    print(f"{GREEN}[✓]{NC} Memory search serving on {where} ({pool_size} connections)")
+    print(f"{DIM}Endpoints: /search?q= /action?name= /entity?name= /tag?name= /recent /actions /entities /health{NC}")
+    print(f"{DIM}           /query?q=&action=&entity=&tag=&since=&until=&after=&limit={NC}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print()
+    finally:
+        server.server_close()
+        if socket_path and os.path.exists(socket_path):
+            os.unlink(socket_path)
+    return 0
 
 def main():
     parser = argparse.ArgumentParser(
@@ -305,11 +581,20 @@ Examples:
   memory-search.py --recent 20                       # Show 20 recent entries
   memory-search.py --list-actions                    # List all actions
   memory-search.py --list-entities                   # List top entities
+  memory-search.py deploy --action completed --since 2026-01   # Combined filters
+  memory-search.py --entity api --json --limit 100   # JSON lines, each with a paging cursor
+  memory-search.py --entity api --after 'TS|SHA'     # Next page after a cursor
+  memory-search.py --upgrade-index                   # Add lookup indexes to an old index
+  memory-search.py --serve                           # JSON lookups on http://127.0.0.1:8765
+  memory-search.py --serve --socket /tmp/mem.sock    # ... or on a Unix socket
   
 Options:
   --compact                Show compact one-line results
   --limit N                Limit results (default: 20)
   --hash                   Show SHA256 hashes
+  --since/--until TS       Time range (ISO prefix, until is exclusive)
+  --after CURSOR           Keyset page: results older than CURSOR
+  --json                   One JSON object per line (--limit 0 streams all)
         """
     )
     
@@ -323,14 +608,33 @@ Options:
     parser.add_argument('--compact', action='store_true', help='Show compact one-line results')
     parser.add_argument('--limit', type=int, default=20, help='Limit number of results')
     parser.add_argument('--hash', action='store_true', help='Show SHA256 hashes')
+    parser.add_argument('--since', help='Only memories at or after this timestamp (ISO prefix)')
+    parser.add_argument('--until', help='Only memories before this timestamp (ISO prefix)')
+    parser.add_argument('--after', metavar='CURSOR', help='Continue after this cursor (timestamp|sha256)')
+    parser.add_argument('--json', action='store_true', help='Stream results as JSON lines')
+    parser.add_argument('--upgrade-index', action='store_true',
+                        help='Add lookup indexes, counts and trigram tables to the index')
+    parser.add_argument('--serve', action='store_true', help='Serve lookups as JSON over HTTP')
+    parser.add_argument('--port', type=int, default=SERVE_PORT, help=f'--serve port (default: {SERVE_PORT})')
+    parser.add_argument('--socket', metavar='PATH', help='--serve on a Unix socket instead of TCP')
     
     args = parser.parse_args()
     
     # Determine which search to perform
-    if args.list_actions:
+    if args.upgrade_index:
+        return upgrade_index()
+    elif args.serve:
+        return serve(port=args.port, socket_path=args.socket)
+    elif args.list_actions:
         list_actions()
     elif args.list_entities:
         list_entities(limit=50)
+    elif args.json or args.since or args.until or args.after or \
+            sum(bool(f) for f in (args.query, args.action, args.entity, args.tag)) > 1:
+        # Anything beyond a single plain filter goes through the combined query
+        query = MemoryQuery(text=args.query, action=args.action, entity=args.entity, tag=args.tag,
+                            since=args.since, until=args.until, after=args.after, limit=args.limit)
+        return run_query(query, compact=args.compact, show_hash=args.hash, as_json=args.json)
     elif args.recent:
         recent_memories(limit=args.recent, compact=args.compact)
     elif args.action:
@@ -345,4 +649,4 @@ Options:
         parser.print_help()
 
 if __name__ == '__main__':
-    main()
+    sys.exit(main())
@@ -0,0 +1,452 @@
+#!/usr/bin/env python3
+"""
+BlackRoad Memory Index schema
+Tables, lookup indexes and maintained counts for memory-index.db, shared by
+memory-search.py and the indexer
+"""
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# Bumped whenever ensure_schema() learns a new upgrade step
+SCHEMA_VERSION = 3
+
+BASE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS memories_meta (
+    sha256 TEXT PRIMARY KEY,
+    timestamp TEXT,
+    action TEXT,
+    entity TEXT,
+    details TEXT
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS memories_fts USING fts5(
+    timestamp, action, entity, details, sha256
+);
+CREATE TABLE IF NOT EXISTS tags (
+    memory_sha256 TEXT,
+    tag TEXT
+);
+"""
+
+# v1: B-tree lookups, counts kept current by triggers, and a trigram index
+# over distinct entities for substring matching
+SCHEMA_V1 = """
+CREATE INDEX IF NOT EXISTS idx_meta_action_ts ON memories_meta(action, timestamp);
+CREATE INDEX IF NOT EXISTS idx_meta_entity_ts ON memories_meta(entity, timestamp);
+CREATE INDEX IF NOT EXISTS idx_meta_ts ON memories_meta(timestamp);
+CREATE INDEX IF NOT EXISTS idx_tags_tag ON tags(tag, memory_sha256);
+CREATE INDEX IF NOT EXISTS idx_tags_sha ON tags(memory_sha256);
+
+CREATE TABLE IF NOT EXISTS action_counts (
+    action TEXT PRIMARY KEY,
+    count INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS entity_counts (
+    id INTEGER PRIMARY KEY,
+    entity TEXT UNIQUE,
+    count INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_action_counts_count ON action_counts(count);
+CREATE INDEX IF NOT EXISTS idx_entity_counts_count ON entity_counts(count);
+CREATE VIRTUAL TABLE IF NOT EXISTS entity_trigram USING fts5(entity, tokenize='trigram');
+
+CREATE TRIGGER IF NOT EXISTS meta_counts_insert AFTER INSERT ON memories_meta BEGIN
+    INSERT INTO action_counts(action, count) VALUES (new.action, 1)
+        ON CONFLICT(action) DO UPDATE SET count = count + 1;
+    INSERT INTO entity_counts(entity, count) VALUES (new.entity, 1)
+        ON CONFLICT(entity) DO UPDATE SET count = count + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS meta_counts_delete AFTER DELETE ON memories_meta BEGIN
+    UPDATE action_counts SET count = count - 1 WHERE action = old.action;
+    DELETE FROM action_counts WHERE action = old.action AND count <= 0;
+    UPDATE entity_counts SET count = count - 1 WHERE entity = old.entity;
+    DELETE FROM entity_counts WHERE entity = old.entity AND count <= 0;
+END;
+CREATE TRIGGER IF NOT EXISTS entity_trigram_insert AFTER INSERT ON entity_counts BEGIN
+    INSERT INTO entity_trigram(rowid, entity) VALUES (new.id, new.entity);
+END;
+CREATE TRIGGER IF NOT EXISTS entity_trigram_delete AFTER DELETE ON entity_counts BEGIN
+    DELETE FROM entity_trigram WHERE rowid = old.id;
+END;
+"""
+
+# v2: memories_fts rows share their rowid with memories_meta, so text
+# matches join by integer key; deleting a memory removes its text too
+SCHEMA_V2 = """
+CREATE TRIGGER IF NOT EXISTS meta_fts_delete AFTER DELETE ON memories_meta BEGIN
+    DELETE FROM memories_fts WHERE rowid = old.rowid;
+END;
+"""
+
+# v3: where the daemon stopped reading each journal, committed in the same
+# transaction as the entries it covers
+SCHEMA_V3 = """
+CREATE TABLE IF NOT EXISTS journal_checkpoint (
+    journal TEXT PRIMARY KEY,
+    inode INTEGER NOT NULL,
+    offset INTEGER NOT NULL,
+    line_hash TEXT,
+    updated REAL
+);
+"""
+
+# Bulk rebuild: byte ranges per worker, rows per insert batch
+REBUILD_RANGE_BYTES = 4 * 1024 * 1024
+REBUILD_BATCH = 50_000
+
+HASHTAG = re.compile(r'(?<![\w#])#([A-Za-z][\w-]{1,63})')
+
+
+def ensure_schema(conn):
+    """Create or upgrade the index in place; returns the version it started at
+
+    A database still in the default rollback journal mode is switched to
+    WAL (which persists in the file), so readers can open it read-only and
+    never block the indexer. Upgrading an existing index backfills the
+    count tables (and through them the entity trigram index) from the rows
+    already there, so the counts stay exact from then on, and rebuilds
+    memories_fts from memories_meta with matching rowids.
+    """
+    # A bulk rebuild runs with journal_mode OFF; leave that alone
+    if conn.execute("PRAGMA journal_mode").fetchone()[0] == 'delete':
+        conn.execute("PRAGMA journal_mode = WAL")
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version >= SCHEMA_VERSION:
+        return version
+
+    with conn:
+        conn.executescript(BASE_SCHEMA)
+    if version < 1:
+        with conn:
+            conn.executescript(SCHEMA_V1)
+            conn.execute("DELETE FROM action_counts")
+            conn.execute("DELETE FROM entity_counts")
+            conn.execute("""
+                INSERT INTO action_counts(action, count)
+                SELECT action, COUNT(*) FROM memories_meta GROUP BY action
+            """)
+            conn.execute("""
+                INSERT INTO entity_counts(entity, count)
+                SELECT entity, COUNT(*) FROM memories_meta GROUP BY entity
+            """)
+            conn.execute("PRAGMA user_version = 1")
+    if version < 2:
+        with conn:
+            conn.executescript(SCHEMA_V2)
+            conn.execute("DELETE FROM memories_fts")
+            conn.execute("""
+                INSERT INTO memories_fts(rowid, timestamp, action, entity, details, sha256)
+                SELECT rowid, timestamp, action, entity, details, sha256 FROM memories_meta
+            """)
+            conn.execute("PRAGMA user_version = 2")
+    if version < 3:
+        with conn:
+            conn.executescript(SCHEMA_V3)
+            conn.execute("PRAGMA user_version = 3")
+    return version
+
+
+def entry_tags(entry):
+    """Tags of a journal entry: an explicit "tags" list plus #hashtags in the details"""
+    tags = entry.get('tags') or []
+    if isinstance(tags, str):
+        tags = [t.strip() for t in tags.split(',')]
+    found = [str(t).lstrip('#').lower() for t in tags if t]
+    found += [t.lower() for t in HASHTAG.findall(entry.get('details') or '')]
+    return list(dict.fromkeys(found))
+
+
+def parse_journal_line(raw):
+    """One master-journal line (bytes) -> entry for index_entries, or None
+
+    PS-SHA-∞ entries carry their own sha256; lines appended by scripts
+    ({"ts": ..., "event": ...}) are keyed by the hash of the line itself,
+    so re-reading the same line never indexes it twice.
+    """
+    try:
+        entry = json.loads(raw)
+    except ValueError:
+        return None
+    if not isinstance(entry, dict):
+        return None
+    if not entry.get('sha256'):
+        entry['sha256'] = hashlib.sha256(raw.strip()).hexdigest()
+    if not entry.get('timestamp'):
+        entry['timestamp'] = entry.get('ts', '')
+    if not entry.get('action'):
+        entry['action'] = entry.get('event', '')
+    if not entry.get('entity'):
+        entry['entity'] = entry.get('agent', '')
+    if not isinstance(entry.get('details', ''), str):
+        entry['details'] = json.dumps(entry['details'])
+    return entry
+
+
+def index_entries(conn, entries, checkpoint=None):
+    """Add journal entries in one transaction; returns how many were new
+
+    Entries already present (same sha256) are skipped. Counts and the
+    entity trigram index are maintained by triggers. A checkpoint dict
+    (journal, inode, offset, line_hash) is saved in the same transaction,
+    so it never points past or short of what was indexed.
+    """
+    added = 0
+    with conn:
+        for entry in entries:
+            sha256 = entry.get('sha256')
+            if not sha256:
+                continue
+            row = (sha256, entry.get('timestamp', ''), entry.get('action', ''),
+                   entry.get('entity', ''), entry.get('details', ''))
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO memories_meta(sha256, timestamp, action, entity, details) "
+                "VALUES (?, ?, ?, ?, ?)", row)
+            if cursor.rowcount == 0:
+                continue
+            conn.execute(
+                "INSERT INTO memories_fts(rowid, sha256, timestamp, action, entity, details) "
+                "VALUES (?, ?, ?, ?, ?, ?)", (cursor.lastrowid, *row))
+            conn.executemany("INSERT INTO tags(memory_sha256, tag) VALUES (?, ?)",
+                             [(sha256, tag) for tag in entry_tags(entry)])
+            added += 1
+        if checkpoint:
+            conn.execute(
+                "INSERT OR REPLACE INTO journal_checkpoint(journal, inode, offset, line_hash, updated) "
+                "VALUES (:journal, :inode, :offset, :line_hash, :updated)",
+                {'updated': time.time(), **checkpoint})
+    return added
+
+
+def load_checkpoint(conn, journal):
+    """Saved checkpoint for a journal path, or None"""
+    row = conn.execute(
+        "SELECT inode, offset, line_hash FROM journal_checkpoint WHERE journal = ?",
+        (str(journal),)).fetchone()
+    if not row:
+        return None
+    return {'journal': str(journal), 'inode': row[0], 'offset': row[1], 'line_hash': row[2]}
+
+
+def _varint(buf, pos):
+    """SQLite varint at buf[pos]; returns (value, next position)"""
+    value = 0
+    for i in range(8):
+        byte = buf[pos + i]
+        value = (value << 7) | (byte & 0x7f)
+        if byte < 0x80:
+            return value, pos + i + 1
+    return (value << 8) | buf[pos + 8], pos + 9
+
+
+def fts_segments(conn, table='memories_fts'):
+    """Number of FTS5 index segments, from the table's structure record
+
+    Many small segments mean automerge is behind and text queries pay for
+    it; 'optimize' brings it back to one.
+    """
+    row = conn.execute(f"SELECT block FROM {table}_data WHERE id = 10").fetchone()
+    if not row:
+        return 0
+    block = row[0]
+    pos = 8 if block[4:8] == b'\xff\x00\x00\x01' else 4  # 4-byte cookie, optional v2 marker
+    _, pos = _varint(block, pos)  # levels
+    segments, _ = _varint(block, pos)
+    return segments
+
+
+def has_schema(conn, version=SCHEMA_VERSION):
+    return conn.execute("PRAGMA user_version").fetchone()[0] >= version
+
+
+def open_index(path):
+    """Writable connection to the index, upgraded to the current schema"""
+    conn = sqlite3.connect(str(path))
+    conn.execute("PRAGMA synchronous = NORMAL")
+    ensure_schema(conn)
+    return conn
+
+
+def last_line(f, end, block=4096):
+    """The line that ends at byte offset end, newline excluded, read backwards"""
+    pos = end - 1
+    buf = b''
+    while pos > 0:
+        step = min(block, pos)
+        f.seek(pos - step)
+        buf = f.read(step) + buf
+        pos -= step
+        cut = buf.rfind(b'\n')
+        if cut >= 0:
+            return buf[cut + 1:]
+    return buf
+
+
+def complete_end(f, size, block=4096):
+    """Offset just past the last newline before size (0 if there is none)"""
+    pos = size
+    while pos > 0:
+        step = min(block, pos)
+        f.seek(pos - step)
+        cut = f.read(step).rfind(b'\n')
+        if cut >= 0:
+            return pos - step + cut + 1
+        pos -= step
+    return 0
+
+
+def split_ranges(path, size, range_bytes=REBUILD_RANGE_BYTES):
+    """(start, end) byte ranges of the first size bytes, each ending on a newline"""
+    ranges = []
+    with open(path, 'rb') as f:
+        start = 0
+        while start < size:
+            f.seek(min(start + range_bytes, size))
+            f.readline()
+            end = min(f.tell(), size)
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def parse_range(task):
+    """Rows and tags for one byte range of the journal (runs in a worker)"""
+    path, start, end = task
+    with open(path, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+    rows = []
+    skipped = 0
+    for raw in data.split(b'\n'):
+        if not raw.strip():
+            continue
+        entry = parse_journal_line(raw)
+        if entry is None:
+            skipped += 1
+            continue
+        rows.append((entry['sha256'], entry.get('timestamp', ''), entry.get('action', ''),
+                     entry.get('entity', ''), entry.get('details', ''), entry_tags(entry)))
+    return rows, skipped
+
+
+def install_index(src_path, db_path):
+    """Make the finished index at src_path the one at db_path, then remove it
+
+    A new db_path is a plain rename. An existing one is overwritten in place
+    with the backup API: one write transaction through its own WAL, then a
+    checkpoint. The file, its WAL and every open connection stay valid
+    (readers simply see the new content), which deleting the WAL and
+    renaming over a live database would not guarantee.
+    """
+    if not os.path.exists(db_path):
+        os.replace(src_path, db_path)
+        conn = sqlite3.connect(db_path)
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.close()
+        return
+    src = sqlite3.connect(src_path)
+    dst = sqlite3.connect(db_path, timeout=60)
+    try:
+        dst.execute("PRAGMA journal_mode = WAL")
+        src.backup(dst)
+        dst.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    finally:
+        dst.close()
+        src.close()
+    os.remove(src_path)
+
+
+def rebuild_index(journal, db_path, workers=None):
+    """Rebuild the index from the whole journal; returns a stats dict
+
+    Parses newline-aligned byte ranges in a process pool and loads them in
+    large transactions into a fresh file next to db_path, with secondary
+    indexes, triggers, counts and the FTS index all built once at the end
+    (by ensure_schema, as for an upgrade). The finished index is then
+    copied into db_path in place (see install_index), so searches keep
+    using the old index until then. The journal checkpoint is set to its
+    end so the daemon, which must not run meanwhile, carries on from there.
+    """
+    started = time.perf_counter()
+    db_path = str(db_path)
+    tmp_path = db_path + '.rebuild'
+    for suffix in ('', '-wal', '-shm', '-journal'):
+        if os.path.exists(tmp_path + suffix):
+            os.remove(tmp_path + suffix)
+
+    # Only complete lines; a line still being written is left to the daemon
+    with open(journal, 'rb') as f:
+        st = os.fstat(f.fileno())
+        end = complete_end(f, st.st_size)
+        last = last_line(f, end)
+    ranges = split_ranges(journal, end)
+
+    conn = sqlite3.connect(tmp_path)
+    # The backup into the live index needs matching page sizes
+    if os.path.exists(db_path):
+        live = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+        try:
+            conn.execute(f"PRAGMA page_size = {live.execute('PRAGMA page_size').fetchone()[0]}")
+        finally:
+            live.close()
+    conn.execute("PRAGMA journal_mode = OFF")
+    conn.execute("PRAGMA synchronous = OFF")
+    conn.execute("PRAGMA cache_size = -262144")
+    conn.executescript(BASE_SCHEMA)
+    conn.execute("INSERT INTO memories_fts(memories_fts, rank) VALUES ('automerge', 0)")
+
+    seen = set()
+    rows = skipped = 0
+    meta, tags = [], []
+
+    def flush():
+        with conn:
+            conn.executemany(
+                "INSERT INTO memories_meta(sha256, timestamp, action, entity, details) "
+                "VALUES (?, ?, ?, ?, ?)", meta)
+            conn.executemany("INSERT INTO tags(memory_sha256, tag) VALUES (?, ?)", tags)
+        meta.clear()
+        tags.clear()
+
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        for chunk, bad in pool.map(parse_range, [(str(journal), a, b) for a, b in ranges]):
+            skipped += bad
+            for sha256, timestamp, action, entity, details, entry_tag_list in chunk:
+                if sha256 in seen:
+                    continue
+                seen.add(sha256)
+                meta.append((sha256, timestamp, action, entity, details))
+                tags.extend((sha256, tag) for tag in entry_tag_list)
+            if len(meta) >= REBUILD_BATCH:
+                rows += len(meta)
+                flush()
+    rows += len(meta)
+    flush()
+    loaded = time.perf_counter()
+
+    # Deferred work: lookup indexes, triggers, count backfill, FTS in one pass
+    ensure_schema(conn)
+    with conn:
+        conn.execute("INSERT INTO memories_fts(memories_fts) VALUES ('optimize')")
+        conn.execute("INSERT INTO memories_fts(memories_fts, rank) VALUES ('automerge', 4)")
+        conn.execute(
+            "INSERT INTO journal_checkpoint(journal, inode, offset, line_hash, updated) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (str(journal), st.st_ino, end, hashlib.sha256(last).hexdigest() if end else None,
+             time.time()))
+    conn.close()
+
+    install_index(tmp_path, db_path)
+    total = time.perf_counter() - started
+    return {
+        'rows': rows,
+        'skipped': skipped,
+        'ranges': len(ranges),
+        'load_s': round(loaded - started, 2),
+        'total_s': round(total, 2),
+        'rows_per_s': round(rows / total) if total else rows,
+    }